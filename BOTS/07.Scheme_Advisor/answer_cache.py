@@ -0,0 +1,123 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from pymongo.collection import Collection
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CacheStats
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_THRESHOLD = 0.95  # cosine similarity a cached question needs to be reused
+ANSWER_CACHE_SIZE = 1000       # entries kept per corpus version; the oldest are evicted first
+STALE_ANSWER_AGE = 3600        # seconds before answers from another corpus version are deleted
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    context: str
+    similarity: float
+
+
+class AnswerCache:
+    """
+    Semantic cache of answers to earlier questions.
+
+    Incoming questions are embedded and compared with the cached questions
+    in memory. The closest one is reused if its cosine similarity reaches
+    `threshold`. Entries are stored in `collection` together with the corpus
+    version they were answered from. When the version changes, the cache
+    starts over from the entries of the new version.
+
+    Entries of other versions are ignored, and only deleted once older than
+    `STALE_ANSWER_AGE`. Versions are not ordered, and another process may
+    still be on an older corpus version (see `pipeline.CORPUS_VERSION_TTL`).
+    It must not delete the entries just written for the newer one.
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        embeddings: Embeddings,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_SIZE
+    ):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._entries: list[dict] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        collection.create_index([("version", 1), ("created_at", 1)])
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _load(self, version: str) -> None:
+        """Switch to `version`, deleting long-stale entries of other versions. Caller holds the lock."""
+        stale = {"version": {"$ne": version}, "created_at": {"$lt": time.time() - STALE_ANSWER_AGE}}
+        removed = self.collection.delete_many(stale).deleted_count
+        if removed:
+            logger.info(f"Deleted {removed} cached answers of other corpus versions")
+        docs = list(self.collection.find({"version": version}).sort("created_at", 1))[-self.max_entries:]
+        self._version = version
+        self._entries = [{key: doc[key] for key in ("_id", "question", "answer", "context")} for doc in docs]
+        self._matrix = np.asarray([doc["embedding"] for doc in docs], dtype=np.float32) if docs else np.empty((0, 0), dtype=np.float32)
+
+    def get(self, question: str, version: str) -> Optional[CachedAnswer]:
+        """Return the cached answer to the closest earlier question, if it is close enough."""
+        vector = self._embed(question)
+        with self._lock:
+            if version != self._version:
+                self._load(version)
+            if not self._entries or self._matrix.shape[1] != len(vector):
+                self.stats.misses += 1
+                return None
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            entry = self._entries[best]
+        return CachedAnswer(entry["question"], entry["answer"], entry["context"], float(scores[best]))
+
+    def put(self, question: str, version: str, answer: str, context: str) -> None:
+        vector = self._embed(question)
+        doc = {
+            "version": version,
+            "question": question,
+            "embedding": vector.tolist(),
+            "answer": answer,
+            "context": context,
+            "created_at": time.time()
+        }
+        with self._lock:
+            if self._version is None:
+                self._load(version)
+            if version != self._version:
+                # Answered from a corpus that has been replaced since the question was asked
+                return
+            self.collection.insert_one(doc)
+            self._entries.append({key: doc[key] for key in ("_id", "question", "answer", "context")})
+            self._matrix = np.vstack([self._matrix, vector]) if len(self._matrix) else vector[None, :]
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                evicted = [entry["_id"] for entry in self._entries[:overflow]]
+                self.collection.delete_many({"_id": {"$in": evicted}})
+                self._entries = self._entries[overflow:]
+                self._matrix = self._matrix[overflow:]
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._entries), **self.stats.to_dict()}
@@ -0,0 +1,325 @@
+import json
+import asyncio
+import logging
+from dataclasses import asdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from ingestion import IngestionReport
+from resources import registry
+from tracing import METRIC_PREFIX, atraced_stream, span
+from pipeline import (
+    COLLECTION_NAME,
+    DB_NAME,
+    RETRIEVAL_BACKEND,
+    build_prompt,
+    get_corpus_version,
+    ingest_pdfs,
+    pack_context,
+    register_resources,
+    retrieve,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_QUESTIONS = 16   # questions in retrieval, reranking or generation at once
+MAX_QUEUED_QUESTIONS = 64       # questions waiting for a slot; beyond this the API answers 429
+MAX_CONCURRENT_GENERATIONS = 4  # answers streamed from Ollama at once
+MAX_QUESTION_LENGTH = 2000      # characters
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Reservation:
+    """A place in a `Limiter`'s queue, held until its caller gets a slot or gives up."""
+
+    def __init__(self, limiter: "Limiter"):
+        self.limiter = limiter
+        self.held = True
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.limiter.waiting -= 1
+
+
+class Limiter:
+    """
+    At most `limit` holders at once, with up to `queue` callers waiting for
+    a slot. `reserve()` turns callers away once the queue is full, so load
+    beyond capacity is rejected quickly instead of piling up. The place it
+    takes counts as waiting at once, before the caller reaches `slot()`.
+    """
+
+    def __init__(self, limit: int, queue: int):
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def reserve(self) -> Reservation:
+        if self.active >= self.limit and self.waiting >= self.queue:
+            self.rejected += 1
+            raise QueueFullError(f"{self.active} questions in progress and {self.waiting} queued; retry later")
+        self.waiting += 1
+        return Reservation(self)
+
+    @asynccontextmanager
+    async def slot(self, reservation: Optional[Reservation] = None) -> AsyncIterator[None]:
+        """Wait for a slot, in the queue place of `reservation` if given."""
+        if reservation is None:
+            self.waiting += 1
+            reservation = Reservation(self)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            reservation.release()
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting, "rejected": self.rejected}
+
+
+questions = Limiter(MAX_CONCURRENT_QUESTIONS, MAX_QUEUED_QUESTIONS)
+generations = Limiter(MAX_CONCURRENT_GENERATIONS, MAX_QUEUED_QUESTIONS)
+ingestion: Optional[asyncio.Future] = None  # the running ingestion; it outlives the request that started it
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Load the models and connect before the first request is accepted
+    register_resources()
+    await run_in_threadpool(registry.warm_up)
+    for resource in registry.health(max_age=float("inf")):
+        if resource["status"] != "ready":
+            logger.error(f"{resource['name']} failed to load: {resource['error']}")
+    yield
+    registry.close()
+
+
+app = FastAPI(
+    title="MSME Scheme Advisor API",
+    description="Hybrid retrieval, reranking and answer generation over MSME scheme documents.",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+
+async def resource(name: str):
+    """A shared resource; one that is not loaded (e.g. it failed at startup) is loaded in the thread pool"""
+    return registry.get(name) if registry.ready(name) else await run_in_threadpool(registry.get, name)
+
+
+def pdf_collection_of(mongo_client):
+    return mongo_client[DB_NAME][COLLECTION_NAME]
+
+
+class Question(BaseModel):
+    question: str = Field(..., min_length=1, max_length=MAX_QUESTION_LENGTH)
+
+
+def ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
+
+async def answer_events(query: str, reservation: Optional[Reservation] = None) -> AsyncIterator[dict]:
+    """
+    Answer one question as a sequence of events:
+    `context`, then `token`s, then `done` with the answer and its trace.
+    Blocking stages run in the thread pool, where concurrent requests
+    share embedding and reranking batches. `reservation` is the question's
+    place in the queue, taken by `admit()`.
+    """
+    tracer = await resource("tracer")
+    answer_cache = await resource("answer_cache")
+    pdf_collection = pdf_collection_of(await resource("mongo_client"))
+
+    async with questions.slot(reservation):
+        with tracer.trace("question", backend=RETRIEVAL_BACKEND) as trace:
+            version = await run_in_threadpool(get_corpus_version, pdf_collection)
+            with span("cache_lookup"):
+                cached = await run_in_threadpool(answer_cache.get, query, version)
+            trace.attributes["cached"] = cached is not None
+
+            if cached:
+                yield {"event": "context", "cached": True, "similar_question": cached.question, "similarity": round(cached.similarity, 4), "context": cached.context}
+                yield {"event": "token", "text": cached.answer}
+                response = cached.answer
+            else:
+                docs = await run_in_threadpool(retrieve, query)
+                packed, prompt_tokens = await run_in_threadpool(pack_context, query, docs)
+                trace.attributes.update(context_tokens=packed.tokens, prompt_tokens=prompt_tokens)
+                packing = {key: value for key, value in asdict(packed).items() if key != "text"}
+                packing["exact"] = (await resource("context_packer"))[0].counter.exact
+                yield {"event": "context", "cached": False, "context": packed.text, "retrieved": len(docs), "packing": packing}
+
+                prompt = build_prompt(query, packed.text)
+                parts = []
+                async with generations.slot():
+                    rag_chain = await resource("rag_chain")
+                    async for token in atraced_stream(rag_chain.astream(prompt)):
+                        parts.append(token)
+                        yield {"event": "token", "text": token}
+                response = "".join(parts)
+                await run_in_threadpool(answer_cache.put, query, version, response, packed.text)
+
+        yield {"event": "done", "answer": response, "trace": trace.to_dict()}
+
+
+def admit() -> Reservation:
+    """Take the question's place in the queue, or answer 429 if it is full"""
+    try:
+        return questions.reserve()
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+
+class ReservedStreamingResponse(StreamingResponse):
+    """Gives up the question's queue place when the response ends, also if the client left before the body started."""
+
+    def __init__(self, content, reservation: Reservation, **kwargs):
+        super().__init__(content, **kwargs)
+        self.reservation = reservation
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.reservation.release()
+
+
+@app.post("/api/ask")
+async def ask(body: Question) -> dict:
+    """Answer a question in one response."""
+    reservation = admit()
+    try:
+        events = [event async for event in answer_events(body.question, reservation)]
+    except Exception as e:
+        logger.exception("Error answering question")
+        raise HTTPException(status_code=500, detail=f"Error during retrieval or response generation: {e}")
+    finally:
+        reservation.release()
+    context, done = events[0], events[-1]
+    return {
+        "answer": done["answer"],
+        "cached": context["cached"],
+        "context": context["context"],
+        "trace": done["trace"],
+    }
+
+
+@app.post("/api/ask/stream")
+async def ask_stream(body: Question) -> StreamingResponse:
+    """Answer a question, streaming its events as NDJSON as soon as each is ready."""
+    reservation = admit()
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in answer_events(body.question, reservation):
+                yield ndjson(event)
+        except Exception as e:
+            logger.exception("Error answering question")
+            yield ndjson({"event": "error", "detail": f"Error during retrieval or response generation: {e}"})
+
+    return ReservedStreamingResponse(event_stream(), reservation, media_type="application/x-ndjson")
+
+
+@app.post("/api/ingest/stream")
+async def ingest_stream() -> StreamingResponse:
+    """
+    Ingest new and changed PDFs, streaming progress as NDJSON.
+
+    The ingestion runs as a task of its own, which the response only
+    follows: if the client disconnects, it still runs to the end, and
+    further requests get 409 until it has finished.
+    """
+    global ingestion
+    if ingestion is not None and not ingestion.done():
+        raise HTTPException(status_code=409, detail="Ingestion is already running")
+
+    loop = asyncio.get_running_loop()
+    progress: asyncio.Queue = asyncio.Queue()
+
+    def on_progress(done: int, total: int, name: str) -> None:
+        loop.call_soon_threadsafe(progress.put_nowait, {"event": "progress", "done": done, "total": total, "name": name})
+
+    async def run() -> Optional[IngestionReport]:
+        pdf_collection = pdf_collection_of(await resource("mongo_client"))
+        vector_store = await resource("vector_store")
+        return await run_in_threadpool(ingest_pdfs, pdf_collection, vector_store, on_progress)
+
+    def log_failure(task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error during ingestion", exc_info=task.exception())
+
+    # Checked and set without an await in between, so concurrent requests cannot both start one
+    task = ingestion = asyncio.ensure_future(run())
+    task.add_done_callback(log_failure)
+
+    async def event_stream() -> AsyncIterator[str]:
+        while not task.done() or not progress.empty():
+            getter = asyncio.ensure_future(progress.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield ndjson(getter.result())
+            else:
+                getter.cancel()
+        try:
+            report = task.result()
+        except Exception as e:
+            yield ndjson({"event": "error", "detail": f"Error during ingestion: {e}"})
+            return
+        yield ndjson({"event": "done", "report": asdict(report) if report else None})
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.get("/api/status")
+async def status() -> dict:
+    """Index size, cache hit rates, batching, stage latencies and load."""
+    pdf_collection = pdf_collection_of(await resource("mongo_client"))
+    embeddings = await resource("embeddings")
+    reranker = (await resource("compression_retriever")).base_compressor.model
+    return {
+        "backend": RETRIEVAL_BACKEND,
+        "documents": await run_in_threadpool(pdf_collection.count_documents, {}),
+        "embedding_cache": embeddings.metrics(),
+        "answer_cache": (await resource("answer_cache")).metrics(),
+        "batching": {"embeddings": dict(embeddings.embeddings.stats), "reranker": dict(reranker.stats)},
+        "latency_ms": (await resource("tracer")).percentiles(),
+        "questions": questions.stats(),
+        "generations": generations.stats(),
+    }
+
+
+@app.get("/api/health")
+async def health() -> JSONResponse:
+    """Health of every shared resource; 503 unless all are loaded and healthy."""
+    resources = await run_in_threadpool(registry.health)
+    healthy = all(resource["healthy"] for resource in resources)
+    return JSONResponse({"healthy": healthy, "resources": resources}, status_code=200 if healthy else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Prometheus metrics: stage latency histograms, question counts and load."""
+    lines = []
+    for limiter_name, limiter in (("questions", questions), ("generations", generations)):
+        for field, kind in (("active", "gauge"), ("waiting", "gauge"), ("rejected", "counter")):
+            name = f"{METRIC_PREFIX}_{limiter_name}_{field}" + ("_total" if kind == "counter" else "")
+            lines += [f"# TYPE {name} {kind}", f"{name} {getattr(limiter, field)}"]
+    return (await resource("tracer")).render_prometheus() + "\n".join(lines) + "\n"
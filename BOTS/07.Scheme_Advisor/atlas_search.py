@@ -0,0 +1,191 @@
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_mongodb.index import update_vector_search_index
+from langchain_mongodb.pipelines import reciprocal_rank_stage, vector_search_stage
+from langchain_mongodb.retrievers.hybrid_search import MongoDBAtlasHybridSearchRetriever
+from langchain_mongodb.utils import make_serializable
+from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+from pymongo.errors import OperationFailure
+from pymongo.operations import SearchIndexModel
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+SEARCH_WORKERS = 8  # concurrent searches across sessions; each query runs two
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="atlas-search")
+
+
+def search_operator(mql: dict) -> dict:
+    """
+    The Atlas Search operator for an MQL filter of $and, $or, $in and
+    equality (the filters `scheme_filters.QueryFilter.to_mql` builds).
+    Compared fields must be mapped as `token` in the search index.
+    """
+    clauses = []
+    for key, condition in mql.items():
+        if key == "$and":
+            clauses.append({"compound": {"filter": [search_operator(clause) for clause in condition]}})
+        elif key == "$or":
+            clauses.append({"compound": {"should": [search_operator(clause) for clause in condition], "minimumShouldMatch": 1}})
+        elif not isinstance(condition, dict):
+            clauses.append({"equals": {"path": key, "value": condition}})
+        elif set(condition) == {"$in"}:
+            clauses.append({"in": {"path": key, "value": condition["$in"]}})
+        elif set(condition) == {"$eq"}:
+            clauses.append({"equals": {"path": key, "value": condition["$eq"]}})
+        else:
+            raise ValueError(f"Unsupported search filter on {key}: {condition}")
+    return clauses[0] if len(clauses) == 1 else {"compound": {"filter": clauses}}
+
+
+def text_search_stage(query: str, search_field: str, index_name: str, limit: int, filter: Optional[dict] = None) -> List[dict]:
+    """
+    Full-text search like `langchain_mongodb.pipelines.text_search_stage`,
+    except that the filter runs inside `$search` as a compound filter, so
+    Lucene only scores matching documents. langchain's version applies it
+    as a `$match` on the search results.
+    """
+    operator = {"text": {"query": query, "path": search_field}}
+    if filter:
+        operator = {"compound": {"must": [operator], "filter": [search_operator(filter)]}}
+    return [
+        {"$search": {"index": index_name, **operator}},
+        {"$set": {"score": {"$meta": "searchScore"}}},
+        {"$limit": limit},
+    ]
+
+
+def ensure_search_indexes(vector_store: MongoDBAtlasVectorSearch, fulltext_index: str, filter_fields: tuple, timeout: Optional[float] = None) -> None:
+    """
+    Index `filter_fields` for pre-filtering: as `filter` fields of the vector
+    search index, and as `token` fields of the full-text search index, which
+    is created if missing. Existing definitions are kept and only extended.
+    A cluster that cannot manage search indexes, or an update still building
+    after `timeout` seconds, is logged; filtered queries fall back to
+    unfiltered search until the indexes are ready.
+    """
+    collection = vector_store.collection
+    try:
+        indexes = {index["name"]: index.get("latestDefinition", {}) for index in collection.list_search_indexes()}
+        vector_definition = indexes.get(vector_store._index_name)
+        if vector_definition is not None:
+            fields = vector_definition.get("fields", [])
+            filters = [field["path"] for field in fields if field.get("type") == "filter"]
+            missing = [name for name in filter_fields if name not in filters]
+            vector_field = next((field for field in fields if field.get("type") == "vector"), None)
+            if missing and vector_field is not None:
+                logger.info(f"Adding filter fields {missing} to search index {vector_store._index_name}")
+                update_vector_search_index(
+                    collection,
+                    vector_store._index_name,
+                    dimensions=vector_field["numDimensions"],
+                    path=vector_field["path"],
+                    similarity=vector_field["similarity"],
+                    filters=filters + missing,
+                    wait_until_complete=timeout
+                )
+
+        mappings = indexes.get(fulltext_index, {}).get("mappings", {"dynamic": False, "fields": {}})
+        fields = dict(mappings.get("fields", {}))
+        fields.setdefault(vector_store._text_key, [{"type": "string"}])
+        for name in filter_fields:
+            if not any(mapping.get("type") == "token" for mapping in fields.get(name, [])):
+                fields[name] = [*fields.get(name, []), {"type": "token"}]
+        if fields != mappings.get("fields"):
+            definition = {"mappings": {**mappings, "fields": fields}}
+            if fulltext_index in indexes:
+                logger.info(f"Adding filter fields to search index {fulltext_index}")
+                collection.update_search_index(fulltext_index, definition)
+            else:
+                logger.info(f"Creating search index {fulltext_index}")
+                collection.create_search_index(SearchIndexModel(definition=definition, name=fulltext_index, type="search"))
+    except (OperationFailure, TimeoutError) as e:
+        logger.warning(f"Could not update search indexes for filtering: {e}")
+
+
+class TracedAtlasHybridSearchRetriever(MongoDBAtlasHybridSearchRetriever):
+    """
+    `MongoDBAtlasHybridSearchRetriever` with a span per stage.
+
+    The parent runs both searches and the fusion in one aggregation, which
+    can only be timed as a whole. This runs the vector and full-text
+    searches as two concurrent aggregations and fuses their results in
+    Python with the same reciprocal rank fusion, so query embedding, vector
+    search, full-text search and fusion are timed separately. With a
+    `post_filter`, it falls back to the single aggregation.
+
+    A `pre_filter` passed to `invoke` replaces the retriever's own for that
+    query, and filters both searches before they rank (see
+    `ensure_search_indexes`).
+    """
+
+    def _search(self, stage: str, pipeline: list) -> List[dict]:
+        with span(stage):
+            return list(self.collection.aggregate(pipeline))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any) -> List[Document]:
+        pre_filter = kwargs.pop("pre_filter", self.pre_filter)
+        if self.post_filter is not None:
+            retriever = self if pre_filter == self.pre_filter else self.model_copy(update={"pre_filter": pre_filter})
+            with span("hybrid_search"):
+                return super(TracedAtlasHybridSearchRetriever, retriever)._get_relevant_documents(query, run_manager=run_manager, **kwargs)
+
+        k = kwargs.get("k", self.top_k if self.top_k is not None else self.k)
+        with span("query_embed"):
+            query_vector = self.vectorstore._embedding.embed_query(query)
+
+        embedding_key = self.vectorstore._embedding_key
+        vector_pipeline = [
+            vector_search_stage(
+                query_vector=query_vector,
+                search_field=embedding_key,
+                index_name=self.vectorstore._index_name,
+                top_k=k,
+                filter=pre_filter,
+                oversampling_factor=self.oversampling_factor,
+            ),
+            *reciprocal_rank_stage(score_field="vector_score", penalty=self.vector_penalty, weight=self.vector_weight),
+        ]
+        text_pipeline = [
+            *text_search_stage(
+                query=query,
+                search_field=self.vectorstore._text_key,
+                index_name=self.search_index_name,
+                limit=k,
+                filter=pre_filter,
+            ),
+            *reciprocal_rank_stage(score_field="fulltext_score", penalty=self.fulltext_penalty, weight=self.fulltext_weight),
+        ]
+        if not self.show_embeddings:
+            vector_pipeline.append({"$project": {embedding_key: 0}})
+            text_pipeline.append({"$project": {embedding_key: 0}})
+
+        # Each search runs in the caller's context so its span lands in the current trace
+        vector_future = _search_pool.submit(contextvars.copy_context().run, self._search, "vector_search", vector_pipeline)
+        text_future = _search_pool.submit(contextvars.copy_context().run, self._search, "fulltext_search", text_pipeline)
+        vector_results, text_results = vector_future.result(), text_future.result()
+
+        with span("fusion"):
+            # Same merge as the parent's final stage: later fields win, missing scores count as 0
+            merged: dict[Any, dict] = {}
+            for result in vector_results + text_results:
+                merged.setdefault(result["_id"], {}).update(result)
+            for result in merged.values():
+                result.setdefault("vector_score", 0)
+                result.setdefault("fulltext_score", 0)
+                result["score"] = result["vector_score"] + result["fulltext_score"]
+            ranked = sorted(merged.values(), key=lambda result: result["score"], reverse=True)[:k]
+
+            docs = []
+            for result in ranked:
+                text = result.pop(self.vectorstore._text_key)
+                make_serializable(result)
+                docs.append(Document(page_content=text, metadata=result))
+        return docs
@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import logging
+import platform
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain.retrievers.document_compressors import CrossEncoderReranker
+
+from chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, SchemeChunker
+from context_packer import TokenCounter
+from ingestion import CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_KEY, EMBED_BATCH_SIZE, TEXT_KEY, Splitter, chunk_hash, chunk_records, default_splitter, vector_id
+from local_index import LocalHybridIndex, LocalHybridSearchRetriever, tokenize
+from pipeline import (
+    EMBED_MODEL,
+    FULLTEXT_PENALTY,
+    HYBRID_TOP_K,
+    OLLAMA_URL,
+    RERANK_TOP_N,
+    VECTOR_PENALTY,
+)
+from reranker import RERANKER_MODEL, RERANK_MAX_LENGTH
+from scheme_filters import QueryAnalyzer
+from tracing import Tracer, span, summarize
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_QUESTIONS = Path(__file__).parent / "benchmark_questions.jsonl"
+BENCHMARK_DATA_DIR = Path(__file__).parent / "data"
+HASHING_DIM = 384         # dimensions of the stand-in embeddings
+RECALL_AT = (1, 3, 5, 10)
+CONCURRENCY = (1, 4, 16)  # concurrent queries for the throughput runs
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, offline stand-in for the Ollama embedding model.
+
+    Words and word bigrams are hashed into `dim` signed buckets weighted by
+    log term frequency, and the vector is L2-normalized. It is lexical, so
+    benchmark results with it show how chunking, fusion and reranking move
+    the rankings, not how good the real embedding model is.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        terms = tokenize(text)
+        features = Counter(terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])])
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in features.items():
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += (1.0 if digest[4] & 1 else -1.0) * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def load_questions(path: Path) -> list[dict]:
+    """Labelled questions: `question`, the `source` PDF that answers it and `evidence` phrases an answer needs."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def build_index(pdf_files: list[Path], directory: Path, embeddings: Embeddings, splitter: Splitter) -> tuple[LocalHybridIndex, dict]:
+    """
+    Split and embed the corpus into a fresh `LocalHybridIndex`, the local
+    stand-in for Atlas Vector Search and Atlas Search. Vectors carry the
+    same fields as those written by `IngestionEngine`.
+    """
+    index = LocalHybridIndex(directory, embeddings)
+    start = time.perf_counter()
+    chunks = 0
+    for pdf in pdf_files:
+        records = chunk_records(pdf, splitter)
+        chunks += len(records)
+        for offset in range(0, len(records), EMBED_BATCH_SIZE):
+            batch = records[offset:offset + EMBED_BATCH_SIZE]
+            vectors = embeddings.embed_documents([record.text for record in batch])
+            index.upsert([
+                {
+                    **(record.metadata or {}),
+                    "_id": vector_id(record.source, chunk_hash(record.text)),
+                    TEXT_KEY: record.text,
+                    EMBEDDING_KEY: vector,
+                    "source": record.source,
+                    "chunk": record.chunk,
+                    "chunk_hash": chunk_hash(record.text)
+                }
+                for record, vector in zip(batch, vectors)
+            ])
+    index.flush()
+    return index, {"files": [pdf.name for pdf in pdf_files], "chunks": chunks, "index_seconds": round(time.perf_counter() - start, 2)}
+
+
+def evidence_found(doc: Document, question: dict) -> set[int]:
+    """Indexes of the question's evidence phrases contained in `doc`."""
+    if doc.metadata.get("source") != question["source"]:
+        return set()
+    text = normalize(doc.page_content)
+    return {i for i, phrase in enumerate(question["evidence"]) if normalize(phrase) in text}
+
+
+def ranking_metrics(rankings: list[list[set[int]]], questions: list[dict], depth: int) -> dict:
+    """
+    recall@k: share of each question's evidence phrases found in its top k
+    chunks, averaged over questions. MRR: mean reciprocal rank of the first
+    chunk containing any evidence (0 if none is retrieved).
+    """
+    metrics = {}
+    for k in [k for k in RECALL_AT if k <= depth]:
+        metrics[f"recall@{k}"] = round(float(np.mean([
+            len(set().union(*found[:k])) / len(question["evidence"]) for found, question in zip(rankings, questions)
+        ])), 4)
+    metrics["mrr"] = round(float(np.mean([
+        next((1 / rank for rank, hits in enumerate(found, 1) if hits), 0.0) for found in rankings
+    ])), 4)
+    return metrics
+
+
+def first_hit(found: list[set[int]]) -> Optional[int]:
+    return next((rank for rank, hits in enumerate(found, 1) if hits), None)
+
+
+def throughput(run_query: Callable[[str], object], queries: list[str], concurrency: int) -> dict:
+    """Answer `queries` from `concurrency` threads; latency is per query, end to end."""
+    latencies = []
+
+    def timed(query: str) -> None:
+        start = time.perf_counter()
+        run_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, queries))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "seconds": round(elapsed, 2),
+        "qps": round(len(queries) / elapsed, 2),
+        **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 1) for q in (50, 95, 99)},
+    }
+
+
+def run_benchmark(
+    questions: list[dict],
+    pdf_files: list[Path],
+    embeddings: Embeddings,
+    reranker=None,
+    splitter: Optional[Splitter] = None,
+    top_k: int = HYBRID_TOP_K,
+    top_n: int = RERANK_TOP_N,
+    vector_penalty: float = VECTOR_PENALTY,
+    fulltext_penalty: float = FULLTEXT_PENALTY,
+    filter_queries: bool = True,
+    rounds: int = 3,
+    concurrency: tuple = CONCURRENCY
+) -> dict:
+    """
+    Build the index, chunked by `splitter` (default: the app's
+    `SchemeChunker`), then measure:
+    - quality: recall@k and MRR of the hybrid search candidates and, with a
+      reranker, of the reranked top `top_n`, over the labelled questions;
+    - candidates: how many chunks hybrid search returns for reranking, per
+      question, pre-filtered like `pipeline.retrieve` if `filter_queries`;
+    - latency: per-stage p50/p95/p99 over `rounds` sequential passes;
+    - throughput: queries per second with each level of `concurrency`.
+    """
+    with tempfile.TemporaryDirectory(prefix="scheme-advisor-benchmark-") as directory:
+        splitter = splitter or SchemeChunker(CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, TokenCounter(RERANKER_MODEL))
+        index, corpus = build_index(pdf_files, Path(directory), embeddings, splitter)
+        retriever = LocalHybridSearchRetriever(index=index, k=top_k, vector_penalty=vector_penalty, fulltext_penalty=fulltext_penalty)
+        compressor = CrossEncoderReranker(model=reranker, top_n=top_n) if reranker is not None else None
+        analyzer = QueryAnalyzer.from_store(index.distinct) if filter_queries else None
+
+        def query_filter(query: str) -> Optional[dict]:
+            if analyzer is None:
+                return None
+            with span("query_analysis"):
+                return analyzer.analyze(query).to_mql()
+
+        def run_query(query: str) -> tuple[list[Document], list[Document]]:
+            pre_filter = query_filter(query)
+            candidates = retriever.invoke(query, pre_filter=pre_filter) if pre_filter else []
+            if not candidates:
+                candidates = retriever.invoke(query)
+            if compressor is None:
+                return candidates, candidates[:top_n]
+            with span("rerank"):
+                return candidates, list(compressor.compress_documents(candidates, query))
+
+        # Warm up: first-call costs (model, caches, HNSW pages) are not measured
+        run_query(questions[0]["question"])
+
+        tracer = Tracer(recent=len(questions) * rounds)
+        retrieved, reranked, per_question = [], [], []
+        for round_number in range(rounds):
+            for question in questions:
+                with tracer.trace("question"):
+                    with span("total"):
+                        candidates, top = run_query(question["question"])
+                if round_number == 0:
+                    retrieved.append([evidence_found(doc, question) for doc in candidates])
+                    reranked.append([evidence_found(doc, question) for doc in top])
+                    per_question.append({
+                        "question": question["question"],
+                        "filter": query_filter(question["question"]),
+                        "candidates": len(candidates),
+                        "retrieved_rank": first_hit(retrieved[-1]),
+                        "reranked_rank": first_hit(reranked[-1]),
+                    })
+
+        quality = {"retrieval": ranking_metrics(retrieved, questions, top_k)}
+        if compressor:
+            quality["reranked"] = ranking_metrics(reranked, questions, top_n)
+        else:
+            for result in per_question:
+                del result["reranked_rank"]
+        queries = [question["question"] for question in questions] * rounds
+        filtered = [result for result in per_question if result["filter"]]
+        return {
+            "corpus": corpus,
+            "questions": len(questions),
+            "quality": quality,
+            "candidates": {
+                "mean": round(float(np.mean([result["candidates"] for result in per_question])), 2),
+                "filtered_questions": len(filtered),
+                "mean_filtered": round(float(np.mean([result["candidates"] for result in filtered])), 2) if filtered else None,
+            },
+            "latency_ms": summarize([trace.durations() for trace in tracer.recent]),
+            "throughput": [throughput(run_query, queries, n) for n in concurrency],
+            "per_question": per_question,
+        }
+
+
+def compare(baseline: dict, current: dict) -> dict:
+    """Changes in quality, stage p50/p95 latency and throughput from `baseline` to `current`."""
+    changes = {}
+    for ranking, metrics in current["quality"].items():
+        for metric, value in metrics.items():
+            before = baseline.get("quality", {}).get(ranking, {}).get(metric)
+            if before is not None and before != value:
+                changes[f"quality.{ranking}.{metric}"] = [before, value]
+    before = baseline.get("candidates", {}).get("mean")
+    if before is not None and before != current["candidates"]["mean"]:
+        changes["candidates.mean"] = [before, current["candidates"]["mean"]]
+    for stage, values in current["latency_ms"].items():
+        for q in ("p50", "p95"):
+            before = baseline.get("latency_ms", {}).get(stage, {}).get(q)
+            if before is not None and before != values[q]:
+                changes[f"latency_ms.{stage}.{q}"] = [before, values[q]]
+    before_qps = {run["concurrency"]: run["qps"] for run in baseline.get("throughput", [])}
+    for run in current["throughput"]:
+        if before_qps.get(run["concurrency"], run["qps"]) != run["qps"]:
+            changes[f"throughput.qps@{run['concurrency']}"] = [before_qps[run["concurrency"]], run["qps"]]
+    return changes
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency of the Scheme Advisor offline.")
+    parser.add_argument("--data-dir", type=Path, default=BENCHMARK_DATA_DIR, help="Folder of PDFs to index")
+    parser.add_argument("--questions", type=Path, default=BENCHMARK_QUESTIONS, help="Labelled questions (JSON lines)")
+    parser.add_argument("--chunker", choices=("scheme", "recursive"), default="scheme", help="Structure-aware chunker, or the character splitter")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="Tokens per chunk (scheme chunker)")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS, help="Tokens shared by consecutive chunks (scheme chunker)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Characters per chunk (recursive splitter)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="Characters shared by consecutive chunks (recursive splitter)")
+    parser.add_argument("--top-k", type=int, default=HYBRID_TOP_K, help="Hybrid search candidates")
+    parser.add_argument("--top-n", type=int, default=RERANK_TOP_N, help="Chunks kept after reranking")
+    parser.add_argument("--no-filter", action="store_true", help="Search every question unfiltered, without the query analyzer's pre-filters")
+    parser.add_argument("--vector-penalty", type=float, default=VECTOR_PENALTY)
+    parser.add_argument("--fulltext-penalty", type=float, default=FULLTEXT_PENALTY)
+    parser.add_argument("--embeddings", choices=("hashing", "ollama"), default="hashing", help="Offline stand-in, or the app's Ollama model")
+    parser.add_argument("--reranker", default=RERANKER_MODEL, help="Cross-encoder model, or 'none' to skip reranking")
+    parser.add_argument("--int8", action="store_true", help="Rerank with int8 quantization")
+    parser.add_argument("--rounds", type=int, default=3, help="Sequential passes over the questions for latency percentiles")
+    parser.add_argument("--concurrency", default=",".join(map(str, CONCURRENCY)), help="Comma-separated concurrency levels")
+    parser.add_argument("--output", type=Path, help="Write the results here as JSON (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="Earlier results to compare against")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.embeddings == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_URL)
+    else:
+        embeddings = HashingEmbeddings()
+
+    reranker = None
+    if args.reranker.lower() != "none":
+        from reranker import QuantizedCrossEncoder
+        reranker = QuantizedCrossEncoder(model_name=args.reranker, max_length=RERANK_MAX_LENGTH, quantize=args.int8)
+
+    if args.chunker == "scheme":
+        splitter = SchemeChunker(args.chunk_tokens, args.chunk_overlap_tokens, TokenCounter(RERANKER_MODEL))
+        chunking = {"chunker": "scheme", "chunk_tokens": args.chunk_tokens, "chunk_overlap_tokens": args.chunk_overlap_tokens, "exact_tokens": splitter.counter.exact}
+    else:
+        splitter = default_splitter(args.chunk_size, args.chunk_overlap)
+        chunking = {"chunker": "recursive", "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap}
+
+    pdf_files = sorted(args.data_dir.glob("*.pdf"))
+    if not pdf_files:
+        sys.exit(f"No PDF files found in {args.data_dir}")
+    results = {
+        "config": {
+            **chunking,
+            "top_k": args.top_k,
+            "top_n": args.top_n,
+            "filter_queries": not args.no_filter,
+            "vector_penalty": args.vector_penalty,
+            "fulltext_penalty": args.fulltext_penalty,
+            "embeddings": args.embeddings,
+            "reranker": None if reranker is None else f"{args.reranker} ({'int8' if args.int8 else 'fp32'})",
+        },
+        **run_benchmark(
+            load_questions(args.questions),
+            pdf_files,
+            embeddings,
+            reranker,
+            splitter=splitter,
+            top_k=args.top_k,
+            top_n=args.top_n,
+            vector_penalty=args.vector_penalty,
+            fulltext_penalty=args.fulltext_penalty,
+            filter_queries=not args.no_filter,
+            rounds=args.rounds,
+            concurrency=tuple(int(n) for n in args.concurrency.split(","))
+        ),
+        "run": {"commit": git_commit(), "python": platform.python_version(), "cpus": os.cpu_count(), "started_at": time.time()},
+    }
+    if args.baseline:
+        results["changes"] = compare(json.loads(args.baseline.read_text(encoding="utf-8")), results)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        summary = {key: results[key] for key in ("quality", "candidates", "throughput", "changes") if key in results}
+        print(json.dumps(summary, indent=2))
+    else:
+        print(text)
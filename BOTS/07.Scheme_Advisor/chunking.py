@@ -0,0 +1,214 @@
+import re
+import bisect
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import fitz
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from context_packer import TokenCounter
+from scheme_filters import ANY, document_ministry, section_fields
+
+logger = logging.getLogger(__name__)
+
+CHUNKER_VERSION = 2  # bump when the chunks produced change, so ingested files are re-chunked
+CHUNK_TOKENIZER = "BAAI/bge-reranker-v2-m3"  # chunks are sized for the reranker, the tightest limit downstream
+CHUNK_TOKENS = 300          # tokens per chunk, heading included; leaves room for the question within RERANK_MAX_LENGTH
+CHUNK_OVERLAP_TOKENS = 40   # tokens shared by consecutive chunks of one section
+HEADING_SIZE_RATIO = 1.1    # a bold line at least this much larger than body text is a heading
+MARGIN_RATIO = 0.1          # top and bottom share of a page searched for running headers and footers
+RUNNING_LINE_PAGES = 0.3    # share of pages a margin line must repeat on to be a running header or footer
+
+
+class Line(NamedTuple):
+    page: int    # 1-based
+    text: str
+    size: float  # font size of the line's largest span
+    bold: bool   # every span with text is bold
+    margin: bool # in the top or bottom margin of the page
+
+
+@dataclass
+class Section:
+    title: Optional[str]  # the heading; None for text before the first heading
+    lines: list[Line] = field(default_factory=list)
+
+
+def read_lines(pdf: Path) -> list[Line]:
+    """Text lines of a PDF in reading order, with their font size and weight."""
+    lines = []
+    with fitz.open(pdf) as doc:
+        for number, page in enumerate(doc, 1):
+            height = page.rect.height
+            for block in page.get_text("dict", sort=True)["blocks"]:
+                for line in block.get("lines", []):
+                    spans = [span for span in line["spans"] if span["text"].strip()]
+                    if not spans:
+                        continue
+                    y0, y1 = line["bbox"][1], line["bbox"][3]
+                    lines.append(Line(
+                        page=number,
+                        text=" ".join("".join(span["text"] for span in line["spans"]).split()),
+                        size=max(span["size"] for span in spans),
+                        bold=all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans),
+                        margin=y1 < height * MARGIN_RATIO or y0 > height * (1 - MARGIN_RATIO)
+                    ))
+    return lines
+
+
+def body_size(lines: list[Line]) -> float:
+    """Font size of most of the text."""
+    sizes = Counter()
+    for line in lines:
+        sizes[round(line.size * 2) / 2] += len(line.text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def running_lines(lines: list[Line]) -> set[str]:
+    """
+    Margin lines repeated across pages, such as "MSME SCHEMES 03" or a
+    website footer. Digits are ignored, so page numbers match.
+    """
+    pages = len({line.page for line in lines})
+    seen: dict[str, set[int]] = {}
+    for line in lines:
+        if line.margin:
+            seen.setdefault(_pattern(line.text), set()).add(line.page)
+    return {pattern for pattern, on in seen.items() if len(on) >= max(3, pages * RUNNING_LINE_PAGES)}
+
+
+def _pattern(text: str) -> str:
+    return re.sub(r"\d+", "#", text.lower())
+
+
+def is_heading(line: Line, body: float) -> bool:
+    """
+    Bold and larger than body text. Labels ending in a colon ("Objective:",
+    "About the scheme:") and lines without letters (page numbers in the
+    table of contents) are part of a section, not headings.
+    """
+    return (
+        line.bold
+        and line.size >= body * HEADING_SIZE_RATIO
+        and not line.text.endswith(":")
+        and any(char.isalpha() for char in line.text)
+    )
+
+
+def sections(lines: list[Line]) -> list[Section]:
+    """
+    Group lines under the heading before them, dropping running headers and
+    footers. Consecutive heading lines form one title, as long titles wrap.
+    Headings without text under them (e.g. divider pages) are dropped.
+    """
+    body = body_size(lines)
+    running = running_lines(lines)
+    result = [Section(None)]
+    heading: list[Line] = []
+    for line in lines:
+        if line.margin and _pattern(line.text) in running:
+            continue
+        if is_heading(line, body):
+            if heading and heading[-1].page != line.page:
+                heading = []
+            heading.append(line)
+            continue
+        if heading:
+            result.append(Section(" ".join(part.text for part in heading)))
+            heading = []
+        result[-1].lines.append(line)
+    return [section for section in result if section.lines]
+
+
+def join_lines(lines: list[Line]) -> tuple[str, list[int], list[int]]:
+    """
+    Text of `lines`, with bullet markers on a line of their own (a single
+    symbol) joined to the line after them. Also returns the offset at which
+    each output line starts and its page, to map chunks back to pages.
+    """
+    parts, offsets, pages = [], [], []
+    offset, bullet = 0, None
+    for line in lines:
+        if len(line.text) == 1 and not line.text.isalnum():
+            bullet = bullet or line.text
+            continue
+        text = f"{bullet} {line.text}" if bullet else line.text
+        bullet = None
+        parts.append(text)
+        offsets.append(offset)
+        pages.append(line.page)
+        offset += len(text) + 1
+    return "\n".join(parts), offsets, pages
+
+
+class SchemeChunker:
+    """
+    Structure-aware chunker for scheme documents.
+
+    Headings are found from the PDF's font data (bold and larger than body
+    text), so each scheme's text is chunked on its own and no chunk spans two
+    schemes. Sections are split into chunks of at most `max_tokens` tokens,
+    each starting with the section heading, so every chunk names its scheme.
+    Each chunk carries the scheme name and the pages it comes from, plus the
+    fields retrieval can be filtered on (see `scheme_filters`): the ministry
+    the document names most, and the sectors, entity types and enterprise
+    sizes its section mentions.
+
+    A PDF without detectable headings is one untitled section, split the
+    same way.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        counter: Optional[TokenCounter] = None
+    ):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.counter = counter or TokenCounter(CHUNK_TOKENIZER)
+
+    @property
+    def signature(self) -> str:
+        """Recorded per file in the ingestion manifest; files chunked with another signature are re-chunked."""
+        tokenizer = self.counter.tokenizer.name_or_path if self.counter.exact else "estimate"
+        return f"scheme:{CHUNKER_VERSION}:{self.max_tokens}:{self.overlap_tokens}:{tokenizer}"
+
+    def _splitter(self, chunk_tokens: int) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens,
+            chunk_overlap=min(self.overlap_tokens, chunk_tokens // 4),
+            length_function=self.counter.count,
+            separators=["\n\n", "\n", ". ", " ", ""],
+            add_start_index=True
+        )
+
+    def split_section(self, section: Section, ministry: str = ANY) -> list[tuple[str, dict]]:
+        """(text, metadata) of each chunk of one section."""
+        text, offsets, pages = join_lines(section.lines)
+        fields = {"ministry": ministry, **section_fields(f"{section.title or ''}\n{text}")}
+        prefix = f"{section.title}\n" if section.title else ""
+        room = max(self.max_tokens - self.counter.count(prefix), self.overlap_tokens * 2)
+        chunks = []
+        for doc in self._splitter(room).create_documents([text]):
+            start = doc.metadata["start_index"]
+            end = start + len(doc.page_content)
+            first = max(bisect.bisect_right(offsets, start) - 1, 0)
+            last = max(bisect.bisect_left(offsets, end) - 1, first)
+            chunks.append((prefix + doc.page_content, {
+                "scheme": section.title,
+                "pages": sorted(set(pages[first:last + 1])),
+                **fields
+            }))
+        return chunks
+
+    def split_pdf(self, pdf: Path) -> list[tuple[str, dict]]:
+        """(text, metadata) of each chunk of `pdf`, in document order."""
+        lines = read_lines(pdf)
+        found = sections(lines)
+        ministry = document_ministry("\n".join(line.text for line in lines))
+        logger.debug(f"{pdf.name}: {sum(1 for section in found if section.title)} headings, {ministry}")
+        return [chunk for section in found for chunk in self.split_section(section, ministry)]
@@ -0,0 +1,191 @@
+import math
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from ingestion import chunk_hash
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKENIZER = "ibm-granite/granite-4.0-h-tiny"  # tokenizer of granite4:tiny-h, the chat model in pipeline.DEFAULT_MODEL
+CONTEXT_TOKEN_BUDGET = 1024  # tokens of retrieved context per prompt
+MIN_PASSAGE_TOKENS = 64      # a passage is truncated to fit the budget only if this much room is left
+MAX_OVERLAP_CHARS = 300      # longest overlap looked for between adjacent chunks; chunks share 100 characters or 40 tokens
+MIN_OVERLAP_CHARS = 5        # shorter matches are more likely coincidence than overlap
+CHARS_PER_TOKEN = 4          # estimate used when the tokenizer cannot be loaded
+PASSAGE_SEPARATOR = "\n\n"
+
+
+class TokenCounter:
+    """
+    Counts tokens with the chat model's tokenizer.
+
+    Ollama does not expose its tokenizer, so the matching Hugging Face
+    tokenizer is loaded. If it cannot be loaded (e.g. offline), tokens are
+    estimated at `CHARS_PER_TOKEN` characters each.
+    """
+
+    def __init__(self, tokenizer_name: Optional[str] = CONTEXT_TOKENIZER):
+        self.tokenizer = None
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer {tokenizer_name}, estimating tokens from length: {e}")
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """The longest prefix of `text` within `tokens` tokens, cut back to the end of a sentence or word."""
+        if self.tokenizer is None:
+            end = tokens * CHARS_PER_TOKEN
+        else:
+            # Cut the original text after the last token that fits, rather than decoding ids
+            offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            end = offsets[tokens - 1][1] if 0 < tokens < len(offsets) else (len(text) if tokens > 0 else 0)
+        if end >= len(text):
+            return text
+        prefix = text[:end]
+        sentence = max(prefix.rfind(". "), prefix.rfind("\n"))
+        cut = sentence + 1 if sentence > len(prefix) // 2 else prefix.rfind(" ")
+        return prefix[:cut].rstrip() if cut > 0 else prefix
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int      # tokens of `text`
+    passages: int    # passages in `text`, after merging adjacent chunks
+    chunks: int      # retrieved chunks included, in full or truncated
+    duplicates: int  # retrieved chunks dropped as duplicates
+    dropped: int     # retrieved chunks left out to stay within the budget
+    truncated: bool  # whether the last passage was cut to fit
+
+
+def overlap(left: str, right: str, max_chars: int = MAX_OVERLAP_CHARS) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`.
+
+    The splitter's overlap starts at a split boundary, so only suffixes
+    starting a word count.
+    """
+    for size in range(min(len(left), len(right), max_chars), MIN_OVERLAP_CHARS - 1, -1):
+        if (size == len(left) or left[-size - 1].isspace()) and left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_chunks(texts: list[str], max_overlap: int = MAX_OVERLAP_CHARS) -> str:
+    """Join consecutive chunks of one file, removing the text each repeats from the one before."""
+    merged = texts[0]
+    for text in texts[1:]:
+        size = overlap(merged, text, max_overlap)
+        merged = merged + text[size:] if size else merged + "\n" + text
+    return merged
+
+
+def run_texts(docs: list[Document]) -> list[str]:
+    """Texts of consecutive chunks, without the scheme heading a chunk repeats from the one before."""
+    texts, previous = [], None
+    for doc in docs:
+        scheme, text = doc.metadata.get("scheme"), doc.page_content
+        if texts and scheme and scheme == previous and text.startswith(f"{scheme}\n"):
+            text = text[len(scheme) + 1:]
+        texts.append(text)
+        previous = scheme
+    return texts
+
+
+class ContextPacker:
+    """
+    Packs reranked chunks into the prompt context within a token budget.
+
+    - Chunks with the same text (e.g. repeated boilerplate) are kept once.
+    - Chunks adjacent in the same file are merged into one passage in
+      document order, dropping the `chunk_overlap` text they share and the
+      scheme heading repeated at the start of each chunk of a scheme.
+    - Passages are added best-ranked first until the budget is reached.
+      A passage that does not fit is truncated if at least
+      `min_passage_tokens` remain, otherwise it is left out and smaller
+      ones after it are still tried.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        min_passage_tokens: int = MIN_PASSAGE_TOKENS,
+        max_overlap: int = MAX_OVERLAP_CHARS
+    ):
+        self.counter = counter
+        self.budget = budget
+        self.min_passage_tokens = min_passage_tokens
+        self.max_overlap = max_overlap
+        self._separator_tokens = counter.count(PASSAGE_SEPARATOR)
+
+    def _passages(self, docs: list[Document]) -> tuple[list[tuple[str, int]], int]:
+        """(text, chunk count) of each passage, best-ranked first, and the number of duplicates."""
+        seen, unique = set(), []
+        for rank, doc in enumerate(docs):
+            digest = doc.metadata.get("chunk_hash") or chunk_hash(doc.page_content)
+            if digest in seen or not doc.page_content.strip():
+                continue
+            seen.add(digest)
+            unique.append((rank, doc))
+
+        # Runs of consecutive chunks of one file; a run ranks as its best chunk
+        runs: list[list[tuple[int, Document]]] = []
+        positioned = [item for item in unique if isinstance(item[1].metadata.get("chunk"), int) and item[1].metadata.get("source")]
+        for item in sorted(positioned, key=lambda item: (item[1].metadata["source"], item[1].metadata["chunk"])):
+            last = runs[-1][-1][1].metadata if runs else None
+            metadata = item[1].metadata
+            if last and last["source"] == metadata["source"] and last["chunk"] + 1 == metadata["chunk"]:
+                runs[-1].append(item)
+            else:
+                runs.append([item])
+        placed = {rank for rank, _ in positioned}
+        runs += [[item] for item in unique if item[0] not in placed]
+        runs.sort(key=lambda run: min(rank for rank, _ in run))
+
+        passages = [(merge_chunks(run_texts([doc for _, doc in run]), self.max_overlap), len(run)) for run in runs]
+        return passages, len(docs) - len(unique)
+
+    def pack(self, docs: list[Document], budget: Optional[int] = None) -> PackedContext:
+        """Pack `docs`, given best first, into at most `budget` tokens (default: the packer's budget)."""
+        budget = self.budget if budget is None else min(budget, self.budget)
+        passages, duplicates = self._passages(docs)
+        selected, tokens, chunks, dropped, truncated = [], 0, 0, 0, False
+        for text, count in passages:
+            room = budget - tokens - (self._separator_tokens if selected else 0)
+            size = self.counter.count(text)
+            if size <= room:
+                selected.append(text)
+                tokens += size + (self._separator_tokens if len(selected) > 1 else 0)
+                chunks += count
+            elif room >= self.min_passage_tokens and not truncated:
+                text = self.counter.truncate(text, room)
+                selected.append(text)
+                tokens += self.counter.count(text) + (self._separator_tokens if len(selected) > 1 else 0)
+                chunks += count
+                truncated = True
+            else:
+                dropped += count
+        return PackedContext(
+            text=PASSAGE_SEPARATOR.join(selected),
+            tokens=tokens,
+            passages=len(selected),
+            chunks=chunks,
+            duplicates=duplicates,
+            dropped=dropped,
+            truncated=truncated
+        )
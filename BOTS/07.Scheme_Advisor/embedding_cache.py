@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import queue
+import hashlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.sqlite3"
+LOOKUP_BATCH_SIZE = 500  # keys per SQLite lookup, below its bound-parameter limit
+EMBED_BATCH_SIZE = 64    # texts per request once concurrent calls are coalesced
+EMBED_BATCH_WAIT_MS = 5  # how long a request waits for texts from other callers
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent cache in front of an embeddings model.
+
+    Vectors are keyed by (model, sha256(text)) and appended as float32 rows
+    to one file per model, which is read through a memory map. A SQLite
+    index maps each key to its row. Only texts that are not cached yet are
+    sent to the wrapped model, so re-indexing and repeated questions skip
+    the network round trip. Queries and documents share the cache, which
+    assumes the model embeds both the same way (as `OllamaEmbeddings` does).
+
+    Vectors are written before their index rows are committed, so a crash
+    can leave unused rows at the end of a file but never an index entry
+    pointing at a missing vector.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, directory: Path):
+        self.embeddings = embeddings
+        self.model = model
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model)}.f32"
+        self.stats = {"documents": CacheStats(), "queries": CacheStats()}
+        self._lock = threading.Lock()
+        self._map: Optional[np.memmap] = None
+
+        self._conn = sqlite3.connect(self.directory / INDEX_NAME, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER NOT NULL)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+        self.dim: Optional[int] = row[0] if row else None
+        self._rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+        if self.vectors_path.exists():
+            # Drop rows written by a run that stopped before indexing them
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(self._rows * (self.dim or 0) * 4)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _vectors(self) -> np.memmap:
+        """Memory map of every indexed vector, remapped when the file has grown. Caller holds the lock."""
+        if self._map is None or len(self._map) < self._rows:
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return self._map
+
+    def _indexed(self, hashes: list[str]) -> dict[str, int]:
+        """Rows of the keys in `hashes` that are already indexed. Caller holds the lock."""
+        rows = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+            rows.update(self._conn.execute(
+                f"SELECT hash, row FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                (self.model, *batch)
+            ).fetchall())
+        return rows
+
+    def _lookup(self, hashes: list[str]) -> dict[str, list[float]]:
+        with self._lock:
+            if not self._rows:
+                return {}
+            rows = self._indexed(hashes)
+            if not rows:
+                return {}
+            vectors = self._vectors()
+            return {digest: vectors[row].tolist() for digest, row in rows.items()}
+
+    def _store(self, hashes: list[str], vectors: list[list[float]]) -> list[list[float]]:
+        """
+        Append new vectors and index them; returns them rounded to float32 like
+        cached ones. Keys another thread indexed since the lookup keep their
+        row, so a text embedded twice concurrently leaves no unused row.
+        """
+        array = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = array.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO models (model, dim) VALUES (?, ?)", (self.model, self.dim))
+            elif array.shape[1] != self.dim:
+                raise ValueError(f"{self.model} returned {array.shape[1]}-dimensional vectors, the cache holds {self.dim}")
+            indexed = self._indexed(hashes) if self._rows else {}
+            new = [i for i, digest in enumerate(hashes) if digest not in indexed]
+            if new:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(array[new].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, hash, row) VALUES (?, ?, ?)",
+                    [(self.model, hashes[i], self._rows + offset) for offset, i in enumerate(new)]
+                )
+                self._conn.commit()
+                self._rows += len(new)
+            if indexed:
+                cached = self._vectors()
+                for i, digest in enumerate(hashes):
+                    if digest in indexed:
+                        array[i] = cached[indexed[digest]]
+        return array.tolist()
+
+    def _embed(self, texts: list[str], stats: CacheStats) -> list[list[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(hashes)))
+        missing = {digest: text for digest, text in zip(hashes, texts) if digest not in found}
+        misses = sum(1 for digest in hashes if digest in missing)
+        with self._lock:
+            stats.hits += len(texts) - misses
+            stats.misses += misses
+        if missing:
+            # The model is called without holding the lock; `_store` indexes a text embedded twice concurrently once
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            found.update(zip(missing, self._store(list(missing), vectors)))
+        return [found[digest] for digest in hashes]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, self.stats["documents"]) if texts else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], self.stats["queries"])[0]
+
+    def metrics(self) -> dict:
+        return {
+            "model": self.model,
+            "entries": len(self),
+            **{kind: stats.to_dict() for kind, stats in self.stats.items()},
+        }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Coalesces concurrent embedding calls into shared requests.
+
+    Calls are queued for one worker thread, which sends every text that
+    arrives within `batch_wait_ms` (up to `batch_size` texts, unless a
+    single call is larger) to the wrapped model in one `embed_documents`
+    request. Under load, many single-question embeddings cost one round
+    trip instead of one each. Like `CachedEmbeddings`, this assumes the
+    model embeds queries and documents the same way.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBED_BATCH_SIZE, batch_wait_ms: int = EMBED_BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.stats = {"requests": 0, "calls": 0, "texts": 0}
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embeddings", daemon=True)
+        self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            count = len(pending[0][0])
+            deadline = time.monotonic() + self.batch_wait
+            while count < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                count += len(pending[-1][0])
+
+            try:
+                vectors = self.embeddings.embed_documents([text for texts, _ in pending for text in texts])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.stats["requests"] += 1
+            self.stats["calls"] += len(pending)
+            self.stats["texts"] += count
+            offset = 0
+            for texts, future in pending:
+                future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        future: Future = Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
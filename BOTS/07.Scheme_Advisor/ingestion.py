@@ -0,0 +1,465 @@
+import os
+import time
+import hashlib
+import logging
+import itertools
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple, Optional, Union
+
+import fitz
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+from pymongo.collection import Collection
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 64      # chunks per embedding request
+INSERT_BATCH_SIZE = 500    # operations per bulk write
+EXTRACT_WORKERS = os.cpu_count() or 1  # processes extracting and splitting PDFs
+CHUNK_SIZE = 800          # characters per chunk
+CHUNK_OVERLAP = 100       # characters shared by consecutive chunks
+TEXT_KEY = "text"
+EMBEDDING_KEY = "embedding"
+
+# Per-file states recorded in the manifest (state collection)
+STATE_INDEXING = "indexing"  # chunks and vectors being synced
+STATE_DONE = "done"
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+def default_splitter(chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=[
+            "\n\n## ",
+            "\n\n# ",
+            "\n\n",
+            "\n",
+            "\n\n**",
+            ". ",
+            " ",
+            ""
+        ]
+    )
+
+
+def extract_text(pdf: Path) -> str:
+    with fitz.open(pdf) as doc:
+        return "\n".join(page.get_text("text") for page in doc)
+
+
+def file_hash(pdf: Path) -> str:
+    """Content hash of a PDF, read in blocks so large files are not loaded whole."""
+    digest = hashlib.sha256()
+    with open(pdf, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def vector_id(source: str, chunk_hash: str) -> str:
+    """Content-addressed vector id: an unchanged chunk keeps its id (and embedding) wherever it moves in the file."""
+    return f"{source}:{chunk_hash}"
+
+
+def corpus_version(state_collection: Collection) -> str:
+    """Hash of the finished manifest entries; it changes whenever a file is indexed, revised or replaced."""
+    digest = hashlib.sha256()
+    cursor = state_collection.find({"status": STATE_DONE}, {"_id": 0, "source": 1, "file_hash": 1}).sort("source", 1)
+    for state in cursor:
+        digest.update(f"{state['source']}\0{state.get('file_hash')}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ChunkRecord(NamedTuple):
+    source: str
+    chunk: int
+    text: str
+    metadata: Optional[dict] = None  # extra fields stored with the chunk, e.g. `scheme` and `pages`
+
+
+# A text splitter, or a chunker with `split_pdf(pdf) -> [(text, metadata)]` that reads the PDF itself
+# (see `chunking.SchemeChunker`)
+Splitter = Union[RecursiveCharacterTextSplitter, "chunking.SchemeChunker"]
+
+_worker_splitter: Optional[Splitter] = None
+
+
+def splitter_signature(splitter: Splitter) -> str:
+    """How `splitter` chunks; a file chunked with another signature is re-chunked even if its bytes are unchanged."""
+    if hasattr(splitter, "signature"):
+        return splitter.signature
+    return f"recursive:{splitter._chunk_size}:{splitter._chunk_overlap}"
+
+
+def _init_worker(splitter: Splitter) -> None:
+    global _worker_splitter
+    _worker_splitter = splitter
+
+
+def chunk_records(pdf: Path, splitter: Optional[Splitter] = None) -> list[ChunkRecord]:
+    """Extract and split one PDF. In a pool worker the splitter comes from the pool initializer."""
+    splitter = splitter or _worker_splitter
+    if hasattr(splitter, "split_pdf"):
+        return [ChunkRecord(pdf.name, i, text, metadata) for i, (text, metadata) in enumerate(splitter.split_pdf(pdf))]
+    chunks = splitter.split_text(extract_text(pdf))
+    return [ChunkRecord(pdf.name, i, text) for i, text in enumerate(chunks)]
+
+
+def iter_chunk_records(
+    pdf_files: list[Path],
+    splitter: Splitter,
+    workers: int = EXTRACT_WORKERS
+) -> Iterator[tuple[Path, Future]]:
+    """
+    Extract and split PDFs on a process pool, yielding each file with the
+    future of its chunk records as soon as that file is done.
+
+    Text extraction and splitting are CPU-bound and hold the GIL, so they run
+    in separate processes while the caller writes finished files. Only a few
+    files per worker are in flight at once, so a slow writer does not pull
+    the whole corpus into memory.
+    """
+    if workers <= 1 or len(pdf_files) <= 1:
+        for pdf in pdf_files:
+            future = Future()
+            try:
+                future.set_result(chunk_records(pdf, splitter))
+            except Exception as e:
+                future.set_exception(e)
+            yield pdf, future
+        return
+
+    # Spawn rather than fork: the Streamlit server process is multi-threaded
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(pdf_files)),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(splitter,)
+    ) as pool:
+        files = iter(pdf_files)
+        running = {pool.submit(chunk_records, pdf): pdf for pdf in itertools.islice(files, workers * 2)}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf = running.pop(future)
+                for pending in itertools.islice(files, 1):
+                    running[pool.submit(chunk_records, pending)] = pending
+                yield pdf, future
+
+
+def _batches(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class MongoVectorIndex:
+    """
+    Vector index interface of `IngestionEngine`, backed by the collection of
+    a LangChain MongoDB vector store.
+
+    Other backends (see `local_index.LocalHybridIndex`) implement the same
+    methods, so the engine populates whichever one is configured.
+    """
+
+    def __init__(self, vector_store, batch_size: int = INSERT_BATCH_SIZE):
+        self.collection = vector_store.collection
+        self.embeddings = vector_store.embeddings
+        self.batch_size = batch_size
+
+    def chunks(self, source: str) -> list[dict]:
+        """Every vector of `source` without its text and embedding; with its `text` instead of a hash for legacy vectors."""
+        docs = list(self.collection.find({"source": source}, {TEXT_KEY: 0, EMBEDDING_KEY: 0}))
+        # Vectors written before the manifest existed carry no chunk hash
+        unhashed = {doc["_id"]: doc for doc in docs if "chunk_hash" not in doc}
+        for batch in _batches(list(unhashed), self.batch_size):
+            for doc in self.collection.find({"_id": {"$in": batch}}, {"_id": 1, TEXT_KEY: 1}):
+                unhashed[doc["_id"]]["text"] = doc.get(TEXT_KEY, "")
+        return docs
+
+    def upsert(self, docs: list[dict]) -> None:
+        self.collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+
+    def update(self, updates: list[tuple]) -> None:
+        """Set fields on existing vectors, given as (id, fields) pairs."""
+        operations = [UpdateOne({"_id": doc_id}, {"$set": fields}) for doc_id, fields in updates]
+        for batch in _batches(operations, self.batch_size):
+            self.collection.bulk_write(batch, ordered=False)
+
+    def delete(self, ids: list) -> None:
+        for batch in _batches(ids, self.batch_size):
+            self.collection.delete_many({"_id": {"$in": batch}})
+
+    def delete_source(self, source: str) -> int:
+        return self.collection.delete_many({"source": source}).deleted_count
+
+    def flush(self) -> None:
+        """Writes are durable as they happen."""
+
+
+@dataclass
+class IngestionReport:
+    files: int = 0
+    skipped: int = 0      # unchanged since the last run
+    duplicates: int = 0   # byte-identical to a file indexed under another name
+    resumed: int = 0
+    failed: dict = field(default_factory=dict)
+    chunks: int = 0
+    embedded: int = 0     # chunks sent to the embedding model
+    reused: int = 0       # chunks that kept their existing vector
+    removed: int = 0      # vectors deleted for chunks no longer in a file
+    seconds: float = 0.0
+
+
+class IngestionEngine:
+    """
+    Incremental, resumable PDF ingestion.
+
+    `state_collection` is a manifest of ingested files, holding each file's
+    content hash, the signature of the splitter that chunked it and the
+    hashes of its chunks. A file whose bytes match a finished entry, under
+    any name, is skipped without being read, unless the splitter changed.
+    A revised or re-chunked file is re-split and only chunks with new text are embedded: unchanged
+    chunks keep their vectors and vectors of removed chunks are deleted.
+    Vectors are written per embedding batch under content-addressed ids, so
+    an interrupted run resumes by embedding only the chunks that have no
+    vector yet.
+
+    PDFs are extracted and split on a process pool (`extract_workers`), and
+    each file is written as soon as its chunk records arrive. Vectors go to
+    `vector_index`: a `MongoVectorIndex` or a local index with the same
+    methods.
+    """
+
+    def __init__(
+        self,
+        pdf_collection: Collection,
+        vector_index,
+        state_collection: Collection,
+        splitter: Optional[Splitter] = None,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        insert_batch_size: int = INSERT_BATCH_SIZE,
+        extract_workers: int = EXTRACT_WORKERS
+    ):
+        self.pdf_collection = pdf_collection
+        self.vector_index = vector_index
+        self.state_collection = state_collection
+        self.splitter = splitter or default_splitter()
+        self.chunking = splitter_signature(self.splitter)
+        self.embed_batch_size = embed_batch_size
+        self.insert_batch_size = insert_batch_size
+        self.extract_workers = extract_workers
+        state_collection.create_index("source", unique=True)
+        state_collection.create_index("file_hash")
+
+    def _set_state(self, source: str, **fields) -> dict:
+        state = {"source": source, **fields, "updated_at": time.time()}
+        self.state_collection.replace_one({"source": source}, state, upsert=True)
+        return state
+
+    def _store_chunks(self, source: str, chunks: list[str], hashes: list[str], metadata: list[dict]) -> None:
+        operations = [
+            ReplaceOne(
+                {"source": source, "chunk": i},
+                {**fields, "source": source, "chunk": i, "content": chunk, "chunk_hash": digest},
+                upsert=True
+            )
+            for i, (chunk, digest, fields) in enumerate(zip(chunks, hashes, metadata))
+        ]
+        # A revised file may have fewer chunks than before
+        operations.append(DeleteMany({"source": source, "chunk": {"$gte": len(chunks)}}))
+        for batch in _batches(operations, self.insert_batch_size):
+            self.pdf_collection.bulk_write(batch, ordered=False)
+
+    def _existing_vectors(self, source: str) -> tuple[dict, list]:
+        """Map chunk hash -> vector document for `source`, plus the ids of duplicate vectors."""
+        existing, duplicates = {}, []
+        for doc in self.vector_index.chunks(source):
+            # Legacy vectors have no chunk hash; hash their text instead
+            digest = doc.get("chunk_hash") or chunk_hash(doc.get("text", ""))
+            if digest in existing:
+                duplicates.append(doc["_id"])
+            else:
+                existing[digest] = doc
+        return existing, duplicates
+
+    def _sync_vectors(self, source: str, chunks: list[str], hashes: list[str], metadata: list[dict]) -> tuple[int, int, int]:
+        """
+        Bring the vectors of `source` in line with its chunks.
+
+        Returns the number of chunks embedded, vectors reused and vectors removed.
+        """
+        existing, stale = self._existing_vectors(source)
+        wanted: dict[str, int] = {}
+        for i, digest in enumerate(hashes):
+            wanted.setdefault(digest, i)  # repeated text within a file is embedded once
+
+        missing = [(i, digest) for digest, i in wanted.items() if digest not in existing]
+        for batch in _batches(missing, self.embed_batch_size):
+            texts = [chunks[i] for i, _ in batch]
+            vectors = self.vector_index.embeddings.embed_documents(texts)
+            self.vector_index.upsert([
+                {
+                    **metadata[i],
+                    "_id": vector_id(source, digest),
+                    TEXT_KEY: text,
+                    EMBEDDING_KEY: vector,
+                    "source": source,
+                    "chunk": i,
+                    "chunk_hash": digest
+                }
+                for (i, digest), text, vector in zip(batch, texts, vectors)
+            ])
+
+        # Unchanged chunks keep their vector; only their position and metadata are updated if they changed
+        updates = []
+        for digest, doc in existing.items():
+            if digest in wanted:
+                fields = {**metadata[wanted[digest]], "chunk": wanted[digest], "chunk_hash": digest}
+                if any(doc.get(key) != value for key, value in fields.items()):
+                    updates.append((doc["_id"], fields))
+        self.vector_index.update(updates)
+
+        # Removed chunks go last, so the previous version stays searchable until the new one is complete
+        stale += [doc["_id"] for digest, doc in existing.items() if digest not in wanted]
+        self.vector_index.delete(stale)
+        self.vector_index.flush()
+
+        reused = sum(1 for digest in existing if digest in wanted)
+        return len(missing), reused, len(stale)
+
+    def _remove(self, source: str) -> int:
+        """Delete the chunks and vectors of `source`; returns the number of vectors removed."""
+        self.pdf_collection.delete_many({"source": source})
+        removed = self.vector_index.delete_source(source)
+        self.vector_index.flush()
+        return removed
+
+    def _index(self, source: str, digest: str, records: list[ChunkRecord], report: IngestionReport) -> dict:
+        """Write the chunks and vectors of one extracted file and mark it done in the manifest."""
+        chunks = [record.text for record in records]
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        metadata = [record.metadata or {} for record in records]
+        self._store_chunks(source, chunks, hashes, metadata)
+        embedded, reused, removed = self._sync_vectors(source, chunks, hashes, metadata)
+        report.chunks += len(chunks)
+        report.embedded += embedded
+        report.reused += reused
+        report.removed += removed
+        logger.info(f"Ingested {source}: {embedded} chunks embedded, {reused} reused, {removed} removed")
+        return self._set_state(
+            source, file_hash=digest, status=STATE_DONE, chunking=self.chunking, chunk_count=len(chunks), chunk_hashes=hashes
+        )
+
+    def _mark_duplicate(self, source: str, digest: str, original: str, had_state: bool, report: IngestionReport) -> dict:
+        """Point a byte-identical copy at its indexed original instead of embedding it again."""
+        if had_state:
+            report.removed += self._remove(source)
+        report.duplicates += 1
+        return self._set_state(source, file_hash=digest, status=STATE_DONE, duplicate_of=original)
+
+    def ingest(self, pdf_files: list[Path], on_progress: Optional[Callable[[int, int, str], None]] = None) -> IngestionReport:
+        """Ingest new and revised PDFs and finish any that an earlier run left incomplete."""
+        start = time.perf_counter()
+        report = IngestionReport(files=len(pdf_files))
+        states = {state["source"]: state for state in self.state_collection.find({}, {"_id": 0})}
+        indexed = {
+            state["file_hash"]: state["source"] for state in states.values()
+            if state.get("status") == STATE_DONE and state.get("file_hash") and not state.get("duplicate_of")
+        }
+        finished = 0
+
+        def progress(name: str) -> None:
+            nonlocal finished
+            finished += 1
+            if on_progress:
+                on_progress(finished, len(pdf_files), name)
+
+        digests: dict[str, str] = {}
+        for pdf in pdf_files:
+            try:
+                digests[pdf.name] = file_hash(pdf)
+            except Exception as e:
+                logger.error(f"Failed to ingest {pdf.name}: {e}")
+                report.failed[pdf.name] = str(e)
+                progress(pdf.name)
+        # Revised files no longer hold the content they were indexed with, so copies of it
+        # must not be resolved against them, whichever order the files come in
+        for name, digest in digests.items():
+            previous = states.get(name, {}).get("file_hash")
+            if previous != digest and indexed.get(previous) == name:
+                del indexed[previous]
+
+        # Decide from content hashes alone which files need extracting
+        pending: dict[str, tuple[Path, str]] = {}
+        copies: list[tuple[Path, str, str, bool]] = []
+        for pdf in pdf_files:
+            if pdf.name not in digests:
+                continue
+            state = states.get(pdf.name, {})
+            digest = digests[pdf.name]
+            try:
+                original = indexed.get(digest)
+                if state.get("status") == STATE_DONE and state.get("file_hash") == digest:
+                    alias = state.get("duplicate_of")
+                    if alias:
+                        # A duplicate is only current while the file it points to is unchanged
+                        current = original == alias
+                    else:
+                        # A file is only current while it is chunked the same way
+                        current = state.get("chunking") == self.chunking
+                    if current:
+                        report.skipped += 1
+                        progress(pdf.name)
+                        continue
+
+                if original and original != pdf.name:
+                    if original in pending:
+                        # Copy of a file that is indexed in this run; recorded once the original is written
+                        copies.append((pdf, digest, original, bool(state)))
+                    else:
+                        self._mark_duplicate(pdf.name, digest, original, bool(state), report)
+                        progress(pdf.name)
+                    continue
+
+                if state and state.get("status") != STATE_DONE:
+                    report.resumed += 1
+                    logger.info(f"Resuming {pdf.name}")
+                indexed[digest] = pdf.name
+                pending[pdf.name] = (pdf, digest)
+            except Exception as e:
+                logger.error(f"Failed to ingest {pdf.name}: {e}")
+                report.failed[pdf.name] = str(e)
+                progress(pdf.name)
+
+        for pdf, future in iter_chunk_records([pdf for pdf, _ in pending.values()], self.splitter, self.extract_workers):
+            digest = pending[pdf.name][1]
+            try:
+                records = future.result()
+                # Record the file before touching its chunks, so an interrupted run is resumed
+                self._set_state(pdf.name, file_hash=digest, status=STATE_INDEXING)
+                self._index(pdf.name, digest, records, report)
+            except Exception as e:
+                logger.error(f"Failed to ingest {pdf.name}: {e}")
+                report.failed[pdf.name] = str(e)
+            progress(pdf.name)
+
+        for pdf, digest, original, had_state in copies:
+            if original in report.failed:
+                report.failed[pdf.name] = f"Identical to {original}, which failed to ingest"
+            else:
+                self._mark_duplicate(pdf.name, digest, original, had_state, report)
+            progress(pdf.name)
+
+        report.seconds = round(time.perf_counter() - start, 2)
+        return report
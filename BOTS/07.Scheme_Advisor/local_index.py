@@ -0,0 +1,442 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, List, Optional
+
+import hnswlib
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from ingestion import TEXT_KEY, EMBEDDING_KEY
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.sqlite3"
+HNSW_NAME = "vectors.hnsw"
+HNSW_M = 16                  # graph links per node
+HNSW_EF_CONSTRUCTION = 200
+HNSW_INITIAL_CAPACITY = 1024
+BM25_K1 = 1.2                # Lucene defaults, as used by Atlas Search
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens, close to Lucene's standard analyzer."""
+    return re.findall(r"\w+", text.lower())
+
+
+def matches(metadata: dict, mql: dict) -> bool:
+    """
+    Whether `metadata` passes an MQL filter of $and, $or, $in, $eq and
+    equality. As in MongoDB, a list field matches if any element does.
+    """
+    for key, condition in mql.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            values = value if isinstance(value, list) else [value]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if operator == "$in":
+                    found = any(value in operand for value in values)
+                elif operator == "$eq":
+                    found = operand in values
+                else:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                if not found:
+                    return False
+    return True
+
+
+class BM25Index:
+    """
+    In-memory inverted index with BM25 scoring.
+
+    Postings are kept as dicts for cheap updates, with a numpy copy per term
+    built on first use, so a query scores whole posting lists at once.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[int, int]] = {}
+        self.lengths = np.zeros(HNSW_INITIAL_CAPACITY, dtype=np.float32)
+        self.count = 0
+        self.total_length = 0
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    def add(self, label: int, text: str) -> None:
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[label] = tf
+            self._arrays.pop(term, None)
+        if label >= len(self.lengths):
+            self.lengths = np.concatenate([self.lengths, np.zeros(max(label + 1, len(self.lengths)), dtype=np.float32)])
+        self.lengths[label] = sum(terms.values())
+        self.total_length += self.lengths[label]
+        self.count += 1
+
+    def remove(self, label: int, text: str) -> None:
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(label, None)
+                self._arrays.pop(term, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.lengths[label]
+        self.lengths[label] = 0
+        self.count -= 1
+
+    def _term_arrays(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self.postings[term]
+            arrays = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                      np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> list[tuple[int, float]]:
+        """Top `k` labels by BM25 score, only among the `allowed` labels if given."""
+        if not self.count:
+            return []
+        average = self.total_length / self.count
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            labels, tfs = self._term_arrays(term)
+            idf = math.log(1 + (self.count - len(labels) + 0.5) / (len(labels) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[labels] / average)
+            scores[labels] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        if allowed is not None:
+            mask = np.zeros(len(scores), dtype=bool)
+            mask[allowed] = True
+            scores[~mask] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(label), float(scores[label])) for label in matched]
+
+
+class LocalHybridIndex:
+    """
+    On-disk hybrid index: HNSW for vectors and BM25 for full text.
+
+    SQLite holds every document (text, metadata and float32 vector) and is
+    the source of truth. The HNSW graph is saved next to it by `flush()`, and
+    rebuilt from SQLite at load if it is missing or older than the documents.
+    The BM25 index is built in memory from the stored texts.
+
+    It implements the same vector index methods as
+    `ingestion.MongoVectorIndex`, so `IngestionEngine` populates it directly.
+    """
+
+    def __init__(self, directory: Path, embeddings: Embeddings, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embeddings = embeddings
+        self.m = m
+        self.ef_construction = ef_construction
+        self.hnsw_path = self.directory / HNSW_NAME
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.directory / INDEX_NAME, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                label INTEGER NOT NULL UNIQUE,
+                source TEXT,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_source ON docs (source)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _new_hnsw(self, capacity: int) -> hnswlib.Index:
+        index = hnswlib.Index(space="cosine", dim=self.dim)
+        index.init_index(max_elements=max(capacity, HNSW_INITIAL_CAPACITY), M=self.m, ef_construction=self.ef_construction, allow_replace_deleted=True)
+        return index
+
+    def _load(self) -> None:
+        self._docs: dict[int, tuple[str, str, dict]] = {}  # label -> (id, text, metadata)
+        self._labels: dict[str, int] = {}
+        self.bm25 = BM25Index()
+        for label, doc_id, text, metadata in self._conn.execute("SELECT label, id, text, metadata FROM docs"):
+            self._docs[label] = (doc_id, text, json.loads(metadata))
+            self._labels[doc_id] = label
+            self.bm25.add(label, text)
+        self._next_label = max(self._docs, default=-1) + 1
+        self._generation = int(self._meta("generation") or 0)
+        self.dim = int(self._meta("dim")) if self._meta("dim") else None
+        self._hnsw: Optional[hnswlib.Index] = None
+        if self.dim is None:
+            return
+
+        if self.hnsw_path.exists() and self._meta("hnsw_generation") == str(self._generation):
+            self._hnsw = hnswlib.Index(space="cosine", dim=self.dim)
+            self._hnsw.load_index(str(self.hnsw_path), max_elements=max(len(self._docs), HNSW_INITIAL_CAPACITY), allow_replace_deleted=True)
+        else:
+            # The graph was not saved after the last write; rebuild it from the stored vectors
+            self._hnsw = self._new_hnsw(len(self._docs) * 2)
+            labels, vectors = [], []
+            for label, blob in self._conn.execute("SELECT label, vector FROM docs"):
+                labels.append(label)
+                vectors.append(np.frombuffer(blob, dtype=np.float32))
+            if labels:
+                self._hnsw.add_items(np.vstack(vectors), np.asarray(labels))
+            self._flush()
+            logger.info(f"Rebuilt HNSW index with {len(labels)} vectors")
+        logger.info(f"Loaded local index with {len(self._docs)} documents from {self.directory}")
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # --- Vector index interface used by IngestionEngine ---
+
+    def chunks(self, source: str) -> list[dict]:
+        with self._lock:
+            labels = [self._labels[doc_id] for (doc_id,) in self._conn.execute("SELECT id FROM docs WHERE source = ?", (source,))]
+            return [{"_id": self._docs[label][0], **self._docs[label][2]} for label in labels]
+
+    def upsert(self, docs: list[dict]) -> None:
+        if not docs:
+            return
+        vectors = np.asarray([doc[EMBEDDING_KEY] for doc in docs], dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+                self._hnsw = self._new_hnsw(HNSW_INITIAL_CAPACITY)
+            replaced = [self._labels[doc["_id"]] for doc in docs if doc["_id"] in self._labels]
+            self._remove_labels(replaced)
+
+            labels, rows = [], []
+            for doc, vector in zip(docs, vectors):
+                metadata = {key: value for key, value in doc.items() if key not in ("_id", TEXT_KEY, EMBEDDING_KEY)}
+                label = self._next_label
+                self._next_label += 1
+                labels.append(label)
+                rows.append((doc["_id"], label, doc.get("source"), doc[TEXT_KEY], json.dumps(metadata), vector.tobytes()))
+                self._docs[label] = (doc["_id"], doc[TEXT_KEY], metadata)
+                self._labels[doc["_id"]] = label
+                self.bm25.add(label, doc[TEXT_KEY])
+            self._conn.executemany("INSERT OR REPLACE INTO docs (id, label, source, text, metadata, vector) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._commit()
+
+            needed = self._hnsw.get_current_count() + len(labels)
+            if needed > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(needed * 2)
+            self._hnsw.add_items(vectors, np.asarray(labels), replace_deleted=True)
+
+    def update(self, updates: list[tuple]) -> None:
+        if not updates:
+            return
+        with self._lock:
+            rows = []
+            for doc_id, fields in updates:
+                label = self._labels.get(doc_id)
+                if label is None:
+                    continue
+                self._docs[label][2].update(fields)
+                rows.append((json.dumps(self._docs[label][2]), doc_id))
+            self._conn.executemany("UPDATE docs SET metadata = ? WHERE id = ?", rows)
+            self._conn.commit()
+
+    def delete(self, ids: list) -> None:
+        with self._lock:
+            self._remove_labels([self._labels[doc_id] for doc_id in ids if doc_id in self._labels])
+            self._commit()
+
+    def delete_source(self, source: str) -> int:
+        with self._lock:
+            labels = [self._labels[doc_id] for (doc_id,) in self._conn.execute("SELECT id FROM docs WHERE source = ?", (source,))]
+            self._remove_labels(labels)
+            self._commit()
+        return len(labels)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _remove_labels(self, labels: list[int]) -> None:
+        """Caller holds the lock and commits."""
+        for label in labels:
+            doc_id, text, _ = self._docs.pop(label)
+            del self._labels[doc_id]
+            self.bm25.remove(label, text)
+            self._hnsw.mark_deleted(label)
+            self._conn.execute("DELETE FROM docs WHERE label = ?", (label,))
+
+    def _commit(self) -> None:
+        self._generation += 1
+        self._set_meta("generation", self._generation)
+        self._conn.commit()
+
+    def _flush(self) -> None:
+        """Save the HNSW graph if documents changed since it was last saved. Caller holds the lock."""
+        if self._hnsw is None or self._meta("hnsw_generation") == str(self._generation):
+            return
+        partial = self.hnsw_path.with_suffix(".part")
+        self._hnsw.save_index(str(partial))
+        os.replace(partial, self.hnsw_path)
+        self._set_meta("hnsw_generation", self._generation)
+        self._conn.commit()
+
+    # --- Search ---
+
+    def distinct(self, field: str) -> list:
+        """Distinct values of a metadata field, flattening lists, like `Collection.distinct`."""
+        values = set()
+        with self._lock:
+            for _, _, metadata in self._docs.values():
+                value = metadata.get(field)
+                values.update(value if isinstance(value, list) else [value])
+        values.discard(None)
+        return sorted(values, key=str)
+
+    def filter_labels(self, mql: dict) -> set[int]:
+        """Labels of the documents that pass an MQL filter."""
+        with self._lock:
+            return {label for label, (_, _, metadata) in self._docs.items() if matches(metadata, mql)}
+
+    def vector_search(self, vector: list[float], k: int, ef: int, allowed: Optional[set[int]] = None) -> list[tuple[int, float]]:
+        """
+        Top `k` labels by cosine similarity, only among the `allowed` labels
+        if given. When no more labels are allowed than `ef` candidates would
+        be visited, they are scored exactly instead of walking the graph.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            k = min(k, len(self._docs) if allowed is None else len(allowed))
+            if not k:
+                return []
+            if allowed is not None and len(allowed) <= max(ef, k):
+                # Labels removed since the filter was evaluated are no longer in the graph
+                labels = np.asarray([label for label in allowed if label in self._docs], dtype=np.int64)
+                if not len(labels):
+                    return []
+                vectors = np.asarray(self._hnsw.get_items(labels), dtype=np.float32)
+                similarities = vectors @ (query / (np.linalg.norm(query) or 1.0))
+                order = np.argsort(-similarities, kind="stable")[:k]
+                return [(int(labels[i]), float(similarities[i])) for i in order]
+            self._hnsw.set_ef(max(ef, k))
+            labels, distances = self._hnsw.knn_query(query, k=k, filter=None if allowed is None else allowed.__contains__)
+        return [(int(label), 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+
+    def text_search(self, query: str, k: int, allowed: Optional[set[int]] = None) -> list[tuple[int, float]]:
+        with self._lock:
+            return self.bm25.search(query, k, None if allowed is None else np.fromiter(allowed, dtype=np.int64, count=len(allowed)))
+
+    def hybrid_search(
+        self,
+        query: str,
+        k: int,
+        vector_penalty: float = 60.0,
+        fulltext_penalty: float = 60.0,
+        vector_weight: float = 1.0,
+        fulltext_weight: float = 1.0,
+        oversampling_factor: int = 10,
+        pre_filter: Optional[dict] = None
+    ) -> list[Document]:
+        """
+        Reciprocal rank fusion of vector and full-text results, scored like
+        `MongoDBAtlasHybridSearchRetriever`: each list contributes
+        weight / (rank + penalty + 1), with ranks starting at 0. With a
+        `pre_filter` (MQL, see `matches`), both searches only rank the
+        documents that pass it.
+        """
+        allowed = None
+        if pre_filter:
+            allowed = self.filter_labels(pre_filter)
+            if not allowed:
+                return []
+        with span("query_embed"):
+            query_vector = self.embeddings.embed_query(query)
+        with span("vector_search"):
+            vector_hits = self.vector_search(query_vector, k, ef=k * oversampling_factor, allowed=allowed)
+        with span("fulltext_search"):
+            text_hits = self.text_search(query, k, allowed=allowed)
+
+        with span("fusion"):
+            scores: dict[int, dict[str, float]] = {}
+            for field, hits, penalty, weight in (
+                ("vector_score", vector_hits, vector_penalty, vector_weight),
+                ("fulltext_score", text_hits, fulltext_penalty, fulltext_weight),
+            ):
+                for rank, (label, _) in enumerate(hits):
+                    scores.setdefault(label, {"vector_score": 0.0, "fulltext_score": 0.0})[field] = weight / (rank + penalty + 1)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1]["vector_score"] + item[1]["fulltext_score"], reverse=True)[:k]
+            docs = []
+            with self._lock:
+                for label, fused in ranked:
+                    if label not in self._docs:
+                        continue
+                    doc_id, text, metadata = self._docs[label]
+                    docs.append(Document(
+                        page_content=text,
+                        metadata={"_id": doc_id, **metadata, **fused, "score": fused["vector_score"] + fused["fulltext_score"]}
+                    ))
+        return docs
+
+
+class LocalHybridSearchRetriever(BaseRetriever):
+    """
+    Hybrid retriever over a `LocalHybridIndex`, with the parameters of
+    `MongoDBAtlasHybridSearchRetriever`. A `pre_filter` passed to `invoke`
+    replaces the retriever's own for that query.
+    """
+
+    index: Any
+    k: int = 4
+    oversampling_factor: int = 10
+    vector_penalty: float = 60.0
+    fulltext_penalty: float = 60.0
+    vector_weight: float = 1.0
+    fulltext_weight: float = 1.0
+    pre_filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any) -> List[Document]:
+        return self.index.hybrid_search(
+            query,
+            kwargs.get("k", self.k),
+            vector_penalty=self.vector_penalty,
+            fulltext_penalty=self.fulltext_penalty,
+            vector_weight=self.vector_weight,
+            fulltext_weight=self.fulltext_weight,
+            oversampling_factor=self.oversampling_factor,
+            pre_filter=kwargs.get("pre_filter", self.pre_filter)
+        )
@@ -0,0 +1,389 @@
+import time
+import logging
+import ollama
+from pathlib import Path
+from typing import Callable, Optional
+from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+from langchain_core.documents import Document
+
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableSequence
+from langchain_core.output_parsers import StrOutputParser
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors import CrossEncoderReranker
+
+from ingestion import IngestionEngine, IngestionReport, MongoVectorIndex, TEXT_KEY, EMBEDDING_KEY, corpus_version
+from chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, SchemeChunker
+from local_index import LocalHybridIndex, LocalHybridSearchRetriever
+from embedding_cache import BatchedEmbeddings, CachedEmbeddings
+from answer_cache import AnswerCache
+from reranker import RERANKER_MODEL, RERANK_MAX_LENGTH, QuantizedCrossEncoder
+from atlas_search import TracedAtlasHybridSearchRetriever, ensure_search_indexes
+from scheme_filters import FILTER_FIELDS, QueryAnalyzer
+from tracing import Tracer, annotate, span
+from context_packer import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, ContextPacker, PackedContext, TokenCounter
+from resources import registry
+
+logger = logging.getLogger(__name__)
+
+# Configuration Constants
+OLLAMA_URL = "https://ollama.com" # Replace with your Ollama server URL if self-hosted
+DEFAULT_MODEL = "granite4:tiny-h"
+EMBED_MODEL = "snowflake-arctic-embed2:latest"
+DATA_DIR = Path("/data")
+EMBED_CACHE_DIR = DATA_DIR / ".embedding_cache"  # Persistent embedding cache
+
+# Retrieval backend: "atlas" (Atlas Vector Search + Atlas Search) or "local" (on-disk HNSW + BM25 index)
+RETRIEVAL_BACKEND = "atlas"
+LOCAL_INDEX_DIR = DATA_DIR / ".local_index"
+
+
+MONGO_URI = "mongodb+srv://<username>:<password>@cluster0.mongodb.net/?retryWrites=true&w=majority" # Replace with your MongoDB Atlas connection string
+DB_NAME = "msme" # Replace with your database name
+MONGO_POOL_SIZE = 50  # Connections shared by all requests of this process
+MONGO_TIMEOUT_MS = 5000  # Server selection timeout, so health checks fail fast
+HEALTH_CHECK_TIMEOUT = 5  # Seconds an Ollama health check may take
+VECTOR_NAMESPACE = f"{DB_NAME}.docs"
+VECTOR_INDEX = "vector_index"
+FULLTEXT_INDEX = "fulltext_index"  # Atlas search index for BM25
+HYBRID_TOP_K = 6  # Candidates returned by hybrid search and reranked
+FILTER_QUERIES = True  # Pre-filter hybrid search on the schemes, files, ministries, sectors, entity types and enterprise sizes a question names
+VECTOR_PENALTY = 50.0  # Reciprocal rank fusion penalties; higher values flatten the rank weights
+FULLTEXT_PENALTY = 50.0
+USER_COLLECTION = "users_collection"
+MEMORY_COLLECTION = "long_term_memory"
+COLLECTION_NAME = "pdf_collection"
+INGEST_STATE_COLLECTION = "ingest_state"  # Manifest of ingested files and their content hashes
+ANSWER_CACHE_COLLECTION = "answer_cache"  # Semantic cache of answered questions
+CORPUS_VERSION_TTL = 30  # Seconds before other processes notice a re-ingested corpus
+RERANK_QUANTIZE = False  # Dynamic int8 quantization; turn on once `python reranker.py` shows acceptable recall@5
+RERANK_TOP_N = 5  # Reranked chunks passed on to context packing
+CONTEXT_WINDOW = 4096  # num_ctx of the chat model; the prompt and the answer must fit in it
+ANSWER_TOKENS = 500  # Longest answer the model may generate
+TRACE_LOG = DATA_DIR / ".metrics" / "traces.jsonl"  # One JSON line of stage timings per question
+
+
+def init_db():
+    """Initialize the MongoDB client; its connection pool is shared by every request"""
+    mongo_client = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+    mongo_client[DB_NAME][COLLECTION_NAME].create_index([("source", 1), ("chunk", 1)], unique=True)
+    return mongo_client
+
+
+def init_model():
+    """Initialize the LLM"""
+    return ChatOllama(
+        model=DEFAULT_MODEL,
+        base_url=OLLAMA_URL,
+        temperature=0.2,
+        max_tokens=ANSWER_TOKENS,
+        num_ctx=CONTEXT_WINDOW,
+        repeat_penalty=1.1,
+        top_k=10,
+        top_p=0.95
+    )
+
+
+def init_embeddings():
+    """Initialize the embedding model behind the persistent cache"""
+    # Texts missing from the cache are embedded in batches shared by concurrent requests
+    return CachedEmbeddings(
+        BatchedEmbeddings(OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_URL)),
+        model=EMBED_MODEL,
+        directory=EMBED_CACHE_DIR
+    )
+
+
+def init_vector_store(embeddings, mongo_client):
+    """Initialize vector store with embeddings"""
+    if RETRIEVAL_BACKEND == "local":
+        return LocalHybridIndex(LOCAL_INDEX_DIR, embeddings)
+    # Built on the shared client; from_connection_string would open a second connection pool
+    db_name, collection_name = VECTOR_NAMESPACE.split(".")
+    vector_store = MongoDBAtlasVectorSearch(
+        collection=mongo_client[db_name][collection_name],
+        embedding=embeddings,
+        index_name=VECTOR_INDEX,
+        text_key=TEXT_KEY,
+        embedding_key=EMBEDDING_KEY,
+        auto_create_index=True,
+        auto_index_timeout=60,
+        relevance_score_fn="cosine"
+    )
+    # Metadata fields must be indexed in both search indexes to pre-filter on them
+    ensure_search_indexes(vector_store, FULLTEXT_INDEX, FILTER_FIELDS, timeout=60)
+    return vector_store
+
+
+def init_retriever(vector_store):
+    """Initialize hybrid search retriever"""
+    if RETRIEVAL_BACKEND == "local":
+        return LocalHybridSearchRetriever(
+            index=vector_store,
+            k=HYBRID_TOP_K,
+            fulltext_penalty=FULLTEXT_PENALTY,
+            vector_penalty=VECTOR_PENALTY
+        )
+    hybrid_retriever = TracedAtlasHybridSearchRetriever(
+        vectorstore=vector_store,
+        search_index_name=FULLTEXT_INDEX,
+        top_k=HYBRID_TOP_K,
+        fulltext_penalty=FULLTEXT_PENALTY,
+        vector_penalty=VECTOR_PENALTY
+    )
+    return hybrid_retriever
+
+
+# === PDF Ingestion to Vector Store ===
+def ingest_pdfs(pdf_collection: Collection, vector_store, on_progress: Optional[Callable[[int, int, str], None]] = None) -> Optional[IngestionReport]:
+    """Ingest new and changed PDFs from DATA_DIR, resuming any file a previous run left unfinished; None if there are no PDFs"""
+    pdf_files = list(sorted(DATA_DIR.glob("*.pdf")))
+    if not pdf_files:
+        return None
+
+    engine = IngestionEngine(
+        pdf_collection=pdf_collection,
+        vector_index=vector_store if RETRIEVAL_BACKEND == "local" else MongoVectorIndex(vector_store),
+        state_collection=pdf_collection.database[INGEST_STATE_COLLECTION],
+        splitter=registry.get("chunker")
+    )
+    report = engine.ingest(pdf_files, on_progress=on_progress)
+    # Cached answers from the previous corpus must not be served
+    clear_corpus_version()
+    return report
+
+
+_corpus_version: tuple[float, Optional[str]] = (0.0, None)
+
+
+def get_corpus_version(pdf_collection: Collection) -> str:
+    """Version of the indexed corpus, re-read at most every CORPUS_VERSION_TTL seconds; cached answers are only reused within one version"""
+    global _corpus_version
+    read_at, version = _corpus_version
+    if version is None or time.monotonic() - read_at > CORPUS_VERSION_TTL:
+        version = corpus_version(pdf_collection.database[INGEST_STATE_COLLECTION])
+        _corpus_version = (time.monotonic(), version)
+    return version
+
+
+def clear_corpus_version() -> None:
+    global _corpus_version
+    _corpus_version = (0.0, None)
+
+
+_query_analyzer: tuple[Optional[str], Optional[QueryAnalyzer]] = (None, None)
+
+
+def get_query_analyzer(pdf_collection: Collection) -> QueryAnalyzer:
+    """Query analyzer over the schemes and files of the indexed corpus, rebuilt when the corpus version changes"""
+    global _query_analyzer
+    version = get_corpus_version(pdf_collection)
+    built_for, analyzer = _query_analyzer
+    if analyzer is None or built_for != version:
+        analyzer = QueryAnalyzer.from_store(pdf_collection.distinct)
+        _query_analyzer = (version, analyzer)
+    return analyzer
+
+
+def init_answer_cache(db, embeddings):
+    """Initialize the semantic answer cache"""
+    return AnswerCache(db[ANSWER_CACHE_COLLECTION], embeddings)
+
+
+def init_context_packer():
+    """Initialize the packer that fits reranked chunks into the prompt's token budget"""
+    counter = TokenCounter(CONTEXT_TOKENIZER)
+    template_tokens = counter.count(RECOMMENDER_PROMPT.invoke({"question": "", "context": ""}).to_string())
+    return ContextPacker(counter, budget=CONTEXT_TOKEN_BUDGET), template_tokens
+
+
+def init_chunker():
+    """Initialize the chunker that splits each scheme on its own, with chunks sized by the reranker's tokenizer"""
+    return SchemeChunker(CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, TokenCounter(RERANKER_MODEL))
+
+
+def init_tracer():
+    """Initialize the tracer that records per-stage latencies of each question"""
+    return Tracer(TRACE_LOG)
+
+
+def init_reranker(hybrid_retriever):
+    """Initialize reranker with hybrid retriever"""
+    reranker_model = QuantizedCrossEncoder(
+        model_name=RERANKER_MODEL,
+        max_length=RERANK_MAX_LENGTH,
+        quantize=RERANK_QUANTIZE
+    )
+    compressor = CrossEncoderReranker(model=reranker_model, top_n=RERANK_TOP_N)
+    compression_retriever = ContextualCompressionRetriever(
+        base_compressor=compressor,
+        base_retriever=hybrid_retriever
+    )
+    return compression_retriever
+
+
+SYSTEM_RECOMMENDER = """
+### ROLE & IDENTITY
+You are an expert Scheme Eligibility Analyst for MSMEs, NGOs, and Startups. Your function is to analyze retrieved documents (Context) and extract precise information about government and institutional schemes. You must act as a strict bridge between the User's Query and the Provided Context.
+
+### CORE PROTOCOL regarding CONTEXT
+1. **Source of Truth:** Your knowledge is **exclusively** limited to the provided text chunks (Context). Do not use outside knowledge, even if you know the scheme from your pre-training.
+2. **Silence on Absence:** If the answer is not in the context, do not attempt to answer. State clearly: "There is no mention in the provided context."
+
+---
+
+### OPERATIONAL LOGIC & SCENARIOS
+
+#### SCENARIO 1: User asks for a LIST of available schemes
+**Action:** Scan the context and extract scheme names.
+**Filtration Rules (Critical):**
+* **Identify Entities:** Look for proper nouns and distinct program names (e.g., "PM SVANidhi", "CGTMSE").
+* **Purge Artifacts:** Aggressively filter out non-scheme text. Do NOT list:
+    * Section headers (e.g., "NEW SCHEMES", "CHAPTER 4").
+    * Page numbers or alphanumeric codes (e.g., "MSME Schemes 18").
+    * Generic labels (e.g., "Introduction", "Eligibility Criteria").
+* **Deduplicate:** Ensure each scheme is listed only once.
+
+**Output Format:**
+* **[Scheme Name]**: [One-line summary based *strictly* on context].
+*(If no summary exists in text, list only the Name).*
+
+#### SCENARIO 2: User asks for DETAILS of a specific scheme
+**Action:** Extract specific attributes (Objective, Benefits, Eligibility).
+**Alias Handling:** You may match user abbreviations (e.g., "PMEGP") to full names in the text (e.g., "Prime Minister's Employment Generation Programme") ONLY if the full name appears in the context.
+
+**Output Format:**
+* **Scheme Name:** [Full Name]
+* **Objective:** [Quote or paraphrase from text]
+* **Key Benefits:** [Bullet points from text]
+
+#### SCENARIO 3: User asks for ELIGIBILITY / FIT (Profile Analysis)
+**Action:** Compare User Profile Data against Scheme Criteria found in the text.
+* **Step 1:** Extract User Data (Turnover, Sector, Registration Type, etc.).
+* **Step 2:** Locate Scheme Eligibility Rules in context.
+* **Step 3:** Map Data to Rules.
+
+**Output Format:**
+* **Scheme:** [Name]
+* **Verdict:** [Highly Suitable / Potentially Suitable / Not Suitable / Need More Info]
+* **Reasoning:** "Based on your turnover of [User Amount], you qualify because the scheme allows up to [Scheme Limit]."
+* *If data is missing:* "To confirm eligibility for [Scheme Name], please provide your [Missing Metric, e.g., Udyam Registration Status]."
+
+---
+
+### NEGATIVE CONSTRAINTS (DO NOT IGNORE)
+1. **No Hallucinations:** Never invent benefits, limits, or criteria. If the text says "Loans up to ₹1 Cr", do not say "approx ₹1 Cr". Be exact.
+2. **No External Suggestions:** Do not recommend schemes that are not present in the provided snippets, even if they are popular in the real world.
+3. **No Ambiguity:** If the context mentions a scheme name but provides zero details about it, state: "The scheme [Name] is mentioned, but the document provides no details regarding its benefits or eligibility."
+
+### EXAMPLE INTERACTION
+
+**Input Context:**
+"...Page 14... MSME SCHEMES 2024... The ZED Certification Scheme aims to promote Zero Defect Zero Effect manufacturing. Subsidy: 80% for Micro enterprises. ... CHAPTER 5..."
+
+**User Query:** "List available schemes."
+
+**Correct Response:**
+* **ZED Certification Scheme**: Aims to promote Zero Defect Zero Effect manufacturing with subsidies for enterprises.
+
+**(Note: "MSME SCHEMES 2024" and "CHAPTER 5" were correctly ignored.)**
+"""
+
+
+USER_TEMPLATE = """
+You must answer ONLY based on the retrieved context provided below.
+Do NOT generate or guess any information that is not explicitly present in the context.
+
+
+Retrieved context:
+{context}
+
+Question: {question}
+"""
+
+RECOMMENDER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_RECOMMENDER),
+    ("user", USER_TEMPLATE)
+])
+
+
+def init_rag_chain(model):
+    """Initialize RAG chain with model; it takes the prompt built by RECOMMENDER_PROMPT"""
+    rag_chain: RunnableSequence = model | StrOutputParser()
+    return rag_chain
+
+
+def check_ollama_model(name):
+    """Health check: the Ollama server answers and has the model"""
+    ollama.Client(host=OLLAMA_URL, timeout=HEALTH_CHECK_TIMEOUT).show(name)
+
+
+def register_resources():
+    """Register the shared resources of this process, in dependency order"""
+    registry.register(
+        "mongo_client", lambda r: init_db(),
+        health_check=lambda client: client.admin.command("ping"),
+        close=lambda client: client.close()
+    )
+    registry.register("model", lambda r: init_model(), health_check=lambda model: check_ollama_model(DEFAULT_MODEL))
+    registry.register("embeddings", lambda r: init_embeddings(), health_check=lambda embeddings: check_ollama_model(EMBED_MODEL))
+    registry.register("vector_store", lambda r: init_vector_store(r.get("embeddings"), r.get("mongo_client")))
+    registry.register("hybrid_retriever", lambda r: init_retriever(r.get("vector_store")))
+    registry.register(
+        "compression_retriever", lambda r: init_reranker(r.get("hybrid_retriever")),
+        health_check=lambda retriever: retriever.base_compressor.model.score([("health check", "ok")])
+    )
+    registry.register("rag_chain", lambda r: init_rag_chain(r.get("model")))
+    registry.register("answer_cache", lambda r: init_answer_cache(r.get("mongo_client")[DB_NAME], r.get("embeddings")))
+    registry.register("context_packer", lambda r: init_context_packer())
+    registry.register("chunker", lambda r: init_chunker())
+    registry.register("tracer", lambda r: init_tracer())
+
+
+# === Question pipeline stages, timed as spans of the current trace ===
+def retrieve(query: str) -> list[Document]:
+    """Hybrid search, pre-filtered on the constraints the question names, followed by cross-encoder reranking"""
+    pre_filter = None
+    if FILTER_QUERIES:
+        with span("query_analysis"):
+            pdf_collection = registry.get("mongo_client")[DB_NAME][COLLECTION_NAME]
+            pre_filter = get_query_analyzer(pdf_collection).analyze(query).to_mql()
+
+    hybrid_retriever = registry.get("hybrid_retriever")
+    candidates = []
+    if pre_filter:
+        try:
+            candidates = hybrid_retriever.invoke(query, pre_filter=pre_filter)
+        except OperationFailure as e:
+            # The search indexes lack the filter fields, e.g. while ensure_search_indexes' update builds
+            logger.warning(f"Filtered search failed, searching unfiltered: {e}")
+    filtered = bool(candidates)
+    if not filtered:
+        # Also when nothing passed the filter, as the question's constraints may not match how chunks are tagged
+        candidates = hybrid_retriever.invoke(query)
+    annotate(pre_filter=pre_filter if filtered else None, candidates=len(candidates))
+    with span("rerank"):
+        reranker = registry.get("compression_retriever").base_compressor
+        return list(reranker.compress_documents(candidates, query))
+
+
+def pack_context(query: str, docs: list[Document]) -> tuple[PackedContext, int]:
+    """Pack reranked chunks into the room the prompt leaves; returns the packed context and the prompt's token count"""
+    with span("context_pack"):
+        context_packer, template_tokens = registry.get("context_packer")
+        question_tokens = context_packer.counter.count(query)
+        # Room left in the context window for retrieved text
+        room = CONTEXT_WINDOW - ANSWER_TOKENS - template_tokens - question_tokens
+        packed = context_packer.pack(docs, budget=room)
+    return packed, template_tokens + question_tokens + packed.tokens
+
+
+def build_prompt(query: str, context_text: str):
+    with span("prompt_build"):
+        return RECOMMENDER_PROMPT.invoke({"question": query, "context": context_text})
@@ -0,0 +1,227 @@
+import re
+import json
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Tuple
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from langchain.retrievers.document_compressors.cross_encoder import BaseCrossEncoder
+
+logger = logging.getLogger(__name__)
+
+RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
+RERANK_MAX_LENGTH = 512     # tokens per (query, passage) pair, special tokens included
+RERANK_BATCH_SIZE = 32      # pairs per forward pass
+RERANK_BATCH_WAIT_MS = 5    # how long a forward pass waits for pairs from other sessions
+TOKEN_CACHE_SIZE = 10000    # passages whose token ids are kept
+
+
+class QuantizedCrossEncoder(BaseCrossEncoder):
+    """
+    Local cross-encoder tuned for CPU reranking.
+
+    Compared to `HuggingFaceCrossEncoder`:
+    - With `quantize`, the Linear layers are dynamically quantized to int8,
+      which is where most of a transformer's CPU time goes.
+    - Token ids of passages (and queries) are kept in an LRU cache, so chunks
+      that keep coming back as candidates are tokenized once.
+    - Pairs are truncated to `max_length` tokens.
+    - `score` calls from concurrent sessions are queued for one worker
+      thread, which scores everything that arrives within `batch_wait_ms`
+      together, sorted by length to keep padding small.
+
+    With int8 weights, activations are quantized per forward pass, so a
+    score can shift slightly with the batch it was computed in. Use
+    `recall_check` (or `python reranker.py`) to compare the rankings with
+    the fp32 model before turning it on.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANKER_MODEL,
+        max_length: int = RERANK_MAX_LENGTH,
+        quantize: bool = False,
+        batch_size: int = RERANK_BATCH_SIZE,
+        batch_wait_ms: int = RERANK_BATCH_WAIT_MS,
+        token_cache_size: int = TOKEN_CACHE_SIZE
+    ):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.token_cache_size = token_cache_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.stats = {"batches": 0, "pairs": 0, "token_cache_hits": 0, "token_cache_misses": 0}
+
+        self._tokens: OrderedDict[str, list[int]] = OrderedDict()
+        self._tokens_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="reranker", daemon=True)
+        self._worker.start()
+        logger.info(f"Loaded reranker {model_name} ({'int8' if quantize else 'fp32'}, max {max_length} tokens)")
+
+    def _token_ids(self, text: str) -> list[int]:
+        with self._tokens_lock:
+            ids = self._tokens.get(text)
+            if ids is not None:
+                self._tokens.move_to_end(text)
+                self.stats["token_cache_hits"] += 1
+                return ids
+        # A passage never contributes more than max_length tokens, so longer ones need not be tokenized in full
+        ids = self.tokenizer.encode(text, add_special_tokens=False, truncation=True, max_length=self.max_length)
+        with self._tokens_lock:
+            self._tokens[text] = ids
+            self.stats["token_cache_misses"] += 1
+            while len(self._tokens) > self.token_cache_size:
+                self._tokens.popitem(last=False)
+        return ids
+
+    def _encode(self, query: str, passage: str) -> dict:
+        return self.tokenizer.prepare_for_model(
+            self._token_ids(query),
+            self._token_ids(passage),
+            truncation="longest_first",
+            max_length=self.max_length
+        )
+
+    def _forward(self, features: list[dict]) -> list[float]:
+        scores = [0.0] * len(features)
+        order = sorted(range(len(features)), key=lambda i: len(features[i]["input_ids"]))
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                chunk = order[start:start + self.batch_size]
+                batch = self.tokenizer.pad([features[i] for i in chunk], return_tensors="pt")
+                logits = self.model(**batch).logits
+                # Same activation as sentence-transformers: sigmoid for one label, else the "relevant" class
+                values = torch.sigmoid(logits[:, 0]) if logits.shape[1] == 1 else torch.softmax(logits, dim=-1)[:, 1]
+                for i, value in zip(chunk, values.tolist()):
+                    scores[i] = value
+                self.stats["batches"] += 1
+        self.stats["pairs"] += len(features)
+        return scores
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            count = len(pending[0][0])
+            deadline = time.monotonic() + self.batch_wait
+            while count < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                count += len(pending[-1][0])
+
+            try:
+                scores = self._forward([feature for features, _ in pending for feature in features])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for features, future in pending:
+                future.set_result(scores[offset:offset + len(features)])
+                offset += len(features)
+
+    def score(self, text_pairs: List[Tuple[str, str]]) -> List[float]:
+        if not text_pairs:
+            return []
+        features = [self._encode(query, passage) for query, passage in text_pairs]
+        future: Future = Future()
+        self._queue.put((features, future))
+        return future.result()
+
+
+def recall_check(reference: BaseCrossEncoder, candidate: BaseCrossEncoder, samples: list[tuple[str, list[str]]], top_n: int = 5) -> dict:
+    """
+    Compare a reranker against a reference on (query, passages) samples.
+
+    Recall is the share of the reference's top `top_n` passages that the
+    candidate also ranks in its top `top_n`. Latencies are per query.
+    """
+    def rank(encoder: BaseCrossEncoder, query: str, passages: list[str]) -> tuple[set, float]:
+        start = time.perf_counter()
+        scores = list(encoder.score([(query, passage) for passage in passages]))
+        elapsed = time.perf_counter() - start
+        return set(sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)[:top_n]), elapsed
+
+    found = expected = 0
+    reference_seconds, candidate_seconds = [], []
+    for query, passages in samples:
+        # Warm both models on the first sample so load-time work is not measured
+        if not reference_seconds:
+            rank(reference, query, passages)
+            rank(candidate, query, passages)
+        expected_top, seconds = rank(reference, query, passages)
+        reference_seconds.append(seconds)
+        candidate_top, seconds = rank(candidate, query, passages)
+        candidate_seconds.append(seconds)
+        found += len(expected_top & candidate_top)
+        expected += len(expected_top)
+
+    reference_ms = 1000 * sum(reference_seconds) / len(samples)
+    candidate_ms = 1000 * sum(candidate_seconds) / len(samples)
+    return {
+        "queries": len(samples),
+        f"recall@{top_n}": round(found / expected, 4) if expected else 0.0,
+        "reference_ms_per_query": round(reference_ms, 1),
+        "candidate_ms_per_query": round(candidate_ms, 1),
+        "speedup": round(reference_ms / candidate_ms, 2) if candidate_ms else 0.0,
+    }
+
+
+def sample_candidates(data_dir: Path, queries: list[str], per_query: int = 10) -> list[tuple[str, list[str]]]:
+    """Candidate passages for each query from the PDFs in `data_dir`, picked by term overlap."""
+    from chunking import SchemeChunker
+    from ingestion import chunk_records
+
+    chunker = SchemeChunker()
+    chunks = [record.text for pdf in sorted(data_dir.glob("*.pdf")) for record in chunk_records(pdf, chunker)]
+    words = [set(re.findall(r"\w+", chunk.lower())) for chunk in chunks]
+    samples = []
+    for query in queries:
+        terms = set(re.findall(r"\w+", query.lower()))
+        best = sorted(range(len(chunks)), key=lambda i: len(terms & words[i]), reverse=True)[:per_query]
+        samples.append((query, [chunks[i] for i in best]))
+    return samples
+
+
+if __name__ == "__main__":
+    import argparse
+    from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+
+    parser = argparse.ArgumentParser(description="Check the quantized reranker against the fp32 model.")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).parent / "data")
+    parser.add_argument("--model", default=RERANKER_MODEL)
+    parser.add_argument("--max-length", type=int, default=RERANK_MAX_LENGTH)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--queries", type=Path, help="Text file with one query per line")
+    args = parser.parse_args()
+
+    queries = args.queries.read_text(encoding="utf-8").split("\n") if args.queries else [
+        "What MSME schemes are available for small startups?",
+        "Tell me about the PM SVANidhi scheme",
+        "What are the benefits of CGTMSE for a small enterprise?",
+        "I'm a private limited company with ₹50 lakhs turnover. Which schemes suit me?",
+        "Which schemes give collateral-free loans to street vendors?",
+        "Is there a subsidy for technology upgradation of micro enterprises?",
+        "How can women entrepreneurs get credit support?",
+        "What support is there for exporters in the MSME sector?",
+    ]
+    samples = sample_candidates(args.data_dir, [query for query in queries if query.strip()])
+    reference = HuggingFaceCrossEncoder(model_name=args.model)
+    candidate = QuantizedCrossEncoder(model_name=args.model, max_length=args.max_length, quantize=True)
+    print(json.dumps(recall_check(reference, candidate, samples, top_n=args.top_n), indent=2))
@@ -0,0 +1,148 @@
+import time
+import atexit
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = 30  # seconds a health check result is reused
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+CLOSED = "closed"
+
+
+@dataclass
+class Resource:
+    name: str
+    factory: Callable[["ResourceRegistry"], Any]       # builds the value; gets dependencies from the registry
+    health_check: Optional[Callable[[Any], None]] = None  # raises if the value is unusable
+    close: Optional[Callable[[Any], None]] = None
+    value: Any = None
+    status: str = PENDING
+    error: Optional[str] = None
+    load_seconds: Optional[float] = None
+    healthy: Optional[bool] = None
+    checked_at: float = 0.0
+    check_error: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of shared, expensive resources.
+
+    Each resource is built once per process by its factory, on first `get()`
+    or by `warm_up()`, and shared by every session. A failed build is
+    recorded and retried on the next `get()`. Resources are closed in
+    reverse order of registration when the process exits.
+    """
+
+    def __init__(self):
+        self._resources: dict[str, Resource] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._resources
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[["ResourceRegistry"], Any],
+        health_check: Optional[Callable[[Any], None]] = None,
+        close: Optional[Callable[[Any], None]] = None
+    ) -> None:
+        """Add a resource; registering a name again keeps the existing one."""
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = Resource(name, factory, health_check, close)
+
+    def ready(self, name: str) -> bool:
+        return self._resources[name].status == READY
+
+    def get(self, name: str) -> Any:
+        resource = self._resources[name]
+        if resource.status == READY:
+            return resource.value
+        with resource.lock:
+            if resource.status != READY:
+                resource.status = LOADING
+                start = time.perf_counter()
+                try:
+                    resource.value = resource.factory(self)
+                except Exception as e:
+                    resource.status, resource.error = FAILED, str(e)
+                    logger.exception(f"Failed to load {name}")
+                    raise
+                resource.load_seconds = time.perf_counter() - start
+                resource.status, resource.error = READY, None
+                resource.healthy, resource.checked_at = True, time.time()
+                logger.info(f"Loaded {name} in {resource.load_seconds:.2f}s")
+        return resource.value
+
+    def warm_up(self, names: Optional[list[str]] = None, background: bool = False) -> list[threading.Thread]:
+        """
+        Load resources in parallel, one thread each; dependencies are shared
+        through `get()`. Waits for all of them unless `background` is set.
+        Failures are recorded and logged, not raised.
+        """
+        def load(name: str) -> None:
+            try:
+                self.get(name)
+            except Exception:
+                pass
+
+        pending = [name for name in (names or list(self._resources)) if self._resources[name].status in (PENDING, FAILED)]
+        threads = [threading.Thread(target=load, args=(name,), name=f"warm-up-{name}", daemon=True) for name in pending]
+        for thread in threads:
+            thread.start()
+        if not background:
+            for thread in threads:
+                thread.join()
+        return threads
+
+    def check(self, name: str, max_age: float = HEALTH_CHECK_INTERVAL) -> Resource:
+        """Run the resource's health check unless it ran in the last `max_age` seconds."""
+        resource = self._resources[name]
+        if resource.status != READY or resource.health_check is None or time.time() - resource.checked_at < max_age:
+            return resource
+        try:
+            resource.health_check(resource.value)
+            resource.healthy, resource.check_error = True, None
+        except Exception as e:
+            resource.healthy, resource.check_error = False, str(e)
+            logger.warning(f"Health check of {name} failed: {e}")
+        resource.checked_at = time.time()
+        return resource
+
+    def health(self, max_age: float = HEALTH_CHECK_INTERVAL) -> list[dict]:
+        """Status of every resource, running health checks older than `max_age` seconds."""
+        report = []
+        for name in list(self._resources):
+            resource = self.check(name, max_age)
+            report.append({
+                "name": name,
+                "status": resource.status,
+                "healthy": resource.healthy if resource.status == READY else None,
+                "load_seconds": round(resource.load_seconds, 2) if resource.load_seconds is not None else None,
+                "error": resource.check_error or resource.error,
+            })
+        return report
+
+    def close(self) -> None:
+        for resource in reversed(list(self._resources.values())):
+            if resource.status == READY and resource.close is not None:
+                try:
+                    resource.close(resource.value)
+                except Exception as e:
+                    logger.warning(f"Error closing {resource.name}: {e}")
+            resource.status = CLOSED
+
+
+# Shared by every session of the app process
+registry = ResourceRegistry()
+atexit.register(registry.close)
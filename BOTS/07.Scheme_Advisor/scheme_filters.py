@@ -0,0 +1,253 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# Fields stored with every chunk that retrieval can be pre-filtered on
+FILTER_FIELDS = ("source", "scheme", "ministry", "sectors", "entity_types", "enterprise_sizes")
+ANY = "any"  # value of a field the text says nothing about; it passes every filter on that field
+
+# The same patterns tag chunks at ingestion and constraints in questions, so both sides agree
+MINISTRIES = {
+    "Ministry of Micro, Small and Medium Enterprises": r"ministry of (?:msme|micro,? small (?:and|&) medium enterprises)|\bm/o msme\b|msme ministry",
+    "Ministry of Housing and Urban Affairs": r"ministry of housing (?:and|&) urban affairs|\bmohua\b",
+}
+SECTORS = {
+    "manufacturing": r"manufactur\w*",
+    "services": r"service (?:sector|enterprises?|units?|industr\w*)|services sector",
+    "khadi": r"\bkhadi\b",
+    "village_industries": r"village industr\w*|gramodyog",
+    "coir": r"\bcoir\b",
+    "agro_rural": r"\bagro\b|agro-based|agri(?:culture|cultural)|rural industr\w*",
+    "traditional_industries": r"traditional (?:industr|artisan|craft)\w*|handicraft\w*|handloom\w*",
+    "street_vending": r"street vend\w*",
+    "export": r"export\w*",
+}
+ENTITY_TYPES = {
+    "individual": r"\bindividuals?\b",
+    "women": r"\bwom[ae]n\b|mahila",
+    "sc_st": r"\bsc\s*[/-]?\s*st\b|scheduled (?:castes?|tribes?)",
+    "artisan": r"\bartisans?\b",
+    "street_vendor": r"street vendors?",
+    "startup": r"\bstart-?ups?\b",
+    "institution": r"(?:training|technical|khadi) institut\w*|\bngos?\b",
+    "cluster": r"\bclusters?\b|\bspvs?\b",
+}
+ENTERPRISE_SIZES = {
+    "micro": r"\bmicro\b|\bmses?\b|\bmsmes?\b",
+    "small": r"\bsmall\b|\bmses?\b|\bmsmes?\b",
+    "medium": r"\bmedium\b|\bmsmes?\b",
+}
+# MSME classification: upper limits of investment in plant and machinery and of turnover, in crore
+SIZE_LIMITS = (("micro", 1, 5), ("small", 10, 50), ("medium", 50, 250))
+AMOUNT = re.compile(
+    r"\b(investment|turnover)\b[^.\d]{0,40}?(\d+(?:\.\d+)?)\s*(crores?|cr\b|lakhs?|lacs?)",
+    re.IGNORECASE
+)
+GENERIC_WORDS = {
+    "a", "an", "and", "for", "in", "of", "the", "to", "scheme", "schemes", "programme", "program", "umbrella", "component",
+    "document", "booklet", "english", "guidelines", "flipbook", "pdf", "final", "new",
+}
+MIN_PHRASE_WORDS = 2   # a scheme name phrase needs this many non-generic words to be recognised
+MIN_ANY_CASE = 4       # shorter acronyms (ATI, PMS, IC) only match in capitals
+
+_compiled: dict[str, re.Pattern] = {}
+
+
+def _pattern(regex: str) -> re.Pattern:
+    if regex not in _compiled:
+        _compiled[regex] = re.compile(regex, re.IGNORECASE)
+    return _compiled[regex]
+
+
+def labels(vocabulary: dict[str, str], text: str) -> list[str]:
+    """Labels of `vocabulary` whose pattern occurs in `text`."""
+    return [label for label, regex in vocabulary.items() if _pattern(regex).search(text)]
+
+
+def section_fields(text: str) -> dict:
+    """Filterable fields of one scheme's text; `ANY` where it names none."""
+    return {
+        "sectors": labels(SECTORS, text) or [ANY],
+        "entity_types": labels(ENTITY_TYPES, text) or [ANY],
+        "enterprise_sizes": labels(ENTERPRISE_SIZES, text) or [ANY],
+    }
+
+
+def document_ministry(text: str) -> str:
+    """The ministry a document names most often, or `ANY`."""
+    counts = {ministry: len(_pattern(regex).findall(text)) for ministry, regex in MINISTRIES.items()}
+    ministry = max(counts, key=counts.get)
+    return ministry if counts[ministry] else ANY
+
+
+def words(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _phrase(text: str) -> str:
+    """Space-delimited words, so phrases match on word boundaries."""
+    return f" {' '.join(words(text))} "
+
+
+def _word(acronym: str) -> re.Pattern:
+    """`acronym` as a whole word, in capitals."""
+    return re.compile(rf"(?<!\w){re.escape(acronym)}(?!\w)")
+
+
+def _is_numbering(word: str) -> bool:
+    return word.isdigit() or re.fullmatch(r"[ivx]+", word) is not None
+
+
+def scheme_aliases(scheme: str) -> tuple[list[str], list[str]]:
+    """
+    Acronyms and name phrases a question can name `scheme` by, e.g.
+    "Prime Minister's Employment Generation Programme(PMEGP)" gives the
+    acronym "PMEGP" and the phrase "prime minister s employment generation
+    programme". Titles are also split at dashes and parentheses, so
+    "Tool Rooms and Technical Institutions - A Component of ..." is
+    recognised from its first part.
+    """
+    acronyms = [a for a in re.findall(r"\(([^()\s]+)\)", scheme) if sum(char.isupper() for char in a) >= 2]
+    phrases = []
+    for segment in re.split(r"\([^()]*\)|\s+[-–]\s*|[-–]\s+", scheme):
+        segment_words = words(segment)
+        while segment_words and _is_numbering(segment_words[0]):
+            segment_words.pop(0)
+        while segment_words and _is_numbering(segment_words[-1]):
+            segment_words.pop()
+        if sum(1 for word in segment_words if word not in GENERIC_WORDS) >= MIN_PHRASE_WORDS:
+            phrases.append(f" {' '.join(segment_words)} ")
+    return acronyms, phrases
+
+
+def source_keywords(sources: list[str]) -> dict[str, str]:
+    """Words of a file name that no other file name has, e.g. "svanidhi" -> "Scheme Document - PM SVANidhi.pdf"."""
+    names = {source: set(words(re.sub(r"\.pdf$", "", source, flags=re.IGNORECASE))) - GENERIC_WORDS for source in sources}
+    keywords = {}
+    for source, name_words in names.items():
+        others = set().union(*(other for name, other in names.items() if name != source))
+        for word in name_words - others:
+            if len(word) >= MIN_ANY_CASE and not word.isdigit():
+                keywords[word] = source
+    return keywords
+
+
+def enterprise_size(amount: float, kind: str) -> Optional[str]:
+    """Smallest MSME class an investment or turnover (in crore) fits, or None beyond medium."""
+    for size, investment, turnover in SIZE_LIMITS:
+        if amount <= (investment if kind == "investment" else turnover):
+            return size
+    return None
+
+
+@dataclass
+class QueryFilter:
+    """Constraints recognised in a question."""
+
+    schemes: list[str] = field(default_factory=list)
+    sources: list[str] = field(default_factory=list)
+    ministries: list[str] = field(default_factory=list)
+    sectors: list[str] = field(default_factory=list)
+    entity_types: list[str] = field(default_factory=list)
+    enterprise_sizes: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return any(vars(self).values())
+
+    def to_mql(self) -> Optional[dict]:
+        """
+        The constraints as an MQL filter, or None without any. Named schemes
+        and files are alternatives ($or); the other fields narrow them down
+        ($and), and chunks that say nothing about a field (`ANY`) pass it.
+        """
+        clauses = []
+        subject = []
+        if self.schemes:
+            subject.append({"scheme": {"$in": self.schemes}})
+        if self.sources:
+            subject.append({"source": {"$in": self.sources}})
+        if subject:
+            clauses.append(subject[0] if len(subject) == 1 else {"$or": subject})
+        for name, values in (
+            ("ministry", self.ministries),
+            ("sectors", self.sectors),
+            ("entity_types", self.entity_types),
+            ("enterprise_sizes", self.enterprise_sizes),
+        ):
+            if values:
+                clauses.append({name: {"$in": values + [ANY]}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class QueryAnalyzer:
+    """
+    Turns what a question says about schemes, files, ministries, sectors,
+    entity types and enterprise size into a `QueryFilter`.
+
+    Schemes and files are recognised from the values indexed in the corpus
+    (acronyms, name phrases and distinctive file name words); the other
+    fields from the same patterns that tag chunks at ingestion. Enterprise
+    size also comes from a stated investment or turnover. Only explicit
+    mentions count, so a question without any is searched unfiltered.
+    """
+
+    def __init__(self, schemes: list[str], sources: list[str]):
+        self.acronyms: dict[str, set[str]] = {}
+        self.phrases: dict[str, set[str]] = {}
+        for scheme in schemes:
+            acronyms, phrases = scheme_aliases(scheme)
+            for acronym in acronyms:
+                self.acronyms.setdefault(acronym, set())
+            for phrase in phrases:
+                self.phrases.setdefault(phrase, set()).add(scheme)
+        # An acronym also names sub-schemes whose titles use it, e.g. "2nd Loan for up-gradation of the existing PMEGP/..."
+        for acronym, names in self.acronyms.items():
+            names.update(scheme for scheme in schemes if _word(acronym).search(scheme))
+        self.source_keywords = source_keywords(sources)
+
+    @classmethod
+    def from_store(cls, distinct: Callable[[str], list]) -> "QueryAnalyzer":
+        """Build from the indexed values, given a `distinct(field)` function (a collection's or `LocalHybridIndex`'s)."""
+        return cls(
+            schemes=[scheme for scheme in distinct("scheme") if isinstance(scheme, str)],
+            sources=[source for source in distinct("source") if isinstance(source, str)]
+        )
+
+    def _schemes(self, query: str) -> list[str]:
+        schemes = set()
+        phrase = _phrase(query)
+        for acronym, names in self.acronyms.items():
+            if len(acronym) >= MIN_ANY_CASE:
+                found = _phrase(acronym) in phrase
+            else:
+                found = _word(acronym).search(query) is not None
+            if found:
+                schemes |= names
+        for name_phrase, names in self.phrases.items():
+            if name_phrase in phrase:
+                schemes |= names
+        return sorted(schemes)
+
+    def _enterprise_sizes(self, query: str) -> list[str]:
+        sizes = set(labels(ENTERPRISE_SIZES, query))
+        if len(sizes) == len(ENTERPRISE_SIZES):
+            sizes = set()  # "MSME" alone says nothing about size
+        for kind, amount, unit in AMOUNT.findall(query):
+            crore = float(amount) / (100 if unit.lower().startswith("la") else 1)
+            size = enterprise_size(crore, kind.lower())
+            if size:
+                sizes.add(size)
+        return sorted(sizes)
+
+    def analyze(self, query: str) -> QueryFilter:
+        query_words = set(words(query))
+        return QueryFilter(
+            schemes=self._schemes(query),
+            sources=sorted({source for word, source in self.source_keywords.items() if word in query_words}),
+            ministries=labels(MINISTRIES, query),
+            sectors=labels(SECTORS, query),
+            entity_types=labels(ENTITY_TYPES, query),
+            enterprise_sizes=self._enterprise_sizes(query)
+        )
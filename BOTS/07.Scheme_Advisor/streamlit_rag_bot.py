@@ -1,31 +1,9 @@
-import os
-import asyncio
-import fitz
-from pathlib import Path
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError
-from datetime import datetime, timezone
-
-from langchain_core.documents import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
-from langchain_mongodb.retrievers.hybrid_search import MongoDBAtlasHybridSearchRetriever
-
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence
-from langchain_core.output_parsers import StrOutputParser
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+import json
+import requests
+from typing import Iterator
 
 import streamlit as st
 
-# Only print this once when the module is loaded
-print("📦 All dependencies installed successfully!")
-
 # Set page config
 st.set_page_config(
     page_title="MSME Scheme Advisor",
@@ -154,317 +132,93 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Configuration Constants
-OLLAMA_URL = "https://ollama.com" # Replace with your Ollama server URL if self-hosted
-DEFAULT_MODEL = "granite4:tiny-h"
-EMBED_MODEL = "snowflake-arctic-embed2:latest"
-DATA_DIR = Path("/data")
-
-
-MONGO_URI = "mongodb+srv://<username>:<password>@cluster0.mongodb.net/?retryWrites=true&w=majority" # Replace with your MongoDB Atlas connection string
-DB_NAME = "msme" # Replace with your database name
-VECTOR_NAMESPACE = f"{DB_NAME}.docs"
-VECTOR_INDEX = "vector_index"
-FULLTEXT_INDEX = "fulltext_index"  # Atlas search index for BM25
-USER_COLLECTION = "users_collection"
-MEMORY_COLLECTION = "long_term_memory"
-COLLECTION_NAME = "pdf_collection"
-
-
-@st.cache_resource(show_spinner=False)
-def init_db():
-    """Initialize MongoDB connection and collections"""
-    mongo_client = MongoClient(MONGO_URI)
-    db = mongo_client[DB_NAME]
-    pdf_collection = db[COLLECTION_NAME]
-    user_col = db[USER_COLLECTION]
-    memory_col = db[MEMORY_COLLECTION]
-    pdf_collection.create_index([("source", 1), ("chunk", 1)], unique=True)
-    return mongo_client, db, pdf_collection, user_col, memory_col
-
-
-@st.cache_resource(show_spinner=False)
-def init_models():
-    """Initialize LLM and embedding models"""
-    try:
-        model = ChatOllama(
-            model=DEFAULT_MODEL,
-            base_url=OLLAMA_URL,
-            temperature=0.2,
-            max_tokens=500,
-            repeat_penalty=1.1,
-            top_k=10,
-            top_p=0.95
-        )
-        embeddings = OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_URL)
-        return model, embeddings
-    except Exception as e:
-        st.error(f"❌ Error initializing models: {e}")
-        raise e
-
-@st.cache_resource(show_spinner=False)
-def init_vector_store(_embeddings):
-    """Initialize vector store with embeddings"""
+API_BASE_URL = "http://localhost:8000"  # Scheme Advisor API (uvicorn api:app); replace if it runs elsewhere
+API_TIMEOUT = 300  # Seconds the API may take between two streamed events
+STATUS_TIMEOUT = 10  # Seconds the status and health endpoints may take
+
+
+STAGE_LABELS = {
+    "cache_lookup": "Cache lookup",
+    "query_analysis": "Query analysis",
+    "query_embed": "Query embedding",
+    "vector_search": "Vector search",
+    "fulltext_search": "Full-text search",
+    "hybrid_search": "Hybrid search",
+    "fusion": "Fusion",
+    "rerank": "Rerank",
+    "context_pack": "Context packing",
+    "prompt_build": "Prompt",
+    "llm_first_token": "First token",
+    "llm_total": "Full answer",
+}
+
+
+# Stages summed into each figure of the caption under an answer
+SUMMARY_STAGES = {
+    "Cache lookup": ("cache_lookup",),
+    "Retrieval": ("query_analysis", "query_embed", "vector_search", "fulltext_search", "hybrid_search", "fusion"),
+    "Rerank": ("rerank",),
+    "First token": ("llm_first_token",),
+    "Full answer": ("llm_total",),
+}
+
+
+def api_error(response):
     try:
-        vector_store = MongoDBAtlasVectorSearch.from_connection_string(
-            connection_string=MONGO_URI,
-            namespace=VECTOR_NAMESPACE,
-            embedding=_embeddings,
-            index_name=VECTOR_INDEX,
-            auto_create_index=True,
-            auto_index_timeout=60,
-            relevance_score_fn="cosine"
-        )
-        return vector_store
-    except Exception as e:
-        st.error(f"❌ Error initializing Vector Store: {e}")
-        raise e
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    return f"{detail} (HTTP {response.status_code})"
 
 
-@st.cache_resource(show_spinner=False)
-def init_retriever(_vector_store):
-    """Initialize hybrid search retriever"""
+def stream_events(path, payload=None) -> Iterator[dict]:
+    """POST to a streaming endpoint of the API, yielding its NDJSON events"""
     try:
-        hybrid_retriever = MongoDBAtlasHybridSearchRetriever(
-            vectorstore=_vector_store,
-            search_index_name=FULLTEXT_INDEX,
-            top_k=10,
-            fulltext_penalty=50.0,
-            vector_penalty=50.0
-        )
-        return hybrid_retriever
-    except Exception as e:
-        st.error(f"❌ Error initializing Hybrid Retriever: {e}")
-        raise e
-
-
-# === PDF Ingestion to Vector Store ===
-def pdf_to_docs(pdf_collection):
-    docs = []
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100,
-        separators=[
-            "\n\n## ",
-            "\n\n# ",
-            "\n\n",
-            "\n",
-            "\n\n**",
-            ". ",
-            " ",
-            ""
-        ]
+        with requests.post(f"{API_BASE_URL}{path}", json=payload, stream=True, timeout=API_TIMEOUT) as response:
+            if response.status_code != 200:
+                yield {"event": "error", "detail": api_error(response)}
+                return
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+    except requests.ConnectionError:
+        yield {"event": "error", "detail": f"Cannot connect to the API at {API_BASE_URL}. Make sure the FastAPI server is running."}
+    except requests.RequestException as e:
+        yield {"event": "error", "detail": f"Request error: {e}"}
+
+
+def stage_durations(trace):
+    """Milliseconds per stage, summing stages that ran more than once"""
+    durations = {}
+    for s in trace["spans"]:
+        durations[s["name"]] = durations.get(s["name"], 0.0) + s["duration_ms"]
+    return durations
+
+
+def format_timings(trace):
+    durations = stage_durations(trace)
+    return "⏱️ " + " · ".join(
+        f"{label} {sum(durations.get(stage, 0.0) for stage in stages):.0f} ms"
+        for label, stages in SUMMARY_STAGES.items()
+        if any(stage in durations for stage in stages)
     )
-    pdf_files = list(sorted(DATA_DIR.glob("*.pdf")))
-    
-    if not pdf_files:
-        st.info("ℹ️ No PDF files found in the data directory.")
-        return docs
-        
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for i, pdf in enumerate(pdf_files):
-        # Update progress
-        progress = (i + 1) / len(pdf_files)
-        progress_bar.progress(progress)
-        status_text.caption(f"Processing {i+1}/{len(pdf_files)}: {pdf.name}")
-        
-        # Skip if already in collection
-        existing = pdf_collection.count_documents({"source": pdf.name})
-        if existing > 0:
-            continue
-
-        try:
-            with fitz.open(pdf) as doc:
-                text = "\n".join(page.get_text("text") for page in doc)
-        except Exception as e:
-            st.warning(f"❌ Failed to read {pdf.name}: {e}")
-            continue
-
-        chunks = splitter.split_text(text)
-
-        for i, chunk in enumerate(chunks):
-            doc_obj = Document(
-                page_content=chunk,
-                metadata={"source": pdf.name, "chunk": i}
-            )
-
-            # Save to MongoDB collection (not vector yet)
-            try:
-                pdf_collection.insert_one({
-                    "source": pdf.name,
-                    "chunk": i,
-                    "content": chunk
-                })
-                docs.append(doc_obj)
-            except DuplicateKeyError:
-                pass  # Skip duplicates
-
-    progress_bar.empty()
-    status_text.empty()
-    return docs
-
-
-@st.cache_resource(show_spinner=False)
-def init_reranker(_hybrid_retriever):
-    """Initialize reranker with hybrid retriever"""
-    try:
-        reranker_model = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-v2-m3")
-        compressor = CrossEncoderReranker(model=reranker_model, top_n=5)
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=compressor,
-            base_retriever=_hybrid_retriever
-        )
-        return compression_retriever
-    except Exception as e:
-        st.error(f"❌ Error initializing Reranker: {e}")
-        raise e
-
-
-SYSTEM_RECOMMENDER = """
-### ROLE & IDENTITY
-You are an expert Scheme Eligibility Analyst for MSMEs, NGOs, and Startups. Your function is to analyze retrieved documents (Context) and extract precise information about government and institutional schemes. You must act as a strict bridge between the User's Query and the Provided Context.
-
-### CORE PROTOCOL regarding CONTEXT
-1. **Source of Truth:** Your knowledge is **exclusively** limited to the provided text chunks (Context). Do not use outside knowledge, even if you know the scheme from your pre-training.
-2. **Silence on Absence:** If the answer is not in the context, do not attempt to answer. State clearly: "There is no mention in the provided context."
 
----
 
-### OPERATIONAL LOGIC & SCENARIOS
+def show_trace(trace):
+    """Per-stage breakdown of one question, in the order the stages started"""
+    rows = [
+        {
+            "Stage": STAGE_LABELS.get(s["name"], s["name"]),
+            "Start (ms)": round(s["start_ms"], 1),
+            "Duration (ms)": round(s["duration_ms"], 1),
+        }
+        for s in sorted(trace["spans"], key=lambda s: s["start_ms"])
+    ]
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    attributes = trace["attributes"]
+    tokens = f" · ~{attributes['prompt_tokens']} prompt tokens" if "prompt_tokens" in attributes else ""
+    st.caption(f"Trace {trace['id']} · total {trace['duration_ms']:.0f} ms{tokens}")
 
-#### SCENARIO 1: User asks for a LIST of available schemes
-**Action:** Scan the context and extract scheme names.
-**Filtration Rules (Critical):**
-* **Identify Entities:** Look for proper nouns and distinct program names (e.g., "PM SVANidhi", "CGTMSE").
-* **Purge Artifacts:** Aggressively filter out non-scheme text. Do NOT list:
-    * Section headers (e.g., "NEW SCHEMES", "CHAPTER 4").
-    * Page numbers or alphanumeric codes (e.g., "MSME Schemes 18").
-    * Generic labels (e.g., "Introduction", "Eligibility Criteria").
-* **Deduplicate:** Ensure each scheme is listed only once.
-
-**Output Format:**
-* **[Scheme Name]**: [One-line summary based *strictly* on context].
-*(If no summary exists in text, list only the Name).*
-
-#### SCENARIO 2: User asks for DETAILS of a specific scheme
-**Action:** Extract specific attributes (Objective, Benefits, Eligibility).
-**Alias Handling:** You may match user abbreviations (e.g., "PMEGP") to full names in the text (e.g., "Prime Minister's Employment Generation Programme") ONLY if the full name appears in the context.
-
-**Output Format:**
-* **Scheme Name:** [Full Name]
-* **Objective:** [Quote or paraphrase from text]
-* **Key Benefits:** [Bullet points from text]
-
-#### SCENARIO 3: User asks for ELIGIBILITY / FIT (Profile Analysis)
-**Action:** Compare User Profile Data against Scheme Criteria found in the text.
-* **Step 1:** Extract User Data (Turnover, Sector, Registration Type, etc.).
-* **Step 2:** Locate Scheme Eligibility Rules in context.
-* **Step 3:** Map Data to Rules.
-
-**Output Format:**
-* **Scheme:** [Name]
-* **Verdict:** [Highly Suitable / Potentially Suitable / Not Suitable / Need More Info]
-* **Reasoning:** "Based on your turnover of [User Amount], you qualify because the scheme allows up to [Scheme Limit]."
-* *If data is missing:* "To confirm eligibility for [Scheme Name], please provide your [Missing Metric, e.g., Udyam Registration Status]."
-
----
-
-### NEGATIVE CONSTRAINTS (DO NOT IGNORE)
-1. **No Hallucinations:** Never invent benefits, limits, or criteria. If the text says "Loans up to ₹1 Cr", do not say "approx ₹1 Cr". Be exact.
-2. **No External Suggestions:** Do not recommend schemes that are not present in the provided snippets, even if they are popular in the real world.
-3. **No Ambiguity:** If the context mentions a scheme name but provides zero details about it, state: "The scheme [Name] is mentioned, but the document provides no details regarding its benefits or eligibility."
-
-### EXAMPLE INTERACTION
-
-**Input Context:**
-"...Page 14... MSME SCHEMES 2024... The ZED Certification Scheme aims to promote Zero Defect Zero Effect manufacturing. Subsidy: 80% for Micro enterprises. ... CHAPTER 5..."
-
-**User Query:** "List available schemes."
-
-**Correct Response:**
-* **ZED Certification Scheme**: Aims to promote Zero Defect Zero Effect manufacturing with subsidies for enterprises.
-
-**(Note: "MSME SCHEMES 2024" and "CHAPTER 5" were correctly ignored.)**
-"""
-
-
-USER_TEMPLATE = """
-You must answer ONLY based on the retrieved context provided below.
-Do NOT generate or guess any information that is not explicitly present in the context.
-
-
-Retrieved context:
-{context}
-
-Question: {question}
-"""
-
-RECOMMENDER_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", SYSTEM_RECOMMENDER),
-    ("user", USER_TEMPLATE)
-])
-
-
-@st.cache_resource(show_spinner=False)
-def init_rag_chain(_model):
-    """Initialize RAG chain with model"""
-    try:
-        rag_chain: RunnableSequence = (
-            {
-                "context": lambda x: x["context"],
-                "question": lambda x: x["question"],
-            }
-            | RECOMMENDER_PROMPT
-            | _model
-            | StrOutputParser()
-        )
-        return rag_chain
-    except Exception as e:
-        st.error(f"❌ Error initializing RAG Chain: {e}")
-        raise e
-
-if "initialized" not in st.session_state:
-    with st.spinner("Initializing components..."):
-        # Database initialization
-        mongo_client, db, pdf_collection, user_col, memory_col = init_db()
-        
-        # Models initialization
-        model, embeddings = init_models()
-        
-        # Vector store initialization
-        vector_store = init_vector_store(embeddings)
-        
-        # Retriever initialization
-        hybrid_retriever = init_retriever(vector_store)
-        
-        # Reranker initialization
-        compression_retriever = init_reranker(hybrid_retriever)
-        
-        # RAG chain initialization
-        rag_chain = init_rag_chain(model)
-        
-        # Store in session state
-        st.session_state.update({
-            "mongo_client": mongo_client,
-            "db": db,
-            "pdf_collection": pdf_collection,
-            "user_col": user_col,
-            "memory_col": memory_col,
-            "model": model,
-            "embeddings": embeddings,
-            "vector_store": vector_store,
-            "hybrid_retriever": hybrid_retriever,
-            "compression_retriever": compression_retriever,
-            "rag_chain": rag_chain,
-            "initialized": True
-        })
-
-# Retrieve components from session state
-if "initialized" in st.session_state:
-    pdf_collection = st.session_state.pdf_collection
-    compression_retriever = st.session_state.compression_retriever
-    rag_chain = st.session_state.rag_chain
 
 # Main header
 st.markdown("<h1 class='main-header'>🤖 MSME Scheme Advisor</h1>", unsafe_allow_html=True)
@@ -488,26 +242,55 @@ with tab1:
     # Query input with better styling
     query = st.text_input("Enter your question:", placeholder="e.g., What schemes are available for small businesses?", label_visibility="collapsed")
     
+    show_breakdown = st.toggle("Show latency breakdown", value=False)
+
     if query:
-        with st.spinner("🤖 Analyzing schemes and preparing recommendations..."):
-            try:
-                retrieved_docs = st.session_state.compression_retriever.invoke(query)
-                context_text = "\n\n".join(doc.page_content for doc in retrieved_docs)
-                response = st.session_state.rag_chain.invoke({"question": query, "context": context_text})
-                
-                # Display answer in a styled container
-                st.markdown("<h3>📋 Recommended Schemes</h3>", unsafe_allow_html=True)
-                st.markdown(response)
+        events = stream_events("/api/ask/stream", {"question": query})
+        with st.spinner("🔍 Retrieving and ranking relevant schemes..."):
+            context = next(events, {"event": "error", "detail": "The API closed the stream without an answer"})
+
+        if context["event"] == "error":
+            st.error(f"❌ Error during retrieval or response generation: {context['detail']}")
+        else:
+            # Display answer in a styled container
+            st.markdown("<h3>📋 Recommended Schemes</h3>", unsafe_allow_html=True)
+            if context["cached"]:
+                st.caption(f"⚡ Answered from cache: similar to \"{context['similar_question']}\" (similarity {context['similarity']:.2f})")
+
+            # The done or error event that ends the stream
+            end = {}
+
+            def answer_tokens():
+                for event in events:
+                    if event["event"] == "token":
+                        yield event["text"]
+                    else:
+                        end.update(event)
+
+            st.write_stream(answer_tokens())
+            st.markdown("</div>", unsafe_allow_html=True)
+
+            if end.get("event") == "done":
+                st.caption(format_timings(end["trace"]))
+                if show_breakdown:
+                    with st.expander("⏱️ Latency breakdown", expanded=True):
+                        show_trace(end["trace"])
+            else:
+                st.error(f"❌ Error during retrieval or response generation: {end.get('detail', 'the answer was cut off')}")
+
+            # Show context in expander with better styling
+            with st.expander("🔍 View Retrieved Context"):
+                if not context["cached"]:
+                    packed = context["packing"]
+                    st.caption(
+                        f"{packed['chunks']} of {context['retrieved']} chunks in {packed['passages']} passages · "
+                        f"{'' if packed['exact'] else '~'}{packed['tokens']} tokens"
+                        + (f" · {packed['duplicates']} duplicates removed" if packed["duplicates"] else "")
+                        + (" · last passage truncated" if packed["truncated"] else "")
+                    )
+                st.text(context["context"])
                 st.markdown("</div>", unsafe_allow_html=True)
 
-                # Show context in expander with better styling
-                with st.expander("🔍 View Retrieved Context"):
-                    st.text(context_text)
-                    st.markdown("</div>", unsafe_allow_html=True)
-
-            except Exception as e:
-                st.error(f"❌ Error during retrieval or response generation: {e}")
-
 with tab2:
     st.markdown("<h2 class='subheader'>Document Management</h2>", unsafe_allow_html=True)
     
@@ -517,22 +300,93 @@ with tab2:
         st.markdown("#### 📁 Ingest New Documents")
         if st.button("Ingest New PDFs", type="primary", use_container_width=True):
             with st.spinner("Ingesting new PDFs..."):
-                docs = pdf_to_docs(st.session_state.pdf_collection)
-                if docs:
-                    with st.spinner("Indexing documents..."):
-                        st.session_state.vector_store.add_documents(docs)
-                    st.success(f"✅ Successfully indexed {len(docs)} PDF chunks!")
-                    st.info(f"📄 Processed documents from {len(set(d.metadata['source'] for d in docs))} files")
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+                result = {"event": "error", "detail": "The API closed the stream before ingestion finished"}
+                for event in stream_events("/api/ingest/stream"):
+                    if event["event"] == "progress":
+                        progress_bar.progress(event["done"] / event["total"])
+                        status_text.caption(f"Processing {event['done']}/{event['total']}: {event['name']}")
+                    else:
+                        result = event
+                progress_bar.empty()
+                status_text.empty()
+
+                report = result.get("report")
+                if result["event"] == "error":
+                    st.error(f"❌ Error during ingestion: {result['detail']}")
+                elif report is None:
+                    st.info("ℹ️ No PDF files found in the data directory.")
                 else:
-                    st.info("ℹ️ No new PDF documents found for indexing.")
+                    for name, error in report["failed"].items():
+                        st.warning(f"❌ Failed to ingest {name}: {error}")
+                    if report["embedded"] or report["removed"]:
+                        st.success(f"✅ Successfully indexed {report['embedded']} PDF chunks in {report['seconds']}s!")
+                        processed = report["files"] - report["skipped"] - report["duplicates"] - len(report["failed"])
+                        st.info(
+                            f"📄 Processed documents from {processed} files ({report['resumed']} resumed): "
+                            f"{report['reused']} unchanged chunks reused, {report['removed']} removed"
+                        )
+                    else:
+                        st.info("ℹ️ No new or changed PDF documents found for indexing.")
+                    if report["duplicates"]:
+                        st.info(f"🔁 Skipped {report['duplicates']} files identical to already indexed ones")
     
     with col2:
         st.markdown("#### 📊 System Status")
         # Show some stats if available
         try:
-            doc_count = st.session_state.pdf_collection.count_documents({})
-            st.metric("Indexed Documents", doc_count)
-            st.success("✅ System Ready")
+            response = requests.get(f"{API_BASE_URL}/api/status", timeout=STATUS_TIMEOUT)
+            response.raise_for_status()
+            status = response.json()
+            st.metric("Indexed Documents", status["documents"])
+            cache = status["embedding_cache"]
+            st.metric("Embedding Cache Hit Rate", f"{cache['documents']['hit_rate']:.0%}")
+            st.caption(
+                f"{cache['entries']} cached vectors · "
+                f"documents {cache['documents']['hits']}/{cache['documents']['hits'] + cache['documents']['misses']} hits · "
+                f"queries {cache['queries']['hits']}/{cache['queries']['hits'] + cache['queries']['misses']} hits"
+            )
+            answers = status["answer_cache"]
+            st.metric("Answer Cache Hit Rate", f"{answers['hit_rate']:.0%}")
+            st.caption(f"{answers['entries']} cached answers · {answers['hits']}/{answers['hits'] + answers['misses']} questions answered from cache")
+            questions, batching = status["questions"], status["batching"]
+            st.caption(
+                f"{questions['active']}/{questions['limit']} questions in progress, {questions['waiting']} queued, "
+                f"{questions['rejected']} turned away · "
+                f"{batching['embeddings']['calls']} embedding calls in {batching['embeddings']['requests']} requests · "
+                f"{batching['reranker']['pairs']} rerank pairs in {batching['reranker']['batches']} batches"
+            )
+            latencies = status["latency_ms"]
+            if latencies:
+                st.markdown("**Stage latency over recent questions (ms)**")
+                st.dataframe(
+                    [{"Stage": STAGE_LABELS.get(stage, stage), **values} for stage, values in latencies.items()],
+                    hide_index=True,
+                    use_container_width=True
+                )
+            # 503 when a resource is unhealthy, with the same report
+            health = requests.get(f"{API_BASE_URL}/api/health", timeout=STATUS_TIMEOUT).json()
+            st.markdown("**Shared resources**")
+            st.dataframe(
+                [
+                    {
+                        "Resource": resource["name"],
+                        "Status": "✅" if resource["healthy"] else ("⏳" if resource["status"] == "loading" else "❌"),
+                        "Loaded in (s)": resource["load_seconds"],
+                        "Error": resource["error"] or "",
+                    }
+                    for resource in health["resources"]
+                ],
+                hide_index=True,
+                use_container_width=True
+            )
+            if health["healthy"]:
+                st.success("✅ System Ready")
+            else:
+                st.warning("⚠️ Some shared resources are unhealthy")
+        except requests.ConnectionError:
+            st.warning(f"⚠️ Cannot connect to the API at {API_BASE_URL}")
         except:
             st.warning("⚠️ Database connection pending")
     
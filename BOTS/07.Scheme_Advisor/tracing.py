@@ -0,0 +1,284 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stages of one answered question, in pipeline order
+STAGES = (
+    "cache_lookup",
+    "query_analysis",   # recognising schemes and other constraints to pre-filter on
+    "query_embed",
+    "vector_search",
+    "fulltext_search",
+    "hybrid_search",    # vector and full-text search in one aggregation
+    "fusion",
+    "rerank",
+    "context_pack",
+    "prompt_build",
+    "llm_first_token",
+    "llm_total",
+)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+RECENT_TRACES = 1000                   # traces kept in memory for percentiles
+TRACE_LOG_MAX_BYTES = 10 * 1024 * 1024  # the trace log is rotated to <name>.1 beyond this size
+METRIC_PREFIX = "scheme_advisor"
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    start: float     # seconds since the trace started
+    duration: float  # seconds
+
+
+@dataclass
+class Trace:
+    """Spans recorded while answering one question."""
+
+    name: str
+    attributes: dict = field(default_factory=dict)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    started_at: float = field(default_factory=time.time)
+    spans: list[Span] = field(default_factory=list)
+    outcome: str = "ok"
+    duration: float = 0.0
+    _origin: float = field(default_factory=time.perf_counter, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        """Add a span; `start` is a `time.perf_counter()` reading."""
+        with self._lock:
+            self.spans.append(Span(name, start - self._origin, duration))
+
+    def durations(self) -> dict[str, float]:
+        """Seconds per stage, summing stages that ran more than once."""
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "outcome": self.outcome,
+            "attributes": self.attributes,
+            "spans": [
+                {"name": span.name, "start_ms": round(span.start * 1000, 3), "duration_ms": round(span.duration * 1000, 3)}
+                for span in self.spans
+            ],
+        }
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name` of the current trace; a no-op outside a trace."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, start, time.perf_counter() - start)
+
+
+def annotate(**attributes) -> None:
+    """Set attributes of the current trace; a no-op outside a trace."""
+    trace = _current.get()
+    if trace is not None:
+        with trace._lock:
+            trace.attributes.update(attributes)
+
+
+def traced_stream(chunks: Iterator, first: str = "llm_first_token", total: str = "llm_total") -> Iterator:
+    """Pass streamed chunks through, recording the time to the first chunk and to the last one."""
+    trace = _current.get()
+    start = time.perf_counter()
+    first_seen = False
+    for chunk in chunks:
+        if trace is not None and not first_seen:
+            trace.record(first, start, time.perf_counter() - start)
+            first_seen = True
+        yield chunk
+    if trace is not None:
+        trace.record(total, start, time.perf_counter() - start)
+
+
+async def atraced_stream(chunks: AsyncIterator, first: str = "llm_first_token", total: str = "llm_total") -> AsyncIterator:
+    """Async version of `traced_stream`."""
+    trace = _current.get()
+    start = time.perf_counter()
+    first_seen = False
+    async for chunk in chunks:
+        if trace is not None and not first_seen:
+            trace.record(first, start, time.perf_counter() - start)
+            first_seen = True
+        yield chunk
+    if trace is not None:
+        trace.record(total, start, time.perf_counter() - start)
+
+
+class Tracer:
+    """
+    Collects finished traces and aggregates them per stage.
+
+    Each trace is appended as one JSON line to `log_path` (if set). Stage
+    latencies are aggregated into Prometheus histograms, served as text by
+    `serve()`, and the last `recent` traces are kept for percentiles.
+    """
+
+    def __init__(self, log_path: Optional[Path] = None, recent: int = RECENT_TRACES, buckets: tuple = LATENCY_BUCKETS):
+        self.log_path = Path(log_path) if log_path else None
+        if self.log_path:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.buckets = buckets
+        self.recent: deque[Trace] = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        self._histograms: dict[str, list[float]] = {}  # stage -> bucket counts, then count and sum
+        self._outcomes: dict[str, int] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @contextmanager
+    def trace(self, name: str, **attributes) -> Iterator[Trace]:
+        """Make a new trace current for the enclosed block and collect it at the end."""
+        trace = Trace(name, attributes)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except BaseException:
+            trace.outcome = "error"
+            raise
+        finally:
+            _current.reset(token)
+            trace.duration = time.perf_counter() - trace._origin
+            self.collect(trace)
+
+    def collect(self, trace: Trace) -> None:
+        with self._lock:
+            self.recent.append(trace)
+            self._outcomes[trace.outcome] = self._outcomes.get(trace.outcome, 0) + 1
+            for stage, seconds in trace.durations().items():
+                histogram = self._histograms.setdefault(stage, [0.0] * (len(self.buckets) + 2))
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        histogram[i] += 1
+                histogram[-2] += 1
+                histogram[-1] += seconds
+            if self.log_path:
+                try:
+                    self._write(trace)
+                except OSError as e:
+                    logger.warning(f"Could not write trace log {self.log_path}: {e}")
+
+    def _write(self, trace: Trace) -> None:
+        """Caller holds the lock."""
+        if self.log_path.exists() and self.log_path.stat().st_size > TRACE_LOG_MAX_BYTES:
+            self.log_path.replace(self.log_path.with_name(self.log_path.name + ".1"))
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace.to_dict()) + "\n")
+
+    def percentiles(self, quantiles: tuple = (50, 95, 99)) -> dict[str, dict]:
+        """Per-stage latency percentiles in ms over the recent traces, in pipeline order."""
+        with self._lock:
+            traces = list(self.recent)
+        return summarize([trace.durations() for trace in traces], quantiles)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of answering a question.", f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items(), key=lambda item: _stage_order(item[0])):
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count:.0f}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram[-2]:.0f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram[-2]:.0f}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram[-1]:.6f}')
+            name = f"{METRIC_PREFIX}_queries_total"
+            lines += [f"# HELP {name} Questions handled, by outcome.", f"# TYPE {name} counter"]
+            lines += [f'{name}{{outcome="{outcome}"}} {count}' for outcome, count in sorted(self._outcomes.items())]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> None:
+        """Serve `render_prometheus()` at http://host:port/metrics from a background thread."""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+
+
+def _stage_order(stage: str) -> tuple:
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+def summarize(durations: list[dict[str, float]], quantiles: tuple = (50, 95, 99)) -> dict[str, dict]:
+    """Per-stage count and latency percentiles in ms, from per-trace stage durations in seconds."""
+    stages: dict[str, list[float]] = {}
+    for trace in durations:
+        for stage, seconds in trace.items():
+            stages.setdefault(stage, []).append(seconds * 1000)
+    summary = {}
+    for stage in sorted(stages, key=_stage_order):
+        values = np.asarray(stages[stage])
+        summary[stage] = {"count": len(values), **{f"p{q}": round(float(np.percentile(values, q)), 1) for q in quantiles}}
+    return summary
+
+
+def load_traces(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    import argparse
+    from pipeline import TRACE_LOG
+
+    parser = argparse.ArgumentParser(description="Summarize per-stage latencies from a trace log.")
+    parser.add_argument("log", type=Path, nargs="?", default=TRACE_LOG, help=f"Trace log to read (default: {TRACE_LOG})")
+    parser.add_argument("--since", type=float, default=0, help="Only traces started in the last N minutes")
+    args = parser.parse_args()
+
+    traces = load_traces(args.log)
+    if args.since:
+        traces = [trace for trace in traces if trace["started_at"] >= time.time() - args.since * 60]
+    durations = []
+    for trace in traces:
+        stages: dict[str, float] = {}
+        for s in trace["spans"]:
+            stages[s["name"]] = stages.get(s["name"], 0.0) + s["duration_ms"] / 1000
+        durations.append(stages)
+    print(json.dumps({"traces": len(traces), "stages": summarize(durations)}, indent=2))
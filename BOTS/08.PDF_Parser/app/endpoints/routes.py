@@ -1,18 +1,25 @@
 import os
+import json
 import logging
-from typing import Optional
-import tempfile
-import shutil
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
-from app.services.parser import parse_file as parse_file_service
+import zipfile
+from functools import partial
+from typing import BinaryIO, Iterator, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from app.services.parser import BatchDocument, iter_parse_file as iter_parse_file_service, aparse_image, write_markdown_page
+from app.services.batch import parse_batch
+from app.services.cache import get_page_cache
+from app.services.ollama_pool import ollama_clients
+from app.services.rendering import DocumentReport
+from app.services.jobs import job_manager, JobQueueFullError
+from app.services.uploads import close_upload, read_upload
+from app.services.outputs import OUTPUT_DIR, OUTPUT_PAGE_SIZE, OUTPUT_MAX_PAGE_SIZE, document_hash, get_output_store
 
 SUPPORTED_FORMATS = ['pdf', 'png', 'jpg', 'jpeg']
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "qwen3-vl:235b-instruct-cloud")
-OUTPUT_DIR = "app/outputs"
-
-if os.path.exists(OUTPUT_DIR) is False:
-    os.makedirs(OUTPUT_DIR)
+MAX_FILE_SIZE = 50 * 1024 * 1024
+MAX_ARCHIVE_SIZE = int(os.getenv("BATCH_MAX_ARCHIVE_MB", "1024")) * 1024 * 1024
 
 router = APIRouter(prefix="/api", tags=["pdf and image parser"])
 
@@ -24,14 +31,22 @@ async def root() -> dict:
 async def get_formats() -> dict:
     return {"formats": SUPPORTED_FORMATS}
 
-@router.post("/parse-file")
-async def parse_file_handler(
-    file: UploadFile = File(...),
-    model: Optional[str] = Form(DEFAULT_MODEL),
-    output_dir: str = Form(OUTPUT_DIR)
-) -> FileResponse:
+@router.get("/cache/stats")
+async def get_cache_stats() -> dict:
+    """Report page cache hit/miss counters and size."""
+    page_cache = get_page_cache()
+    if page_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **page_cache.stats()}
+
+@router.get("/ollama/stats")
+async def get_ollama_stats() -> dict:
+    """Report Ollama connection pool reuse and queue wait statistics."""
+    return ollama_clients.stats()
+
+def validate_upload(file: UploadFile) -> str:
+    """Validate upload size and format, returning the lower-cased extension."""
     # Validate file size (e.g., max 50MB)
-    MAX_FILE_SIZE = 50 * 1024 * 1024
     if file.size and file.size > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File size exceeds the maximum limit of 50MB.")
     
@@ -39,25 +54,35 @@ async def parse_file_handler(
     ext = file.filename.split('.')[-1].lower()
     if ext not in SUPPORTED_FORMATS:
         raise HTTPException(status_code=400, detail=f"Unsupported file format: {ext}. Supported formats: {SUPPORTED_FORMATS}")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as temp_file:
-        temp_file_path = temp_file.name
+    return ext
+
+
+@router.post("/parse-file")
+async def parse_file_handler(
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    output_dir: str = Form(OUTPUT_DIR)
+) -> FileResponse:
+    ext = validate_upload(file)
+    data = await read_upload(file)
+    report = DocumentReport()
 
     try:
-        with open(temp_file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-            markdown_conversion = parse_file_service(temp_file_path, model=model, original_filename=file.filename)
-
-            output_filename = os.path.splitext(file.filename)[0] + ".md"
-            output_path = os.path.join(output_dir, output_filename)
-            with open(output_path, "w", encoding="utf-8") as out_f:
-                for page_num, content in enumerate(markdown_conversion, start=1):
-                    if len(markdown_conversion) > 1:  # Multiple pages (PDF)
-                        out_f.write(f"<!-- Page {page_num} -->\n")
-                    out_f.write(content)
-                    out_f.write("\n\n")
-        return JSONResponse(content={"status": "success", "output_path": output_path, "filename": output_filename}, media_type='application/json')
+        if ext == 'pdf':
+            # Run the blocking parse off the event loop so other requests stay responsive
+            pages = iter_parse_file_service(data, model=model, original_filename=file.filename, report=report)
+            parsed_pages = await run_in_threadpool(list, pages)
+        else:
+            # Single images go straight through the pooled async client
+            parsed_pages = await aparse_image(bytes(data), model=model)
+
+        doc_hash = await run_in_threadpool(document_hash, data)
+        with get_output_store(output_dir).create(file.filename, model=model, doc_hash=doc_hash) as out_f:
+            for page in parsed_pages:
+                write_markdown_page(out_f, page)
+            out_f.page_count = len(parsed_pages)
+        output = out_f.record
+        return JSONResponse(content={"status": "success", "output_id": output.id, "output_path": output.path, "filename": output.filename, "report": report.to_dict()}, media_type='application/json')
     
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -68,36 +93,172 @@ async def parse_file_handler(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        close_upload(data)
+
+
+@router.post("/parse-file/stream")
+async def parse_file_stream_handler(
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    output_dir: str = Form(OUTPUT_DIR)
+) -> StreamingResponse:
+    """
+    Parse a file and stream each page's markdown as NDJSON as soon as it is ready.
+
+    Emits one JSON object per line: a `page` event for every converted page,
+    followed by a final `done` event with the output path, or an `error` event
+    if conversion fails midway.
+    """
+    validate_upload(file)
+    data = await read_upload(file)
+
+    output_store = get_output_store(output_dir)
+
+    def event_stream() -> Iterator[str]:
+        report = DocumentReport()
+        try:
+            with output_store.create(file.filename, model=model, doc_hash=document_hash(data)) as out_f:
+                for page in iter_parse_file_service(data, model=model, original_filename=file.filename, report=report):
+                    write_markdown_page(out_f, page)
+                    out_f.flush()
+                    out_f.page_count = page.page_count
+                    yield json.dumps({"event": "page", "page": page.page_num, "page_count": page.page_count, "route": page.route, "content": page.content}) + "\n"
+            output = out_f.record
+            yield json.dumps({"event": "done", "status": "success", "output_id": output.id, "output_path": output.path, "filename": output.filename, "report": report.to_dict()}) + "\n"
+        except Exception as e:
+            logging.error(f"Streaming parse failed for {file.filename}: {e}")
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+        finally:
+            close_upload(data)
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+def zip_documents(archive: BinaryIO, archive_name: str) -> tuple[list[BatchDocument], list[dict]]:
+    """List the supported files inside a zip archive; members are read lazily when parsed."""
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid zip archive: {archive_name}") from e
+
+    documents, skipped = [], []
+    for info in zip_file.infolist():
+        name = os.path.basename(info.filename)
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or name.startswith("."):
+            continue
+        ext = name.split('.')[-1].lower()
+        if ext not in SUPPORTED_FORMATS:
+            skipped.append({"filename": info.filename, "archive": archive_name, "reason": f"Unsupported file format: {ext}"})
+        elif info.file_size > MAX_FILE_SIZE:
+            skipped.append({"filename": info.filename, "archive": archive_name, "reason": "File size exceeds the maximum limit of 50MB."})
+        else:
+            documents.append(BatchDocument(filename=info.filename, source=partial(zip_file.read, info)))
+    return documents, skipped
+
+
+@router.post("/parse-batch")
+async def parse_batch_handler(
+    files: list[UploadFile] = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    output_dir: str = Form(OUTPUT_DIR)
+) -> dict:
+    """
+    Parse many files, or zip archives of files, in one request.
+
+    Pages from all documents share one worker pool and are interleaved
+    across documents. Returns a manifest with the output, page count and
+    status of every document, plus any archive members that were skipped.
+    """
+    documents, skipped, uploads = [], [], []
+    for file in files:
+        if file.filename.lower().endswith(".zip"):
+            if file.size and file.size > MAX_ARCHIVE_SIZE:
+                raise HTTPException(status_code=400, detail=f"Archive {file.filename} exceeds the maximum limit of {MAX_ARCHIVE_SIZE // (1024 * 1024)}MB.")
+            archive_documents, archive_skipped = zip_documents(file.file, file.filename)
+            documents.extend(archive_documents)
+            skipped.extend(archive_skipped)
+        else:
+            validate_upload(file)
+            uploads.append(await read_upload(file))
+            documents.append(BatchDocument(filename=file.filename, source=uploads[-1]))
+
+    if not documents:
+        raise HTTPException(status_code=400, detail=f"No supported files in the batch. Supported formats: {SUPPORTED_FORMATS}")
+
+    try:
+        # The upload files stay open until the response is sent, so archive members can be read lazily
+        manifest = await run_in_threadpool(parse_batch, documents, model=model, output_dir=output_dir)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        for upload in uploads:
+            close_upload(upload)
+    manifest["skipped"] = skipped
+    return manifest
+
+
+@router.post("/jobs", status_code=202)
+async def create_job_handler(
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    output_dir: str = Form(OUTPUT_DIR)
+) -> dict:
+    """Queue a file for background parsing and return its job id."""
+    validate_upload(file)
+    data = await read_upload(file)
+
+    try:
+        job = job_manager.submit(data, filename=file.filename, model=model, output_dir=output_dir)
+    except JobQueueFullError as e:
+        close_upload(data)
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job_manager.snapshot(job)["status"]}
+
+
+@router.get("/jobs")
+async def list_jobs() -> dict:
+    """List known parse jobs, newest first."""
+    jobs = [job_manager.snapshot(job) for job in job_manager.list()]
+    return {"jobs": jobs, "count": len(jobs)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> dict:
+    """Report the status and per-page progress of a parse job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_manager.snapshot(job)
     
     
 @router.get("/output")
-async def list_output_files() -> dict:
-    """List all generated markdown files."""
-    if not os.path.exists(OUTPUT_DIR):
-        return {"files": []}
-    
-    files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith(".md")]
-    return {"files": files, "count": len(files)}
+async def list_output_files(
+    limit: int = Query(OUTPUT_PAGE_SIZE, ge=1, le=OUTPUT_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+) -> dict:
+    """List generated markdown files, newest first. Pass `next_cursor` back as `cursor` for the next page."""
+    try:
+        records, next_cursor = get_output_store().list(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    files = [record.to_dict() for record in records]
+    return {"files": files, "count": len(files), "next_cursor": next_cursor}
 
 
-@router.get("/output/{filename}")
-async def get_output_file(filename: str) -> FileResponse:
-    """Get the generated markdown file."""
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path):
+@router.get("/output/{output_id}")
+async def get_output_file(output_id: str) -> FileResponse:
+    """Get a generated markdown file by id (or by filename, for the newest match)."""
+    record = get_output_store().get(output_id)
+    if record is None or not os.path.exists(record.path):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path=file_path, filename=filename)
+    return FileResponse(path=record.path, filename=record.filename)
 
 
-@router.delete("/output/{filename}")
-async def delete_output_file(filename: str) -> dict:
-    """Delete a generated markdown file."""
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path):
+@router.delete("/output/{output_id}")
+async def delete_output_file(output_id: str) -> dict:
+    """Delete a generated markdown file by id (or by filename, for the newest match)."""
+    if not get_output_store().delete(output_id):
         raise HTTPException(status_code=404, detail="File not found")
-    os.remove(file_path)
-    return {"success": True, "message": f"Deleted {filename}"}
-    
+    return {"success": True, "message": f"Deleted {output_id}"}
@@ -1,15 +1,20 @@
 import os
 import logging
 import asyncio
-import time
 from pathlib import Path
 from fastapi import FastAPI, File, UploadFile
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.endpoints.routes import router as document_parser_router
+from app.services.jobs import job_manager
+from app.services.ollama_pool import ollama_clients
+from app.services.outputs import expire_outputs, get_output_store
 
 logger = logging.getLogger(__name__)
 
+# Expiry only reads expired rows from the output index, so it can run often
+OUTPUT_EXPIRE_INTERVAL_SECONDS = int(os.getenv("OUTPUT_EXPIRE_INTERVAL_SECONDS", "60"))
+
 app = FastAPI(
     title="VLM File Processor API",
     description="API to process PDF and image files.",
@@ -33,10 +38,15 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event() -> None:
     global cleanup_old_files
+    # Open the default store up front so it is expired even before the first upload
+    get_output_store()
     cleanup_old_files = asyncio.create_task(cleanup_files())
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    job_manager.shutdown()
+    ollama_clients.close()
+    await ollama_clients.aclose()
     if cleanup_old_files:
         cleanup_old_files.cancel()
         try:
@@ -45,28 +55,12 @@ async def shutdown_event() -> None:
             pass
 
 async def cleanup_files() -> None:
-    """Delete files older than 1 hour in the output directory."""
-    OUTPUT_DIR = "app/outputs"
-    TEN_MINUTES = 0.1 * 60 * 60  # seconds
-    
+    """Delete expired outputs, as recorded in the output index."""
     while True:
         try:
-            if os.path.exists(OUTPUT_DIR):
-                current_time = time.time()
-                for filename in os.listdir(OUTPUT_DIR):
-                    try:
-                        file_path = os.path.join(OUTPUT_DIR, filename)
-                        if os.path.isfile(file_path):
-                            file_age = current_time - os.path.getmtime(file_path)
-                            if file_age > TEN_MINUTES:
-                                os.remove(file_path)
-                                logger.info(f"Deleted old file: {filename}")
-                    except (OSError, PermissionError) as e:
-                        logger.warning(f"Could not process file {filename}: {e}")
-                        continue
-            
-            # Wait for 1 hour before next cleanup
-            await asyncio.sleep(3600)
+            removed = await asyncio.to_thread(expire_outputs)
+            if removed:
+                logger.info(f"Deleted {removed} expired output files")
         except Exception as e:
             logger.error(f"Error in cleanup task: {e}")
-            await asyncio.sleep(3600)  # Wait 1 hour before retrying
+        await asyncio.sleep(OUTPUT_EXPIRE_INTERVAL_SECONDS)
@@ -0,0 +1,95 @@
+import os
+import time
+import logging
+from typing import Optional
+from app.services.outputs import OUTPUT_DIR, OutputWriter, get_output_store
+from app.services.parser import BatchDocument, iter_parse_batch, write_markdown_page
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+
+
+def parse_batch(
+    documents: list[BatchDocument],
+    model: str = None,
+    output_dir: str = OUTPUT_DIR,
+    max_concurrency: Optional[int] = None,
+    render_mode: Optional[str] = None,
+    parse_mode: Optional[str] = None
+) -> dict:
+    """
+    Parse a batch of documents on a shared worker pool and return a manifest.
+
+    Each document is written to its own output as its pages arrive. A failed
+    document is recorded in the manifest with its error and any partial
+    output is discarded; it does not stop the rest of the batch.
+    """
+    if len(documents) > BATCH_MAX_FILES:
+        raise ValueError(f"Batch has {len(documents)} files, the maximum is {BATCH_MAX_FILES}.")
+
+    start = time.perf_counter()
+    output_store = get_output_store(output_dir)
+    completed: dict[int, int] = {id(doc): 0 for doc in documents}
+    writers: dict[int, OutputWriter] = {}
+    records = {}
+
+    try:
+        pages = iter_parse_batch(
+            documents,
+            model=model,
+            max_concurrency=max_concurrency,
+            render_mode=render_mode,
+            parse_mode=parse_mode
+        )
+        for doc, page in pages:
+            key = id(doc)
+            if page is None:
+                if key in writers:
+                    writers.pop(key).discard()
+                continue
+
+            if key not in writers:
+                writers[key] = output_store.create(doc.filename, model=model, doc_hash=doc.doc_hash)
+            write_markdown_page(writers[key], page)
+            completed[key] += 1
+            if page.page_num == page.page_count:
+                writer = writers.pop(key)
+                writer.page_count = page.page_count
+                records[key] = writer.commit()
+    finally:
+        for writer in writers.values():
+            writer.discard()
+
+    entries = []
+    for doc in documents:
+        key = id(doc)
+        record = records.get(key)
+        summary = doc.report.to_dict()
+        summary.pop("pages")
+        entries.append({
+            "filename": doc.filename,
+            "status": "completed" if record else "failed",
+            "output_id": record.id if record else None,
+            "output_path": record.path if record else None,
+            "output_filename": record.filename if record else None,
+            "page_count": doc.page_count,
+            "pages_completed": completed[key],
+            "error": doc.error,
+            "report": summary,
+        })
+
+    elapsed = time.perf_counter() - start
+    page_total = sum(entry["pages_completed"] for entry in entries)
+    failed = sum(1 for entry in entries if entry["status"] == "failed")
+    logger.info(f"Batch of {len(entries)} documents finished in {elapsed:.1f}s: {page_total} pages, {failed} failed")
+    return {
+        "status": "success" if not failed else ("failed" if failed == len(entries) else "partial"),
+        "document_count": len(entries),
+        "completed": len(entries) - failed,
+        "failed": failed,
+        "page_count": page_total,
+        "elapsed_seconds": round(elapsed, 2),
+        "pages_per_second": round(page_total / elapsed, 2) if elapsed else 0.0,
+        "documents": entries,
+    }
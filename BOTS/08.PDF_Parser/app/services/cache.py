@@ -0,0 +1,126 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "app/cache/pages.sqlite3")
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "512"))
+
+
+def page_cache_key(img_data: bytes, model: str, prompt_version: str) -> str:
+    """Build a content-addressed cache key for a rendered page."""
+    digest = hashlib.sha256()
+    digest.update(img_data)
+    digest.update(b"\0")
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt_version.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PageCache:
+    """
+    Persistent SQLite cache of VLM markdown keyed by page content.
+
+    Entries are evicted least-recently-used first once the total size of the
+    stored markdown exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: str = PAGE_CACHE_PATH, max_bytes: int = int(PAGE_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_page_cache_last_access ON page_cache (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM page_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM page_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE page_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        size = len(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM page_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_cache (key, content, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until the cache fits in `max_bytes`."""
+        while self._total_bytes > self.max_bytes:
+            row = self._conn.execute("SELECT key, size FROM page_cache ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM page_cache WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM page_cache")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM page_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+@lru_cache(maxsize=None)
+def get_page_cache() -> Optional[PageCache]:
+    """Return the process-wide page cache, or None when caching is disabled."""
+    if PAGE_CACHE_MAX_MB <= 0:
+        return None
+    try:
+        return PageCache()
+    except sqlite3.Error as e:
+        logger.warning(f"Page cache unavailable, continuing without it: {e}")
+        return None
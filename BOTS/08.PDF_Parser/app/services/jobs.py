@@ -0,0 +1,138 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.services.parser import iter_parse_file, write_markdown_page
+from app.services.rendering import DocumentReport
+from app.services.uploads import UploadBuffer, close_upload
+from app.services.outputs import document_hash, get_output_store
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    model: str
+    status: str = "queued"  # queued | running | completed | failed
+    page_count: Optional[int] = None
+    pages_completed: int = 0
+    output_id: Optional[str] = None
+    output_path: Optional[str] = None
+    output_filename: Optional[str] = None
+    error: Optional[str] = None
+    report: Optional[dict] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["progress"] = round(self.pages_completed / self.page_count, 4) if self.page_count else 0.0
+        return data
+
+
+class JobManager:
+    """
+    Runs parse jobs on a bounded worker pool, off the API event loop.
+
+    Each job writes its markdown output page by page and records progress so
+    clients can poll it. Workers update jobs under the manager's lock and
+    `snapshot` reads them under it, so a poller never sees a half-updated
+    job. Calls to the Ollama host are additionally capped process-wide by
+    the parser service.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.queue_limit = queue_limit
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="parse-job")
+
+    def submit(self, data: UploadBuffer, filename: str, model: str, output_dir: str) -> Job:
+        """Queue a parse job for an uploaded file held in memory or memory-mapped."""
+        with self._lock:
+            self._prune()
+            queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+            if queued >= self.queue_limit:
+                raise JobQueueFullError(f"Job queue is full ({queued} jobs waiting). Try again later.")
+            job = Job(id=uuid.uuid4().hex, filename=filename, model=model)
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, data, output_dir)
+        logger.info(f"Queued job {job.id} for {filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def snapshot(self, job: Job) -> dict:
+        """Return a consistent copy of a job's fields for reporting."""
+        with self._lock:
+            return job.to_dict()
+
+    def _update(self, job: Job, **fields) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job, data: UploadBuffer, output_dir: str) -> None:
+        self._update(job, status="running", started_at=time.time())
+        report = DocumentReport()
+
+        try:
+            with get_output_store(output_dir).create(job.filename, model=job.model, doc_hash=document_hash(data)) as out_f:
+                for page in iter_parse_file(data, model=job.model, original_filename=job.filename, report=report):
+                    write_markdown_page(out_f, page)
+                    out_f.page_count = page.page_count
+                    self._update(job, page_count=page.page_count, pages_completed=page.page_num)
+            record = out_f.record
+            self._update(
+                job,
+                output_id=record.id,
+                output_path=record.path,
+                output_filename=record.filename,
+                report=report.to_dict(),
+                status="completed",
+                finished_at=time.time()
+            )
+            logger.info(f"Job {job.id} completed: {record.path}")
+        except Exception as e:
+            self._update(job, error=str(e), status="failed", finished_at=time.time())
+            logger.error(f"Job {job.id} failed: {e}")
+        finally:
+            close_upload(data)
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention window."""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_manager = JobManager()
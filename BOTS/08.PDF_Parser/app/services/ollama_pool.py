@@ -0,0 +1,196 @@
+import os
+import time
+import asyncio
+import logging
+import weakref
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Iterator, Optional
+import httpx
+from ollama import Client, AsyncClient
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of concurrent chat calls sent to the Ollama host across all documents
+GLOBAL_CONCURRENCY = int(os.getenv("OLLAMA_GLOBAL_CONCURRENCY", "8"))
+POOL_MAX_CONNECTIONS = int(os.getenv("OLLAMA_POOL_MAX_CONNECTIONS", "32"))
+POOL_KEEPALIVE_SECONDS = float(os.getenv("OLLAMA_POOL_KEEPALIVE_SECONDS", "120"))
+
+
+class PoolStats:
+    """
+    Request and connection counters for one keep-alive pool.
+
+    Fed by an httpx response hook: every response carries its connection's
+    network stream (the documented `network_stream` extension), and a stream
+    not seen before means the request had to open a new connection.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self._seen = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def record(self, response: httpx.Response) -> None:
+        """Count a finished request and the connection it used, if that is new."""
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if stream is not None and stream not in self._seen:
+                self._seen.add(stream)
+                self.new_connections += 1
+
+    async def arecord(self, response: httpx.Response) -> None:
+        self.record(response)
+
+    def open_connections(self) -> int:
+        """Connections seen so far whose socket is still open."""
+        with self._lock:
+            streams = list(self._seen)
+        sockets = [stream.get_extra_info("socket") for stream in streams]
+        return sum(1 for sock in sockets if sock is not None and sock.fileno() != -1)
+
+    def to_dict(self) -> dict:
+        open_connections = self.open_connections()
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "open_connections": open_connections,
+                "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+class OllamaClientManager:
+    """
+    Process-wide registry of Ollama clients with keep-alive connection pools.
+
+    One sync and one async client are kept per `(base_url, api_key)` so that
+    every page call reuses warm connections instead of paying a fresh TCP/TLS
+    handshake. The manager also owns the global in-flight cap on chat calls
+    and tracks how long callers queue for a slot.
+    """
+
+    def __init__(self, max_connections: int = POOL_MAX_CONNECTIONS, keepalive_expiry: float = POOL_KEEPALIVE_SECONDS, max_inflight: int = GLOBAL_CONCURRENCY):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_inflight = max(1, max_inflight)
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._clients: dict[tuple, Client] = {}
+        self._async_clients: dict[tuple, AsyncClient] = {}
+        self._stats: dict[tuple, PoolStats] = {}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @staticmethod
+    def _headers(api_key: Optional[str]) -> dict:
+        return {'Authorization': f'Bearer {api_key}'} if api_key else {}
+
+    def _pool_stats(self, key: tuple) -> PoolStats:
+        if key not in self._stats:
+            self._stats[key] = PoolStats()
+        return self._stats[key]
+
+    def get_client(self, base_url: Optional[str] = None, api_key: Optional[str] = None) -> Client:
+        """Return the shared sync client for a host, creating its pool on first use."""
+        key = (base_url, api_key)
+        with self._lock:
+            if key not in self._clients:
+                stats = self._pool_stats(key)
+                self._clients[key] = Client(host=base_url, headers=self._headers(api_key), limits=self.limits, event_hooks={"response": [stats.record]})
+                logger.info(f"Created pooled Ollama client for {base_url or 'default host'}")
+            return self._clients[key]
+
+    def get_async_client(self, base_url: Optional[str] = None, api_key: Optional[str] = None) -> AsyncClient:
+        """Return the shared async client for a host, creating its pool on first use."""
+        key = (base_url, api_key)
+        with self._lock:
+            if key not in self._async_clients:
+                stats = self._pool_stats(key)
+                self._async_clients[key] = AsyncClient(host=base_url, headers=self._headers(api_key), limits=self.limits, event_hooks={"response": [stats.arecord]})
+                logger.info(f"Created pooled async Ollama client for {base_url or 'default host'}")
+            return self._async_clients[key]
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self._inflight += 1
+            self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def _release_abandoned(self, acquire: asyncio.Future) -> None:
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._slots.release()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the global in-flight chat slots."""
+        start = time.perf_counter()
+        self._slots.acquire()
+        self._record_wait(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[None]:
+        """Async variant of `slot` sharing the same global cap, without blocking the event loop."""
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            # Wait on a worker thread; if the caller is cancelled, the slot is handed back once that wait ends
+            acquire = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire))
+            try:
+                await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                acquire.add_done_callback(self._release_abandoned)
+                raise
+        self._record_wait(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = []
+            for key, stats in self._stats.items():
+                pools.append({"base_url": key[0], **stats.to_dict()})
+            return {
+                "pools": pools,
+                "inflight": self._inflight,
+                "max_inflight": self.max_inflight,
+                "queue_waits": self._waits,
+                "queue_wait_avg_ms": round(self._wait_total / self._waits * 1000, 2) if self._waits else 0.0,
+                "queue_wait_max_ms": round(self._wait_max * 1000, 2),
+            }
+
+    def close(self) -> None:
+        """Close all pooled sync clients. Async clients are closed by `aclose`."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            clients = list(self._async_clients.values())
+            self._async_clients.clear()
+        for client in clients:
+            await client.close()
+
+
+ollama_clients = OllamaClientManager()
@@ -0,0 +1,327 @@
+import os
+import time
+import uuid
+import hashlib
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = "app/outputs"
+OUTPUT_INDEX_NAME = "index.sqlite3"
+# Outputs are deleted this long after they were last written (0 keeps them forever)
+OUTPUT_TTL_SECONDS = int(os.getenv("OUTPUT_TTL_SECONDS", "600"))
+# Partial outputs untouched this long were left by a process that died while writing them
+OUTPUT_PART_MAX_AGE_SECONDS = 3600
+OUTPUT_PAGE_SIZE = 50
+OUTPUT_MAX_PAGE_SIZE = 500
+
+COLUMNS = "id, filename, source_filename, doc_hash, content_hash, blob, model, page_count, size, created_at, expires_at"
+
+
+def document_hash(data: Union[bytes, memoryview]) -> str:
+    """Content hash of an input document."""
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class OutputRecord:
+    id: str
+    filename: str
+    source_filename: str
+    doc_hash: Optional[str]
+    content_hash: str
+    blob: str
+    model: Optional[str]
+    page_count: int
+    size: int
+    created_at: float
+    expires_at: Optional[float]
+    path: str = ""
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("blob")
+        return data
+
+
+class OutputWriter:
+    """
+    A markdown output being written.
+
+    Text is hashed as it is written, so the finished file can be stored
+    under its content hash without reading it back. As a context manager
+    the output is committed on a clean exit and discarded if the block
+    raises.
+    """
+
+    def __init__(self, store: "OutputStore", source_filename: str, model: Optional[str], doc_hash: Optional[str]):
+        self.store = store
+        self.source_filename = source_filename
+        self.model = model
+        self.doc_hash = doc_hash
+        self.page_count = 0
+        self.size = 0
+        self.record: Optional[OutputRecord] = None
+        self.path = os.path.join(store.directory, f".{uuid.uuid4().hex}.md.part")
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, "w", encoding="utf-8", newline="")
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8")
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(text)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def commit(self) -> OutputRecord:
+        """Finish the file and add it to the index."""
+        self._file.close()
+        self.record = self.store._commit(self, self._digest.hexdigest())
+        return self.record
+
+    def discard(self) -> None:
+        """Drop a partially written output."""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+class OutputStore:
+    """
+    Markdown outputs with a SQLite metadata index.
+
+    Each output gets its own id, so documents with the same name no longer
+    overwrite each other. Files are stored once per content hash: outputs
+    with identical markdown share one file, and re-parsing a document under
+    the same name refreshes its existing entry. Listing is keyset-paginated
+    and expiry reads only the expired rows, so neither scans the directory.
+    """
+
+    def __init__(self, directory: str = OUTPUT_DIR, ttl_seconds: int = OUTPUT_TTL_SECONDS):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, OUTPUT_INDEX_NAME)
+        created = not os.path.exists(index_path)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outputs (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                source_filename TEXT NOT NULL,
+                doc_hash TEXT,
+                content_hash TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                model TEXT,
+                page_count INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_created ON outputs (created_at, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_expires ON outputs (expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_content ON outputs (content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_blob ON outputs (blob)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_filename ON outputs (filename, created_at)")
+        self._conn.commit()
+        if created:
+            self._import_existing()
+        self._remove_stale_parts()
+
+    def _record(self, row: tuple) -> OutputRecord:
+        record = OutputRecord(*row)
+        record.path = os.path.join(self.directory, record.blob)
+        return record
+
+    def _expires_at(self, now: float) -> Optional[float]:
+        return now + self.ttl_seconds if self.ttl_seconds > 0 else None
+
+    def _import_existing(self) -> None:
+        """Index markdown files written before the index existed."""
+        imported = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith(".md"):
+                continue
+            digest = hashlib.sha256()
+            with open(entry.path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            content_hash = digest.hexdigest()
+            stat = entry.stat()
+            self._conn.execute(
+                f"INSERT INTO outputs ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, entry.name, entry.name, None, content_hash, entry.name, None, 0, stat.st_size, stat.st_mtime, self._expires_at(stat.st_mtime))
+            )
+            imported += 1
+        self._conn.commit()
+        if imported:
+            logger.info(f"Indexed {imported} existing output files in {self.directory}")
+
+    def _remove_stale_parts(self) -> int:
+        """
+        Delete `.part` files of writers that never finished. Only files not
+        written to for `OUTPUT_PART_MAX_AGE_SECONDS` are removed, since other
+        processes may be writing into the same directory.
+        """
+        cutoff = time.time() - OUTPUT_PART_MAX_AGE_SECONDS
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".md.part") or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # committed or discarded meanwhile
+            except OSError as e:
+                logger.warning(f"Could not delete partial output {entry.name}: {e}")
+        if removed:
+            logger.info(f"Deleted {removed} partial outputs in {self.directory}")
+        return removed
+
+    def create(self, source_filename: str, model: Optional[str] = None, doc_hash: Optional[str] = None) -> OutputWriter:
+        """Start writing the markdown output for a parsed document."""
+        return OutputWriter(self, source_filename, model, doc_hash)
+
+    def _commit(self, writer: OutputWriter, content_hash: str) -> OutputRecord:
+        filename = os.path.splitext(os.path.basename(writer.source_filename))[0] + ".md"
+        now = time.time()
+        with self._lock:
+            existing = self._conn.execute("SELECT blob FROM outputs WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+            deduplicated = bool(existing) and os.path.exists(os.path.join(self.directory, existing[0]))
+            if deduplicated:
+                # Identical markdown is already stored
+                blob = existing[0]
+                os.remove(writer.path)
+            else:
+                blob = f"{content_hash}.md"
+                os.replace(writer.path, os.path.join(self.directory, blob))
+
+            same = self._conn.execute(
+                "SELECT id FROM outputs WHERE filename = ? AND content_hash = ? LIMIT 1", (filename, content_hash)
+            ).fetchone()
+            output_id = same[0] if same else uuid.uuid4().hex
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO outputs ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (output_id, filename, writer.source_filename, writer.doc_hash, content_hash, blob, writer.model, writer.page_count, writer.size, now, self._expires_at(now))
+            )
+            self._conn.commit()
+            row = self._conn.execute(f"SELECT {COLUMNS} FROM outputs WHERE id = ?", (output_id,)).fetchone()
+        logger.info(f"Stored output {output_id} ({filename}, {writer.size} bytes{', deduplicated' if deduplicated else ''})")
+        return self._record(row)
+
+    def get(self, key: str) -> Optional[OutputRecord]:
+        """Look up a live output by id, or the newest one with the given filename."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {COLUMNS} FROM outputs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+            ).fetchone()
+            if row is None:
+                row = self._conn.execute(
+                    f"SELECT {COLUMNS} FROM outputs WHERE filename = ? AND (expires_at IS NULL OR expires_at > ?) "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (key, now)
+                ).fetchone()
+        return self._record(row) if row else None
+
+    def list(self, limit: int = OUTPUT_PAGE_SIZE, cursor: Optional[str] = None) -> tuple[list[OutputRecord], Optional[str]]:
+        """
+        Return one page of live outputs, newest first, and the cursor for the next page.
+
+        The cursor is the `created_at:id` of the last record returned.
+        """
+        limit = max(1, min(limit, OUTPUT_MAX_PAGE_SIZE))
+        query = f"SELECT {COLUMNS} FROM outputs WHERE (expires_at IS NULL OR expires_at > ?)"
+        params: list = [time.time()]
+        if cursor:
+            try:
+                created_at, output_id = cursor.split(":", 1)
+                params.extend([float(created_at), output_id])
+            except ValueError as e:
+                raise ValueError(f"Invalid cursor: {cursor}") from e
+            query += " AND (created_at, id) < (?, ?)"
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        records = [self._record(row) for row in rows]
+        next_cursor = f"{records[-1].created_at!r}:{records[-1].id}" if len(records) == limit else None
+        return records, next_cursor
+
+    def _delete(self, record: OutputRecord) -> None:
+        """Remove an index entry, and its file once no other entry shares it. Caller holds the lock."""
+        self._conn.execute("DELETE FROM outputs WHERE id = ?", (record.id,))
+        shared = self._conn.execute("SELECT 1 FROM outputs WHERE blob = ? LIMIT 1", (record.blob,)).fetchone()
+        if not shared and os.path.exists(record.path):
+            os.remove(record.path)
+
+    def delete(self, key: str) -> bool:
+        record = self.get(key)
+        if record is None:
+            return False
+        with self._lock:
+            self._delete(record)
+            self._conn.commit()
+        return True
+
+    def expire(self, batch_size: int = 1000) -> int:
+        """Delete outputs past their expiry time and return how many were removed."""
+        removed = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {COLUMNS} FROM outputs WHERE expires_at <= ? ORDER BY expires_at LIMIT ?", (time.time(), batch_size)
+                ).fetchall()
+                for row in rows:
+                    try:
+                        self._delete(self._record(row))
+                    except OSError as e:
+                        logger.warning(f"Could not delete output {row[0]}: {e}")
+                self._conn.commit()
+            removed += len(rows)
+            if len(rows) < batch_size:
+                return removed
+
+
+_stores: dict[str, OutputStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_output_store(directory: str = OUTPUT_DIR) -> OutputStore:
+    """Return the process-wide output store for a directory."""
+    key = os.path.abspath(directory)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = OutputStore(directory)
+        return _stores[key]
+
+
+def expire_outputs() -> int:
+    """Expire outputs in every output directory in use."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    return sum(store.expire() for store in stores)
@@ -1,10 +1,18 @@
 import os
 import io
 import fitz
+import hashlib
 import logging
-from ollama import Client
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterator, Optional, TextIO, Union
+from ollama import Client, AsyncClient
 from dotenv import load_dotenv
 from PIL import Image
+from app.services.cache import PageCache, get_page_cache, page_cache_key
+from app.services.ollama_pool import ollama_clients
+from app.services.rendering import RENDER_MODE, RENDER_MODES, ROUTE_VLM, DocumentReport, RenderedPage, render_page
 
 load_dotenv()
 
@@ -12,6 +20,14 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 SUPPORTED_FORMATS = ['pdf', 'png', 'jpg', 'jpeg']
+# Maximum number of concurrent chat calls sent to the Ollama host per document
+MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+# Chat workers shared by all documents of a batch, and how many documents are open at once
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+BATCH_MAX_ACTIVE_DOCUMENTS = int(os.getenv("BATCH_MAX_ACTIVE_DOCUMENTS", "16"))
+# "vlm" sends every page to the model, "hybrid" converts born-digital text pages locally
+PARSE_MODE = os.getenv("PARSE_MODE", "vlm")
+PARSE_MODES = ("vlm", "hybrid")
 
 SYSTEM_PROMPT = """You are an expert document parser specializing in converting PDF pages to clean, semantic markdown.
 
@@ -75,112 +91,449 @@ Return raw markdown with no wrapper, no code blocks, no explanations.
 Start immediately with the page content.
 """.strip()
 
-def init_ollama():
+PAGE_PROMPT = (
+    "Convert this page to Markdown.\n\n"
+    "IMPORTANT: Look carefully for any **graphs, charts, or diagrams**.\n"
+    "If found, you MUST provide a detailed 'Visual Description' block explaining the data/structure.\n"
+    "Do not ignore the visual elements."
+)
+
+IMAGE_PROMPT = (
+    "Convert this image to Markdown.\n\n"
+    "IMPORTANT: Look carefully for any **graphs, charts, or diagrams**.\n"
+    "If found, you MUST provide a detailed 'Visual Description' block explaining the data/structure.\n"
+    "Do not ignore the visual elements."
+)
+
+
+def prompt_version(prompt: str) -> str:
+    """Fingerprint the system and user prompts so that prompt edits invalidate cached pages."""
+    return hashlib.sha256(f"{SYSTEM_PROMPT}\0{prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def init_ollama() -> Client:
+    """Return the shared, connection-pooled Ollama client for the configured host."""
     base_url = os.getenv("OLLAMA_BASE_URL")
     api_key = os.getenv("OLLAMA_API_KEY")
     try:
-        ollama_client = Client(
-            host=base_url,
-            headers={'Authorization': f'Bearer {api_key}'} if api_key else {}
-        )
-        logging.info("Ollama client initialized successfully.")
-        return ollama_client
+        return ollama_clients.get_client(base_url, api_key)
     except Exception as e:
         logging.error(f"Failed to initialize Ollama client: {e}")
         raise
 
-def parse_file(file_path: str, model: str = None, original_filename: str = "") -> list[str]:
+
+def init_async_ollama() -> AsyncClient:
+    """Return the shared async Ollama client for the configured host."""
+    base_url = os.getenv("OLLAMA_BASE_URL")
+    api_key = os.getenv("OLLAMA_API_KEY")
+    try:
+        return ollama_clients.get_async_client(base_url, api_key)
+    except Exception as e:
+        logging.error(f"Failed to initialize async Ollama client: {e}")
+        raise
+
+
+def _chat_messages(img_data: bytes, prompt: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": prompt,
+            "images": [img_data],
+        },
+    ]
+
+
+def image_to_markdown(ollama_client: Client, model: str, img_data: bytes, prompt: str) -> str:
+    """Send a single image to the VLM and return the generated markdown."""
+    with ollama_clients.slot():
+        response = ollama_client.chat(model=model, messages=_chat_messages(img_data, prompt))
+    return response["message"]["content"]
+
+
+async def aimage_to_markdown(ollama_client: AsyncClient, model: str, img_data: bytes, prompt: str) -> str:
+    """Async variant of `image_to_markdown` for use directly on the event loop."""
+    async with ollama_clients.async_slot():
+        response = await ollama_client.chat(model=model, messages=_chat_messages(img_data, prompt))
+    return response["message"]["content"]
+
+
+def cached_image_to_markdown(ollama_client: Client, model: str, img_data: bytes, prompt: str, page_cache: Optional[PageCache] = None) -> str:
+    """Convert an image to markdown, serving it from the page cache when the same content was seen before."""
+    if page_cache is None:
+        return image_to_markdown(ollama_client, model, img_data, prompt)
+
+    key = page_cache_key(img_data, model, prompt_version(prompt))
+    content = page_cache.get(key)
+    if content is None:
+        content = image_to_markdown(ollama_client, model, img_data, prompt)
+        page_cache.put(key, content)
+    return content
+
+
+@dataclass
+class ParsedPage:
+    page_num: int
+    page_count: int
+    content: str
+    route: str = ROUTE_VLM
+
+
+async def aparse_image(img_data: bytes, model: str = None) -> list[ParsedPage]:
+    """Convert a single image upload to markdown using the pooled async client."""
+    if model is None:
+        model = os.getenv("DEFAULT_MODEL", "qwen3-vl:235b-instruct-cloud")
+    page_cache = get_page_cache()
+
+    key = page_cache_key(img_data, model, prompt_version(IMAGE_PROMPT))
+    content = page_cache.get(key) if page_cache else None
+    if content is None:
+        try:
+            content = await aimage_to_markdown(init_async_ollama(), model, img_data, IMAGE_PROMPT)
+        except Exception as e:
+            logger.error(f"Error processing image: {e}")
+            raise ValueError(f"Failed to process image: {str(e)}") from e
+        if page_cache:
+            page_cache.put(key, content)
+    return [ParsedPage(page_num=1, page_count=1, content=content)]
+
+
+def _convert_page(rendered: Future, page_num: int, page_count: int, ollama_client: Client, model: str, page_cache: Optional[PageCache], report: Optional[DocumentReport]) -> ParsedPage:
+    """Wait for a prepared page and convert it to markdown, locally or through the VLM."""
+    try:
+        page: RenderedPage = rendered.result()
+        if page.markdown is not None:
+            logger.info(f"Converted page {page_num + 1}/{page_count} from its text layer")
+            content = page.markdown
+        else:
+            logger.info(f"Processing page {page_num + 1}/{page_count} at {page.zoom}x ({len(page.img_data)} bytes)")
+            content = cached_image_to_markdown(ollama_client, model, page.img_data, PAGE_PROMPT, page_cache)
+        if report is not None:
+            report.add_page(page)
+        logger.info(f"Completed page {page_num + 1}")
+        return ParsedPage(page_num=page_num + 1, page_count=page_count, content=content, route=page.route)
+    except Exception as e:
+        logger.error(f"Error processing page {page_num + 1}: {e}")
+        raise ValueError(f"Failed to process page {page_num + 1}: {str(e)}") from e
+
+
+def iter_pdf_pages(
+    pdf_doc: fitz.Document,
+    ollama_client: Client,
+    model: str,
+    max_concurrency: int = MAX_CONCURRENCY,
+    page_cache: Optional[PageCache] = None,
+    render_mode: str = RENDER_MODE,
+    report: Optional[DocumentReport] = None,
+    parse_mode: str = PARSE_MODE
+) -> Iterator[ParsedPage]:
+    """
+    Convert the pages of an open PDF and yield them in page order.
+
+    Pages are rasterized on a render worker and converted on a pool of
+    `max_concurrency` chat workers, so at most `max_concurrency` requests are
+    in flight against the Ollama host. Rendering runs at most two windows
+    ahead of the pages already yielded to bound memory on large documents.
+    Pages found in `page_cache` skip the VLM call entirely. In "adaptive"
+    `render_mode`, text-only pages are rasterized at a lower zoom, and in
+    "hybrid" `parse_mode` they are converted from the text layer instead.
+    """
+    max_concurrency = max(1, max_concurrency)
+    page_count = pdf_doc.page_count
+    window = max_concurrency * 2
+    text_layer = parse_mode == "hybrid"
+
+    # MuPDF documents are not thread-safe, so a single worker owns rendering
+    render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+    chat_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="vlm-chat")
+    pending: deque[Future] = deque()
+    next_page = 0
+
+    try:
+        while next_page < page_count or pending:
+            while next_page < page_count and len(pending) < window:
+                rendered = render_pool.submit(render_page, pdf_doc, next_page, render_mode, text_layer)
+                pending.append(chat_pool.submit(_convert_page, rendered, next_page, page_count, ollama_client, model, page_cache, report))
+                next_page += 1
+            yield pending.popleft().result()
+    finally:
+        chat_pool.shutdown(wait=True, cancel_futures=True)
+        render_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _validate_modes(render_mode: str, parse_mode: str) -> None:
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unsupported render mode: {render_mode}. Supported modes: {list(RENDER_MODES)}")
+    if parse_mode not in PARSE_MODES:
+        raise ValueError(f"Unsupported parse mode: {parse_mode}. Supported modes: {list(PARSE_MODES)}")
+
+
+def iter_parse_file(
+    source: Union[str, bytes, memoryview],
+    model: str = None,
+    original_filename: str = "",
+    max_concurrency: Optional[int] = None,
+    render_mode: Optional[str] = None,
+    report: Optional[DocumentReport] = None,
+    parse_mode: Optional[str] = None
+) -> Iterator[ParsedPage]:
+    """
+    Parse a PDF or image file and yield its pages as `ParsedPage` objects.
+
+    `source` is either a path on disk or the file contents as a bytes-like
+    buffer (e.g. an upload held in memory or memory-mapped), in which case
+    the format is taken from `original_filename`.
+
+    Pages are yielded in order as soon as each one (and every page before it)
+    has been converted, so callers can stream results to clients. If a
+    `report` is given, it is filled with per-page rendering and routing
+    statistics.
+    """
     if model is None:
         model = os.getenv("DEFAULT_MODEL", "qwen3-vl:235b-instruct-cloud")
+    if max_concurrency is None:
+        max_concurrency = MAX_CONCURRENCY
+    if render_mode is None:
+        render_mode = RENDER_MODE
+    if parse_mode is None:
+        parse_mode = PARSE_MODE
+    _validate_modes(render_mode, parse_mode)
+    if report is not None:
+        report.render_mode = render_mode
+        report.parse_mode = parse_mode
     ollama_client = init_ollama()
+    page_cache = get_page_cache()
 
-    _, ext = os.path.splitext(file_path)
+    from_path = isinstance(source, str)
+    name = source if from_path else original_filename
+    _, ext = os.path.splitext(name)
     ext = ext.lower()[1:]  # Remove the dot and convert to lower case
 
     if ext == 'pdf':
         # Handle PDF files
         try:
-            pdf_doc = fitz.open(file_path)
+            pdf_doc = fitz.open(source) if from_path else fitz.open(stream=source, filetype="pdf")
         except Exception as e:
-            logger.error(f"Failed to open PDF file: {file_path} - {e}")
-            raise ValueError(f"Cannot open PDF file: {file_path}") from e
-        
-        markdown_pages = []
-        
-        try:
-            for page_num in range(pdf_doc.page_count):
-                try:
-                    logger.info(f"Processing page {page_num + 1}/{pdf_doc.page_count}")
-                    page = pdf_doc[page_num]
-
-                    pix = page.get_pixmap(matrix=fitz.Matrix(3, 3)) 
-                    img_data = pix.tobytes("png")
-
-                    response = ollama_client.chat(
-                        model=model,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": SYSTEM_PROMPT,
-                            },
-                            {
-                                "role": "user",
-                                "content": (
-                                    "Convert this page to Markdown.\n\n"
-                                    "IMPORTANT: Look carefully for any **graphs, charts, or diagrams**.\n"
-                                    "If found, you MUST provide a detailed 'Visual Description' block explaining the data/structure.\n"
-                                    "Do not ignore the visual elements."
-                                ),
-                                "images": [img_data],
-                            },
-                        ]
-                    )
-
-                    content = response["message"]["content"]
-                    markdown_pages.append(content)
-                    logger.info(f"Completed page {page_num + 1}")
+            logger.error(f"Failed to open PDF file: {name} - {e}")
+            raise ValueError(f"Cannot open PDF file: {name}") from e
 
-                except Exception as e:
-                    logger.error(f"Error processing page {page_num + 1}: {e}")
-                    raise ValueError(f"Failed to process page {page_num + 1}: {str(e)}") from e
+        try:
+            yield from iter_pdf_pages(pdf_doc, ollama_client, model, max_concurrency, page_cache, render_mode, report, parse_mode)
         finally:
             pdf_doc.close()
-        
-        return markdown_pages
+
+        if report is not None:
+            summary = report.to_dict()
+            logger.info(
+                f"Parsed {summary['page_count']} pages ({summary['text_layer_pages']} from text layer, "
+                f"{summary['reduced_pages']} at reduced zoom): {summary['image_bytes']} image bytes, "
+                f"saved ~{summary['bytes_saved']} bytes and ~{summary['render_ms_saved']} ms"
+            )
     elif ext in ['png', 'jpg', 'jpeg']:
         try:
-            with open(file_path, "rb") as img_file:
-                img_data = img_file.read()
+            if from_path:
+                with open(source, "rb") as img_file:
+                    img_data = img_file.read()
+            else:
+                # The Ollama client only accepts bytes
+                img_data = bytes(source)
             
-            logger.info(f"Processing image: {file_path}")
+            logger.info(f"Processing image: {name}")
             
-            response = ollama_client.chat(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": SYSTEM_PROMPT,
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            "Convert this image to Markdown.\n\n"
-                            "IMPORTANT: Look carefully for any **graphs, charts, or diagrams**.\n"
-                            "If found, you MUST provide a detailed 'Visual Description' block explaining the data/structure.\n"
-                            "Do not ignore the visual elements."
-                        ),
-                        "images": [img_data],
-                    },
-                ]
-            )
-
-            content = response["message"]["content"]
-            logger.info(f"Completed processing image: {file_path}")
-            return [content]
+            content = cached_image_to_markdown(ollama_client, model, img_data, IMAGE_PROMPT, page_cache)
+            logger.info(f"Completed processing image: {name}")
             
         except Exception as e:
-            logger.error(f"Error processing image {file_path}: {e}")
-            raise ValueError(f"Failed to process image {file_path}: {str(e)}") from e
+            logger.error(f"Error processing image {name}: {e}")
+            raise ValueError(f"Failed to process image {name}: {str(e)}") from e
+        yield ParsedPage(page_num=1, page_count=1, content=content)
     else:
         raise ValueError(f"Unsupported file format: {ext}")
-    
+
+
+@dataclass
+class BatchDocument:
+    """
+    One document of a batch.
+
+    `source` holds the file contents, or a callable returning them so that
+    archive members are only read once the document is scheduled.
+    """
+    filename: str
+    source: Union[bytes, memoryview, Callable[[], bytes]]
+    report: DocumentReport = field(default_factory=DocumentReport)
+    page_count: int = 0
+    doc_hash: Optional[str] = None
+    error: Optional[str] = None
+    _pdf_doc: Optional[fitz.Document] = field(default=None, repr=False)
+    _img_data: Optional[bytes] = field(default=None, repr=False)
+    _next_page: int = field(default=0, repr=False)
+    _in_flight: int = field(default=0, repr=False)
+
+    def _open(self) -> None:
+        source = self.source() if callable(self.source) else self.source
+        self.doc_hash = hashlib.sha256(source).hexdigest()
+        ext = os.path.splitext(self.filename)[1].lower()[1:]
+        if ext == 'pdf':
+            try:
+                self._pdf_doc = fitz.open(stream=source, filetype="pdf")
+            except Exception as e:
+                raise ValueError(f"Cannot open PDF file: {self.filename}") from e
+            self.page_count = self._pdf_doc.page_count
+            if not self.page_count:
+                raise ValueError(f"PDF file has no pages: {self.filename}")
+        elif ext in ['png', 'jpg', 'jpeg']:
+            # The Ollama client only accepts bytes
+            self._img_data = bytes(source)
+            self.page_count = 1
+        else:
+            raise ValueError(f"Unsupported file format: {ext}")
+
+    def _close(self) -> None:
+        if self._pdf_doc is not None:
+            self._pdf_doc.close()
+        self._pdf_doc = None
+        self._img_data = None
+        self.source = b""
+
+    @property
+    def _finished(self) -> bool:
+        return self._in_flight == 0 and (self.error is not None or self._next_page >= self.page_count)
+
+
+def _convert_image(img_data: bytes, ollama_client: Client, model: str, page_cache: Optional[PageCache]) -> ParsedPage:
+    content = cached_image_to_markdown(ollama_client, model, img_data, IMAGE_PROMPT, page_cache)
+    return ParsedPage(page_num=1, page_count=1, content=content)
+
+
+def iter_parse_batch(
+    documents: list[BatchDocument],
+    model: str = None,
+    max_concurrency: Optional[int] = None,
+    max_active_documents: Optional[int] = None,
+    render_mode: Optional[str] = None,
+    parse_mode: Optional[str] = None
+) -> Iterator[tuple[BatchDocument, Optional[ParsedPage]]]:
+    """
+    Convert many documents on one shared pool of chat workers.
+
+    Up to `max_active_documents` documents are open at a time and their pages
+    are scheduled round-robin, so a short document queued behind a long one
+    finishes after a few pages instead of waiting for the whole long
+    document, and the chat workers never idle between documents. Pages are
+    yielded as `(document, page)` in scheduling order, which keeps each
+    document's pages in page order. A document that fails is yielded once as
+    `(document, None)` with its `error` set, and the rest of the batch
+    carries on.
+    """
+    if model is None:
+        model = os.getenv("DEFAULT_MODEL", "qwen3-vl:235b-instruct-cloud")
+    max_concurrency = max(1, max_concurrency or BATCH_MAX_CONCURRENCY)
+    max_active_documents = max(1, max_active_documents or BATCH_MAX_ACTIVE_DOCUMENTS)
+    render_mode = render_mode or RENDER_MODE
+    parse_mode = parse_mode or PARSE_MODE
+    _validate_modes(render_mode, parse_mode)
+    ollama_client = init_ollama()
+    page_cache = get_page_cache()
+    text_layer = parse_mode == "hybrid"
+    window = max_concurrency * 2
+
+    # MuPDF is not thread-safe, so one worker opens, renders and closes every document
+    render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+    chat_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="vlm-chat")
+    waiting: deque[BatchDocument] = deque(documents)
+    active: deque[BatchDocument] = deque()
+    pending: deque[tuple[BatchDocument, Future]] = deque()
+    open_documents: list[BatchDocument] = []
+
+    try:
+        while waiting or active or pending:
+            while waiting and len(open_documents) < max_active_documents:
+                doc = waiting.popleft()
+                doc.report.render_mode = render_mode
+                doc.report.parse_mode = parse_mode
+                open_documents.append(doc)
+                try:
+                    render_pool.submit(doc._open).result()
+                except Exception as e:
+                    logger.error(f"Failed to open {doc.filename}: {e}")
+                    doc.error = str(e)
+                    render_pool.submit(doc._close).result()
+                    open_documents.remove(doc)
+                    yield doc, None
+                    continue
+                active.append(doc)
+
+            # Take one page from each active document in turn
+            while active and len(pending) < window:
+                doc = active.popleft()
+                if doc.error is not None:
+                    continue
+                if doc._pdf_doc is not None:
+                    rendered = render_pool.submit(render_page, doc._pdf_doc, doc._next_page, render_mode, text_layer)
+                    future = chat_pool.submit(_convert_page, rendered, doc._next_page, doc.page_count, ollama_client, model, page_cache, doc.report)
+                else:
+                    future = chat_pool.submit(_convert_image, doc._img_data, ollama_client, model, page_cache)
+                doc._next_page += 1
+                doc._in_flight += 1
+                pending.append((doc, future))
+                if doc._next_page < doc.page_count:
+                    active.append(doc)
+
+            if not pending:
+                continue
+            doc, future = pending.popleft()
+            doc._in_flight -= 1
+            if doc.error is None:
+                try:
+                    page = future.result()
+                except Exception as e:
+                    logger.error(f"Batch document {doc.filename} failed: {e}")
+                    doc.error = str(e)
+                    # Drop the document's remaining pages that have not started yet
+                    for other, other_future in pending:
+                        if other is doc:
+                            other_future.cancel()
+                    yield doc, None
+                else:
+                    yield doc, page
+            if doc._finished:
+                render_pool.submit(doc._close).result()
+                open_documents.remove(doc)
+    finally:
+        chat_pool.shutdown(wait=True, cancel_futures=True)
+        for doc in open_documents:
+            render_pool.submit(doc._close)
+        render_pool.shutdown(wait=True, cancel_futures=False)
+
+
+def write_markdown_page(out_f: TextIO, page: ParsedPage) -> None:
+    """Append a converted page to a markdown output file, recording how it was converted."""
+    if page.page_count > 1:  # Multiple pages (PDF)
+        out_f.write(f"<!-- Page {page.page_num} (route: {page.route}) -->\n")
+    out_f.write(page.content)
+    out_f.write("\n\n")
+
+
+def parse_file(
+    source: Union[str, bytes, memoryview],
+    model: str = None,
+    original_filename: str = "",
+    max_concurrency: Optional[int] = None,
+    render_mode: Optional[str] = None,
+    report: Optional[DocumentReport] = None,
+    parse_mode: Optional[str] = None
+) -> list[str]:
+    pages = iter_parse_file(
+        source,
+        model=model,
+        original_filename=original_filename,
+        max_concurrency=max_concurrency,
+        render_mode=render_mode,
+        report=report,
+        parse_mode=parse_mode
+    )
+    return [page.content for page in pages]
@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import fitz
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+from app.services.text_layer import page_to_markdown
+
+# "full" renders every page at FULL_ZOOM, "adaptive" picks a zoom per page
+RENDER_MODE = os.getenv("RENDER_MODE", "full")
+FULL_ZOOM = float(os.getenv("RENDER_FULL_ZOOM", "3"))
+TEXT_ZOOM = float(os.getenv("RENDER_TEXT_ZOOM", "1.5"))
+# A page needs at least this many extracted characters to count as having a usable text layer
+MIN_TEXT_CHARS = int(os.getenv("RENDER_MIN_TEXT_CHARS", "200"))
+# Vector drawings above this count usually mean tables, charts or diagrams
+MAX_TEXT_PAGE_DRAWINGS = int(os.getenv("RENDER_MAX_TEXT_PAGE_DRAWINGS", "20"))
+# Fraction of the page area covered by raster images above which a page counts as visual
+MAX_TEXT_PAGE_IMAGE_RATIO = float(os.getenv("RENDER_MAX_TEXT_PAGE_IMAGE_RATIO", "0.05"))
+# Fraction of characters set in math fonts above which a page is treated as formula-heavy
+MAX_TEXT_PAGE_MATH_RATIO = float(os.getenv("RENDER_MAX_TEXT_PAGE_MATH_RATIO", "0.02"))
+# Fraction of unmapped glyphs (U+FFFD) above which the text layer is considered unreliable
+MAX_UNKNOWN_CHAR_RATIO = 0.01
+
+MATH_FONT_RE = re.compile(r"CMMI|CMSY|CMEX|MSBM|Math|Symbol", re.IGNORECASE)
+CAPTION_RE = re.compile(r"^\s*(Table|Figure|Fig\.|Chart)\s*\d+", re.IGNORECASE | re.MULTILINE)
+
+RENDER_MODES = ("full", "adaptive")
+
+# Per-page routing decisions
+ROUTE_VLM = "vlm"
+ROUTE_TEXT_LAYER = "text_layer"
+
+
+@dataclass
+class PageProfile:
+    """Cheap, text-layer based description of a PDF page."""
+    text_chars: int
+    image_count: int
+    image_ratio: float
+    drawing_count: int
+    math_ratio: float = 0.0
+    unknown_ratio: float = 0.0
+    caption_count: int = 0
+
+    @property
+    def has_text_layer(self) -> bool:
+        return self.text_chars >= MIN_TEXT_CHARS and self.unknown_ratio <= MAX_UNKNOWN_CHAR_RATIO
+
+    @property
+    def has_visuals(self) -> bool:
+        return (
+            self.image_ratio > MAX_TEXT_PAGE_IMAGE_RATIO
+            or self.drawing_count > MAX_TEXT_PAGE_DRAWINGS
+            or self.caption_count > 0
+        )
+
+    @property
+    def is_text_only(self) -> bool:
+        """Plain prose with a reliable text layer: no figures, tables or heavy math."""
+        return self.has_text_layer and not self.has_visuals and self.math_ratio <= MAX_TEXT_PAGE_MATH_RATIO
+
+
+@dataclass
+class RenderedPage:
+    page_num: int
+    img_data: bytes
+    zoom: Optional[float]
+    profile: PageProfile
+    render_seconds: float
+    route: str = ROUTE_VLM
+    markdown: Optional[str] = None
+
+
+def analyze_page(page: fitz.Page) -> PageProfile:
+    """Profile a page's text layer, raster images and vector drawings."""
+    page_area = abs(page.rect) or 1.0
+    image_area = 0.0
+    image_count = 0
+    for info in page.get_image_info():
+        image_count += 1
+        image_area += abs(fitz.Rect(info["bbox"]) & page.rect)
+
+    text_chars = 0
+    math_chars = 0
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            line_text = ""
+            for span in line["spans"]:
+                chars = len(span["text"].strip())
+                text_chars += chars
+                if MATH_FONT_RE.search(span["font"]):
+                    math_chars += chars
+                line_text += span["text"]
+            lines.append(line_text)
+    text = "\n".join(lines)
+
+    return PageProfile(
+        text_chars=text_chars,
+        image_count=image_count,
+        image_ratio=round(min(image_area / page_area, 1.0), 4),
+        drawing_count=len(page.get_drawings()),
+        math_ratio=round(math_chars / text_chars, 4) if text_chars else 0.0,
+        unknown_ratio=round(text.count("\ufffd") / text_chars, 4) if text_chars else 0.0,
+        caption_count=len(CAPTION_RE.findall(text))
+    )
+
+
+def choose_zoom(profile: PageProfile, render_mode: str = RENDER_MODE) -> float:
+    """Full resolution for pages with figures, tables or no text layer; a smaller image for plain text."""
+    if render_mode == "adaptive" and profile.is_text_only:
+        return TEXT_ZOOM
+    return FULL_ZOOM
+
+
+def render_page(pdf_doc: fitz.Document, page_num: int, render_mode: str = RENDER_MODE, text_layer: bool = False) -> RenderedPage:
+    """
+    Profile a PDF page and prepare it for conversion.
+
+    With `text_layer` enabled, pages with a reliable text layer are converted
+    to markdown locally and never rasterized; every other page is rendered to
+    PNG bytes at the chosen zoom for the VLM.
+    """
+    start = time.perf_counter()
+    page = pdf_doc[page_num]
+    profile = analyze_page(page)
+
+    if text_layer and profile.is_text_only:
+        return RenderedPage(
+            page_num=page_num,
+            img_data=b"",
+            zoom=None,
+            profile=profile,
+            render_seconds=time.perf_counter() - start,
+            route=ROUTE_TEXT_LAYER,
+            markdown=page_to_markdown(page)
+        )
+
+    zoom = choose_zoom(profile, render_mode)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    img_data = pix.tobytes("png")
+    return RenderedPage(
+        page_num=page_num,
+        img_data=img_data,
+        zoom=zoom,
+        profile=profile,
+        render_seconds=time.perf_counter() - start
+    )
+
+
+@dataclass
+class DocumentReport:
+    """
+    Per-document rendering and routing summary.
+
+    Savings are estimated against rendering every page at FULL_ZOOM. PNG size
+    of rendered pages grows roughly linearly with zoom (large blank areas
+    compress well) and render time slightly faster, so scaling both linearly
+    gives a conservative estimate.
+    """
+    render_mode: str = RENDER_MODE
+    parse_mode: str = "vlm"
+    pages: list[dict] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_page(self, rendered: RenderedPage, **extra) -> None:
+        entry = {
+            "page": rendered.page_num + 1,
+            "route": rendered.route,
+            "zoom": rendered.zoom,
+            "image_bytes": len(rendered.img_data),
+            "render_ms": round(rendered.render_seconds * 1000, 2),
+            "estimated_full_bytes": 0,
+            "estimated_full_render_ms": 0.0,
+            **asdict(rendered.profile),
+            **extra,
+        }
+        if rendered.zoom:
+            scale = FULL_ZOOM / rendered.zoom
+            entry["estimated_full_bytes"] = int(len(rendered.img_data) * scale)
+            entry["estimated_full_render_ms"] = round(rendered.render_seconds * 1000 * scale, 2)
+        with self._lock:
+            self.pages.append(entry)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            pages = sorted(self.pages, key=lambda entry: entry["page"])
+        rendered = [entry for entry in pages if entry["route"] == ROUTE_VLM]
+        image_bytes = sum(entry["image_bytes"] for entry in rendered)
+        full_bytes = sum(entry["estimated_full_bytes"] for entry in rendered)
+        render_ms = sum(entry["render_ms"] for entry in rendered)
+        full_render_ms = sum(entry["estimated_full_render_ms"] for entry in rendered)
+        return {
+            "render_mode": self.render_mode,
+            "parse_mode": self.parse_mode,
+            "page_count": len(pages),
+            "vlm_pages": len(rendered),
+            "text_layer_pages": len(pages) - len(rendered),
+            "reduced_pages": sum(1 for entry in rendered if entry["zoom"] < FULL_ZOOM),
+            "image_bytes": image_bytes,
+            "bytes_saved": full_bytes - image_bytes,
+            "render_ms": round(render_ms, 2),
+            "render_ms_saved": round(full_render_ms - render_ms, 2),
+            "text_layer_ms": round(sum(entry["render_ms"] for entry in pages if entry["route"] == ROUTE_TEXT_LAYER), 2),
+            "pages": pages,
+        }
@@ -0,0 +1,204 @@
+import re
+import fitz
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Span flag bits from PyMuPDF's text extraction
+FLAG_SUPERSCRIPT = 1
+FLAG_ITALIC = 2
+FLAG_MONOSPACE = 8
+FLAG_BOLD = 16
+
+BULLET_RE = re.compile(r"^\s*[•◦▪▫‣●○■□–—\-\*]\s+")
+NUMBERED_RE = re.compile(r"^\s*(\(?\d{1,3}[.)]|\(?[a-zA-Z][.)]|\([ivxIVX]+\))\s+")
+PAGE_NUMBER_RE = re.compile(r"^\s*(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?\s*$", re.IGNORECASE)
+# Blocks inside this fraction of the page height at the top or bottom are candidate running headers/footers
+MARGIN_RATIO = 0.06
+
+
+def _body_font_size(blocks: list[dict]) -> float:
+    """Most common span size on the page, weighted by character count."""
+    sizes = Counter()
+    for block in blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                sizes[round(span["size"] * 2) / 2] += len(span["text"].strip())
+    return sizes.most_common(1)[0][0] if sizes else 10.0
+
+
+def _style(span: dict) -> int:
+    flags = span["flags"]
+    # Emphasis on superscripts and stray one-character spans is noise, not formatting
+    if flags & FLAG_SUPERSCRIPT or len(span["text"].strip()) < 2:
+        return 0
+    return flags & (FLAG_ITALIC | FLAG_MONOSPACE | FLAG_BOLD)
+
+
+def _format_run(text: str, style: int) -> str:
+    stripped = text.strip()
+    if not stripped or not style:
+        return text
+    if style & FLAG_MONOSPACE:
+        formatted = f"`{stripped}`"
+    elif style & FLAG_BOLD and style & FLAG_ITALIC:
+        formatted = f"***{stripped}***"
+    elif style & FLAG_BOLD:
+        formatted = f"**{stripped}**"
+    else:
+        formatted = f"*{stripped}*"
+    # Keep the surrounding whitespace outside the emphasis markers
+    leading = text[:len(text) - len(text.lstrip())]
+    trailing = text[len(text.rstrip()):]
+    return f"{leading}{formatted}{trailing}"
+
+
+def _line_text(line: dict, plain: bool = False) -> str:
+    if plain:
+        return "".join(span["text"] for span in line["spans"]).strip()
+
+    # Merge neighbouring spans with the same style so emphasis is not split up
+    runs: list[list] = []
+    for span in line["spans"]:
+        style = _style(span)
+        if runs and (runs[-1][1] == style or not span["text"].strip()):
+            runs[-1][0] += span["text"]
+        else:
+            runs.append([span["text"], style])
+    return "".join(_format_run(text, style) for text, style in runs).strip()
+
+
+def _heading_level(block: dict, body_size: float) -> int:
+    """Return 1-3 for heading blocks, 0 for body text."""
+    spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+    if not spans:
+        return 0
+    text_length = sum(len(span["text"]) for span in spans)
+    if text_length > 120:
+        return 0
+
+    size = max(span["size"] for span in spans)
+    ratio = size / body_size if body_size else 1.0
+    if ratio >= 1.8:
+        return 1
+    if ratio >= 1.4:
+        return 2
+    if ratio >= 1.15:
+        return 3
+    # Short, fully bold blocks on their own are usually section headings
+    if all(span["flags"] & FLAG_BOLD for span in spans) and text_length <= 80:
+        return 3
+    return 0
+
+
+def _join_lines(lines: list[str]) -> str:
+    """Join wrapped lines into a paragraph, undoing end-of-line hyphenation."""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        elif text:
+            text = f"{text} {line}"
+        else:
+            text = line
+    return text
+
+
+def _list_item(text: str, plain: str) -> str:
+    """Rewrite a bullet or numbered line as a markdown list item, or return '' if it is not one."""
+    match = BULLET_RE.match(plain) or NUMBERED_RE.match(plain)
+    if not match:
+        return ""
+    marker = plain[:match.end()].strip()
+    body = text[len(marker):].strip() if text.startswith(marker) else plain[match.end():].strip()
+    if match.re is BULLET_RE:
+        return f"- {body}"
+    number = marker.strip("()").rstrip(".)")
+    if number.isdigit():
+        return f"{number}. {body}"
+    # Lettered and roman markers have no markdown equivalent, so keep them as text
+    return f"- {marker} {body}"
+
+
+def _block_to_markdown(block: dict, body_size: float) -> str:
+    level = _heading_level(block, body_size)
+    if level:
+        heading = " ".join(_line_text(line, plain=True) for line in block["lines"])
+        return f"{'#' * level} {heading.strip()}"
+
+    paragraphs: list[str] = []
+    current: list[str] = []
+    for line in block["lines"]:
+        text = _line_text(line)
+        if not text:
+            continue
+        item = _list_item(text, _line_text(line, plain=True))
+        if item:
+            # Each list marker starts a new item
+            if current:
+                paragraphs.append(_join_lines(current))
+            current = [item]
+        else:
+            current.append(text)
+    if current:
+        paragraphs.append(_join_lines(current))
+    return "\n".join(paragraphs)
+
+
+def _is_margin_artifact(block: dict, page_rect: fitz.Rect) -> bool:
+    """Page numbers and similar one-liners in the top or bottom margin."""
+    bbox = fitz.Rect(block["bbox"])
+    margin = page_rect.height * MARGIN_RATIO
+    in_margin = bbox.y1 <= page_rect.y0 + margin or bbox.y0 >= page_rect.y1 - margin
+    if not in_margin:
+        return False
+    text = " ".join(_line_text(line, plain=True) for line in block["lines"])
+    return bool(PAGE_NUMBER_RE.match(text))
+
+
+def _find_tables(page: fitz.Page) -> list[tuple[fitz.Rect, str]]:
+    try:
+        tables = page.find_tables()
+    except Exception as e:
+        logger.warning(f"Table detection failed on page {page.number + 1}: {e}")
+        return []
+    found = []
+    for table in tables.tables:
+        markdown = table.to_markdown(clean=False).strip()
+        if markdown:
+            found.append((fitz.Rect(table.bbox), markdown))
+    return found
+
+
+def page_to_markdown(page: fitz.Page) -> str:
+    """
+    Convert a born-digital PDF page to markdown from its text layer.
+
+    Headings are inferred from font size relative to the page's body text,
+    bold/italic/monospace spans keep their emphasis, bullet and numbered lines
+    become list items, and ruled tables are emitted as markdown tables in
+    place of the text blocks they cover.
+    """
+    data = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)
+    blocks = [block for block in data["blocks"] if block.get("type") == 0]
+    body_size = _body_font_size(blocks)
+    tables = _find_tables(page)
+
+    parts: list[str] = []
+    pending_tables = sorted(tables, key=lambda table: table[0].y0)
+    for block in blocks:
+        bbox = fitz.Rect(block["bbox"])
+        # Emit tables that sit above this block
+        while pending_tables and pending_tables[0][0].y0 <= bbox.y0:
+            parts.append(pending_tables.pop(0)[1])
+        if any(bbox.intersects(rect) for rect, _ in tables):
+            continue
+        if _is_margin_artifact(block, page.rect):
+            continue
+        markdown = _block_to_markdown(block, body_size)
+        if markdown:
+            parts.append(markdown)
+    parts.extend(markdown for _, markdown in pending_tables)
+
+    return "\n\n".join(parts)
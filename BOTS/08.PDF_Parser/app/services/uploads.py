@@ -0,0 +1,43 @@
+import os
+import mmap
+import logging
+from typing import Union
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Uploads up to this size are read into memory; larger ones are memory-mapped from the multipart parser's spool file
+UPLOAD_SPOOL_MB = int(os.getenv("UPLOAD_SPOOL_MB", "8"))
+
+UploadBuffer = Union[bytes, memoryview]
+
+
+async def read_upload(file: UploadFile) -> UploadBuffer:
+    """
+    Return the contents of an upload without copying it to another file.
+
+    Uploads up to `UPLOAD_SPOOL_MB` are read into memory and returned as
+    bytes. Larger ones are memory-mapped from the file the multipart parser
+    spooled them to, so large PDFs are paged in by the OS as MuPDF reads
+    them. The mapping stays valid after the request closes (and deletes) the
+    spool file; release it with `close_upload` once the upload is parsed.
+    """
+    if file.size is None or file.size <= UPLOAD_SPOOL_MB * 1024 * 1024:
+        return await file.read()
+    # fileno() moves an upload still held in memory to disk first
+    mapped = mmap.mmap(file.file.fileno(), 0, access=mmap.ACCESS_READ)
+    logger.info(f"Memory-mapped {file.filename} ({len(mapped)} bytes)")
+    return memoryview(mapped)
+
+
+def close_upload(data: UploadBuffer) -> None:
+    """Unmap an upload returned by `read_upload`; uploads read into memory need nothing."""
+    if not isinstance(data, memoryview) or not isinstance(data.obj, mmap.mmap):
+        return
+    mapped = data.obj
+    data.release()
+    try:
+        mapped.close()
+    except BufferError:
+        # Still exported, e.g. to a document that was not closed; unmapped when collected
+        logger.warning("Upload mapping still in use; leaving it to the garbage collector")
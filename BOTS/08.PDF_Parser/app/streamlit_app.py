@@ -1,7 +1,8 @@
 import os
+import json
 import logging
 import requests
-from typing import Optional
+from typing import Iterator, Optional
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -24,6 +25,7 @@ SUPPORTED_FORMATS = ['pdf', 'png', 'jpg', 'jpeg']
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "qwen3-vl:235b-instruct-cloud")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+OUTPUT_LIST_LIMIT = 100
 
 
 def init_session_state():
@@ -34,12 +36,14 @@ def init_session_state():
         st.session_state.current_output = None
     if 'current_filename' not in st.session_state:
         st.session_state.current_filename = None
+    if 'current_output_id' not in st.session_state:
+        st.session_state.current_output_id = None
 
 
 def get_output_files() -> list:
-    """Get list of all generated markdown files from API."""
+    """Get the most recent generated markdown files from API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/output")
+        response = requests.get(f"{API_BASE_URL}/api/output", params={"limit": OUTPUT_LIST_LIMIT})
         if response.status_code == 200:
             data = response.json()
             return data.get("files", [])
@@ -49,54 +53,55 @@ def get_output_files() -> list:
         return []
 
 
-def read_output_file(filename: str) -> str:
+def read_output_file(output_id: str) -> str:
     """Read content of a markdown file from API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/output/{filename}")
+        response = requests.get(f"{API_BASE_URL}/api/output/{output_id}")
         if response.status_code == 200:
             return response.text
         return ""
     except requests.RequestException as e:
-        logger.error(f"Error reading file {filename}: {e}")
+        logger.error(f"Error reading file {output_id}: {e}")
         return ""
 
 
-def delete_output_file(filename: str) -> bool:
+def delete_output_file(output_id: str) -> bool:
     """Delete a markdown file via API."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/api/output/{filename}")
+        response = requests.delete(f"{API_BASE_URL}/api/output/{output_id}")
         return response.status_code == 200
     except requests.RequestException as e:
-        logger.error(f"Error deleting file {filename}: {e}")
+        logger.error(f"Error deleting file {output_id}: {e}")
         return False
 
 
-def parse_file_via_api(file, model: str) -> tuple[bool, str, Optional[str]]:
-    """Process file via API endpoint."""
+def stream_file_via_api(file, model: str) -> Iterator[dict]:
+    """Process file via the streaming API endpoint, yielding one event per page."""
     try:
         files = {"file": (file.name, file, file.type)}
         data = {"model": model}
         
-        response = requests.post(
-            f"{API_BASE_URL}/api/parse-file",
+        with requests.post(
+            f"{API_BASE_URL}/api/parse-file/stream",
             files=files,
-            data=data
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            output_filename = result.get("filename")
-            return True, "File processed successfully!", output_filename
-        else:
-            error_detail = response.json().get("detail", "Unknown error")
-            return False, f"Error: {error_detail}", None
+            data=data,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                error_detail = response.json().get("detail", "Unknown error")
+                yield {"event": "error", "detail": f"Error: {error_detail}"}
+                return
+
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
             
     except requests.ConnectionError:
-        return False, "Cannot connect to API. Make sure the FastAPI server is running.", None
+        yield {"event": "error", "detail": "Cannot connect to API. Make sure the FastAPI server is running."}
     except requests.RequestException as e:
-        return False, f"Request error: {str(e)}", None
+        yield {"event": "error", "detail": f"Request error: {str(e)}"}
     except Exception as e:
-        return False, f"Unexpected error: {str(e)}", None
+        yield {"event": "error", "detail": f"Unexpected error: {str(e)}"}
 
 
 def main():
@@ -164,18 +169,34 @@ def main():
 
             # Process button
             if st.button("🚀 Process File", type="primary", use_container_width=True):
-                with st.spinner("Processing file... This may take a while."):
-                    success, message, output_filename = parse_file_via_api(uploaded_file, model)
-                    
-                    if success and output_filename:
+                progress_bar = st.progress(0.0, text="Processing file... This may take a while.")
+                preview = st.empty()
+                pages = []
+
+                for event in stream_file_via_api(uploaded_file, model):
+                    if event["event"] == "page":
+                        pages.append(event["content"])
+                        progress_bar.progress(
+                            event["page"] / event["page_count"],
+                            text=f"Converted page {event['page']}/{event['page_count']} ({event.get('route', 'vlm')})"
+                        )
+                        # Render pages progressively as they arrive
+                        preview.markdown("\n\n---\n\n".join(pages))
+                    elif event["event"] == "done":
+                        output_filename = event["filename"]
+                        progress_bar.empty()
+                        preview.empty()
+
                         # Update session state
-                        st.session_state.current_output = read_output_file(output_filename)
+                        st.session_state.current_output = read_output_file(event["output_id"])
                         st.session_state.current_filename = output_filename
+                        st.session_state.current_output_id = event["output_id"]
                         st.session_state.processed_files = get_output_files()
                         
-                        st.success(f"✅ {message} Output saved as `{output_filename}`")
-                    else:
-                        st.error(f"❌ {message}")
+                        st.success(f"✅ File processed successfully! Output saved as `{output_filename}`")
+                    elif event["event"] == "error":
+                        progress_bar.empty()
+                        st.error(f"❌ {event['detail']}")
 
     with col2:
         st.header("📋 Output")
@@ -212,29 +233,33 @@ def main():
     output_files = get_output_files()
     
     if output_files:
-        st.info(f"Found **{len(output_files)}** processed file(s)")
+        st.info(f"Showing the **{len(output_files)}** most recent processed file(s)")
         
-        for filename in output_files:
+        for output in output_files:
+            output_id = output["id"]
+            filename = output["filename"]
             with st.expander(f"📄 {filename}", expanded=False):
                 col_a, col_b, col_c = st.columns([3, 1, 1])
                 
                 with col_a:
-                    st.markdown(f"**File:** `{filename}`")
+                    st.markdown(f"**File:** `{filename}`  \n**Pages:** {output['page_count']} · **Model:** `{output['model']}`")
                 
                 with col_b:
-                    if st.button(f"👁️ View", key=f"view_{filename}"):
-                        st.session_state.current_output = read_output_file(filename)
+                    if st.button(f"👁️ View", key=f"view_{output_id}"):
+                        st.session_state.current_output = read_output_file(output_id)
                         st.session_state.current_filename = filename
+                        st.session_state.current_output_id = output_id
                         st.rerun()
                 
                 with col_c:
-                    if st.button(f"🗑️ Delete", key=f"delete_{filename}"):
-                        if delete_output_file(filename):
+                    if st.button(f"🗑️ Delete", key=f"delete_{output_id}"):
+                        if delete_output_file(output_id):
                             st.success(f"Deleted `{filename}`")
                             st.session_state.processed_files = get_output_files()
-                            if st.session_state.current_filename == filename:
+                            if st.session_state.current_output_id == output_id:
                                 st.session_state.current_output = None
                                 st.session_state.current_filename = None
+                                st.session_state.current_output_id = None
                             st.rerun()
                         else:
                             st.error(f"Failed to delete `{filename}`")
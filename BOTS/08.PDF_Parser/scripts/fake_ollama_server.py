@@ -0,0 +1,105 @@
+"""
+Minimal stand-in for the Ollama `/api/chat` endpoint.
+
+Useful for exercising the page pipeline without a real VLM:
+
+    python scripts/fake_ollama_server.py --port 11435 --latency 2.0
+    OLLAMA_BASE_URL=http://localhost:11435 uvicorn app.main:app --port 2007
+
+`GET /api/stats` reports the chat calls received and the most that were in
+flight at once, so tests can check the pipeline's concurrency bound.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive like the real server
+    latency: float = 1.0
+    jitter: float = 0.0           # extra random latency per call, up to this many seconds
+    fail_on: set[int] = set()     # call numbers answered with a 500, without latency
+    calls: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    lock = threading.Lock()
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path != "/api/stats":
+            self.send_error(404, "Not found")
+            return
+        with FakeOllamaHandler.lock:
+            self._send_json({"calls": FakeOllamaHandler.calls, "in_flight": FakeOllamaHandler.in_flight, "max_in_flight": FakeOllamaHandler.max_in_flight})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path != "/api/chat":
+            self.send_error(404, "Not found")
+            return
+
+        with FakeOllamaHandler.lock:
+            FakeOllamaHandler.calls += 1
+            call_id = FakeOllamaHandler.calls
+            if call_id in self.fail_on:
+                self._send_json({"error": f"injected failure on call #{call_id}"}, status=500)
+                return
+            FakeOllamaHandler.in_flight += 1
+            FakeOllamaHandler.max_in_flight = max(FakeOllamaHandler.max_in_flight, FakeOllamaHandler.in_flight)
+
+        try:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        finally:
+            with FakeOllamaHandler.lock:
+                FakeOllamaHandler.in_flight -= 1
+
+        self._send_json({
+            "model": body.get("model", "fake"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": f"# Fake page\n\nResponse #{call_id}"},
+            "done": True,
+            "done_reason": "stop",
+        })
+
+    def log_message(self, format: str, *args) -> None:
+        print(f"[fake-ollama] {self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Ollama chat server with injected latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435, help="Port to listen on; 0 picks a free one")
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds to sleep per chat call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds per call, at random")
+    parser.add_argument("--fail-on", type=int, nargs="*", default=[], help="Chat call numbers (from 1) to answer with an immediate 500")
+    args = parser.parse_args()
+
+    FakeOllamaHandler.latency = args.latency
+    FakeOllamaHandler.jitter = args.jitter
+    FakeOllamaHandler.fail_on = set(args.fail_on)
+    server = ThreadingHTTPServer((args.host, args.port), FakeOllamaHandler)
+    print(f"Fake Ollama listening on http://{args.host}:{server.server_address[1]} (latency={args.latency}s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
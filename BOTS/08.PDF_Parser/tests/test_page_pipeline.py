@@ -0,0 +1,112 @@
+"""
+End-to-end checks of the page pipeline against scripts/fake_ollama_server.py,
+which answers every chat call after a fixed latency.
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import subprocess
+import urllib.request
+
+import fitz
+import pytest
+
+# Read by app.services.parser at import time
+os.environ["OLLAMA_MAX_CONCURRENCY"] = "3"
+
+from app.services import parser  # noqa: E402
+from app.services.ollama_pool import ollama_clients  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "fake_ollama_server.py")
+LATENCY = 0.5
+PAGES = 12
+
+
+@pytest.fixture
+def fake_ollama():
+    """Start a fake Ollama server on a free port; returns its base URL."""
+    servers = []
+
+    def start(*args: str) -> str:
+        server = subprocess.Popen(
+            [sys.executable, SERVER, "--port", "0", "--latency", str(LATENCY), *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        servers.append(server)
+        match = re.search(r"http://\S+", server.stdout.readline())
+        assert match, "fake Ollama server did not start"
+        return match.group(0)
+
+    yield start
+    for server in servers:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/api/stats", timeout=5) as response:
+        return json.load(response)
+
+
+def make_pdf(pages: int) -> fitz.Document:
+    doc = fitz.open()
+    for number in range(pages):
+        doc.new_page(width=200, height=200).insert_text((20, 100), f"Page {number + 1}")
+    return doc
+
+
+def parse(base_url: str, pages: int = PAGES) -> list[parser.ParsedPage]:
+    client = ollama_clients.get_client(base_url)
+    with make_pdf(pages) as doc:
+        return list(parser.iter_pdf_pages(doc, client, "fake", render_mode="full", parse_mode="vlm"))
+
+
+def test_pages_come_back_in_order(fake_ollama):
+    # Jitter makes chat calls finish out of submission order
+    base_url = fake_ollama("--jitter", str(LATENCY))
+    result = parse(base_url)
+    assert [page.page_num for page in result] == list(range(1, PAGES + 1))
+    assert all(page.page_count == PAGES for page in result)
+
+
+def test_chat_calls_never_exceed_max_concurrency(fake_ollama):
+    base_url = fake_ollama("--jitter", str(LATENCY))
+    parse(base_url)
+
+    served = stats(base_url)
+    assert served["calls"] == PAGES
+    assert served["max_in_flight"] <= parser.MAX_CONCURRENCY
+    # The chat pool is used in full rather than serialized
+    assert served["max_in_flight"] == parser.MAX_CONCURRENCY
+
+
+def test_pages_are_converted_concurrently(fake_ollama):
+    base_url = fake_ollama()
+    started = time.perf_counter()
+    parse(base_url)
+    elapsed = time.perf_counter() - started
+
+    # ceil(pages / concurrency) rounds of one latency each, not one latency per page
+    expected = math.ceil(PAGES / parser.MAX_CONCURRENCY) * LATENCY
+    assert expected <= elapsed < expected + 2 * LATENCY
+    assert elapsed < PAGES * LATENCY / 2
+
+
+def test_failing_page_cancels_remaining_pages(fake_ollama):
+    base_url = fake_ollama("--fail-on", "1")
+    with pytest.raises(ValueError, match="Failed to process page 1"):
+        parse(base_url)
+
+    # The failure is immediate: the other calls in flight and the one its worker
+    # picked up next still finish, but the rest of the window is never sent
+    calls = stats(base_url)["calls"]
+    time.sleep(2 * LATENCY)
+    served = stats(base_url)
+    assert served["calls"] == calls
+    assert served["in_flight"] == 0
+    assert calls <= parser.MAX_CONCURRENCY + 1